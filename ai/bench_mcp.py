@@ -0,0 +1,82 @@
+"""
+Benchmark : création de tickets via MCP, un processus par appel (ancien pont)
+contre le pool de serveurs persistants.
+Utilise le faux serveur MCP (ai/tools/fake_mcp_server.py) avec un temps de
+démarrage simulé proche de celui de Node.js : aucun ticket Jira n'est créé.
+
+Usage (depuis la racine du projet) :
+    python -m ai.bench_mcp [--tickets 40] [--concurrency 8] [--startup-ms 300] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+FAKE_SERVER = Path(__file__).parent / "tools" / "fake_mcp_server.py"
+
+
+def configure(startup_ms: float, latency_ms: float, pool_size: int) -> None:
+    """Variables lues à l'import de mcp_pool : à définir avant"""
+    os.environ["MCP_SERVER_COMMAND"] = f'"{sys.executable}" "{FAKE_SERVER}"'
+    os.environ["MCP_SERVER_CWD"] = str(Path(__file__).parent.parent)
+    os.environ["MCP_POOL_SIZE"] = str(pool_size)
+    os.environ["FAKE_MCP_STARTUP_MS"] = str(startup_ms)
+    os.environ["FAKE_MCP_LATENCY_MS"] = str(latency_ms)
+
+
+async def run(name, call, tickets: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await call(f"Fuite vanne V-{index}", "Test de charge", "Medium", "Groupe Dépannage", "bench@example.com")
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not result.startswith("ID du ticket"):
+                raise RuntimeError(result)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(index) for index in range(tickets)])
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<22} {tickets / elapsed:8.1f} tickets/s  "
+        f"p50={statistics.median(latencies):8.1f} ms  max={max(latencies):8.1f} ms"
+    )
+
+
+async def main(tickets: int, concurrency: int, pool_size: int):
+    from ai.tools.mcp_bridge import call_mcp_jira_ticket, acall_mcp_jira_ticket
+    from ai.tools.mcp_pool import get_mcp_pool
+
+    print(f"{tickets} tickets, {concurrency} en parallèle, pool de {pool_size} processus")
+
+    # Ancien chemin : le tool synchrone tourne dans un thread (ainvoke)
+    async def spawn_per_call(*args):
+        return await asyncio.to_thread(call_mcp_jira_ticket, *args)
+
+    await run("processus par appel", spawn_per_call, tickets, concurrency)
+
+    pool = get_mcp_pool()
+    start = time.perf_counter()
+    await pool.start()
+    print(f"démarrage du pool       {(time.perf_counter() - start) * 1000:8.1f} ms (une fois)")
+    await run("pool persistant", acall_mcp_jira_ticket, tickets, concurrency)
+    print(f"pool : {pool.stats()}")
+    await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--startup-ms", type=float, default=300)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    configure(args.startup_ms, args.latency_ms, args.pool_size)
+    asyncio.run(main(args.tickets, args.concurrency, args.pool_size))
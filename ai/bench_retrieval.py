@@ -0,0 +1,89 @@
+"""
+Benchmark : recherche Qdrant Cloud vs index numpy en mémoire (float32 et int8).
+Mesure la latence de recherche (hors embedding de la requête) et le rappel@k
+de l'index numpy par rapport aux résultats de Qdrant.
+
+Usage (depuis le dossier ai/) :
+    python bench_retrieval.py [--k 3] [--rounds 5]
+"""
+import argparse
+import re
+import statistics
+import time
+from pathlib import Path
+
+from qdrant_client import QdrantClient
+from qdrantdb import get_embeddings, get_vector_config
+from vector_index import NumpyVectorIndex, fetch_collection
+
+
+def load_questions():
+    """Questions de test du fichier questions.txt (lignes * "...")"""
+    text = (Path(__file__).parent / "questions.txt").read_text(encoding="utf-8")
+    return re.findall(r'^\*\s*"(.+?)"', text, flags=re.MULTILINE)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(name, timings_ms, recall=None):
+    line = (
+        f"{name:<16} p50={statistics.median(timings_ms):8.3f} ms  "
+        f"p95={percentile(timings_ms, 95):8.3f} ms"
+    )
+    if recall is not None:
+        line += f"  rappel@k={recall:.3f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    config = get_vector_config()
+    client = QdrantClient(url=config["url"], api_key=config["api_key"], timeout=60)
+
+    questions = load_questions()
+    vectors = get_embeddings().embed_documents(questions)
+    print(f"{len(questions)} questions, k={args.k}, {args.rounds} tours")
+
+    start = time.perf_counter()
+    ids, matrix, payloads = fetch_collection(client, config["collection_name"])
+    print(f"Chargement de la collection : {len(ids)} vecteurs en {time.perf_counter() - start:.2f} s")
+
+    indexes = {
+        "numpy float32": NumpyVectorIndex(ids, matrix, payloads),
+        "numpy int8": NumpyVectorIndex(ids, matrix, payloads, quantize=True),
+    }
+
+    # Référence : résultats de Qdrant
+    qdrant_timings, reference = [], []
+    for _ in range(args.rounds):
+        reference = []
+        for vector in vectors:
+            start = time.perf_counter()
+            response = client.query_points(
+                collection_name=config["collection_name"], query=vector, limit=args.k
+            )
+            qdrant_timings.append((time.perf_counter() - start) * 1000)
+            reference.append({point.id for point in response.points})
+    report("qdrant cloud", qdrant_timings)
+
+    for name, index in indexes.items():
+        timings, found = [], 0
+        for _ in range(args.rounds):
+            found = 0
+            for vector, expected in zip(vectors, reference):
+                start = time.perf_counter()
+                hits = index.search(vector, args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+                found += len({index.ids[row] for row, _ in hits} & expected)
+        report(name, timings, recall=found / max(1, sum(len(ids) for ids in reference)))
+
+
+if __name__ == "__main__":
+    main()
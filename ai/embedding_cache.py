@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Forme canonique d'un texte : Unicode NFC et espaces compactés"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un modèle d'embeddings avec un cache LRU borné en mémoire,
+    optionnellement persisté dans un fichier SQLite (les entrées chaudes
+    survivent aux redémarrages).
+    La clé est le texte normalisé + le nom du modèle : "oui" et " oui " ne
+    coûtent qu'un seul appel réseau, à la recherche comme à l'ingestion.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        max_entries: int = 4096,
+        persist_path: Optional[str] = None,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Connexion SQLite partagée entre threads : accès sérialisés, hors du verrou mémoire
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    # ----- API Embeddings -----
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, results, missing = self._lookup(texts)
+        if missing:
+            vectors = self.underlying.embed_documents([texts[i] for i in missing.values()])
+            self._store(list(missing), vectors)
+            results.update(zip(missing, vectors))
+        return [results[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, results, missing = await self._alookup(texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents([texts[i] for i in missing.values()])
+            await self._astore(list(missing), vectors)
+            results.update(zip(missing, vectors))
+        return [results[key] for key in keys]
+
+    def contains(self, text: str) -> bool:
+        """Vecteur déjà en mémoire pour ce texte (sans lecture SQLite ni effet sur le LRU)"""
+        with self._lock:
+            return self._key(text) in self._entries
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent": self._db is not None,
+        }
+
+    # ----- Cache -----
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.model_name}\0{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, texts: List[str]):
+        """Retourne les clés, les vecteurs déjà connus et {clé manquante: index du texte}"""
+        keys, results, missing = self._lookup_memory(texts)
+        if missing and self._db is not None:
+            self._load_persisted(results, missing)
+        self._count(results, missing)
+        return keys, results, missing
+
+    async def _alookup(self, texts: List[str]):
+        """Comme _lookup, la lecture SQLite se fait dans un thread (boucle asyncio libre)"""
+        keys, results, missing = self._lookup_memory(texts)
+        if missing and self._db is not None:
+            await asyncio.to_thread(self._load_persisted, results, missing)
+        self._count(results, missing)
+        return keys, results, missing
+
+    def _lookup_memory(self, texts: List[str]):
+        keys = [self._key(text) for text in texts]
+        results: Dict[str, List[float]] = {}
+        missing: Dict[str, int] = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                if key in results or key in missing:
+                    continue
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing[key] = index
+                else:
+                    self._entries.move_to_end(key)
+                    results[key] = vector
+        return keys, results, missing
+
+    def _load_persisted(self, results: Dict[str, List[float]], missing: Dict[str, int]) -> None:
+        """Complète depuis SQLite les clés absentes de la mémoire (déplacées de missing vers results)"""
+        with self._db_lock:
+            rows = [
+                (key, self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone())
+                for key in missing
+            ]
+        found = {key: np.frombuffer(row[0], dtype=np.float32).tolist() for key, row in rows if row is not None}
+        with self._lock:
+            for key, vector in found.items():
+                self._put(key, vector)
+        for key, vector in found.items():
+            results[key] = vector
+            del missing[key]
+
+    def _count(self, results: Dict, missing: Dict) -> None:
+        with self._lock:
+            self.hits += len(results)
+            self.misses += len(missing)
+
+    def _store(self, keys: List[str], vectors: List[List[float]]) -> None:
+        self._remember(keys, vectors)
+        if self._db is not None:
+            self._persist(keys, vectors)
+
+    async def _astore(self, keys: List[str], vectors: List[List[float]]) -> None:
+        self._remember(keys, vectors)
+        if self._db is not None:
+            await asyncio.to_thread(self._persist, keys, vectors)
+
+    def _remember(self, keys: List[str], vectors: List[List[float]]) -> None:
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._put(key, vector)
+
+    def _persist(self, keys: List[str], vectors: List[List[float]]) -> None:
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes())
+                    for key, vector in zip(keys, vectors)
+                ],
+            )
+            self._db.commit()
+
+    def _put(self, key: str, vector: List[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,35 +1,93 @@
 import os
+import json
+import uuid
+import hashlib
+import argparse
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_mistralai import MistralAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient, models
-from qdrantdb import get_vector_config
+from qdrantdb import (
+    INDEX_DIR,
+    get_vector_config,
+    get_embeddings,
+    new_collection_version,
+    bump_collection_version,
+    export_snapshot,
+    save_lexical_index,
+    local_artifacts_current
+)
 
 load_dotenv()
 
-def run_ingestion():
-    # 1. Chargement des documents 
-    files = ["./documents/Installation.pdf", "./documents/Depannage.pdf"]
-    all_docs = []
-    
-    for file_path in files:
-        if os.path.exists(file_path):
-            print(f"📄 Chargement de {file_path}...")
-            loader = PyPDFLoader(file_path)
-            all_docs.extend(loader.load())
-     
-                    
-    # 2. Découper le texte en (Chunks)
-    text_splitter = RecursiveCharacterTextSplitter(
+DOCUMENTS_DIR = Path(__file__).parent / "documents"
+MANIFEST_FILE = INDEX_DIR / "manifest.json"
+PAGES_DIR = INDEX_DIR / "pages"
+
+# Espace de noms des IDs de points : même fichier + même texte => même ID
+POINT_NAMESPACE = uuid.UUID("6f1c2b8e-3d4a-5e6f-8a9b-0c1d2e3f4a5b")
+EMBED_BATCH_SIZE = 64
+UPSERT_BATCH_SIZE = 64
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict:
+    """Manifeste de la dernière ingestion : {"files": {source: {"sha256", "chunks": [[id, hash]]}}}"""
+    if not MANIFEST_FILE.exists():
+        return {"files": {}}
+    with open(MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict):
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def load_pages(path: Path, source: str, file_hash: str) -> list:
+    """Texte des pages d'un PDF, mis en cache par hash du fichier (pas de re-parsing)"""
+    cache_path = PAGES_DIR / f"{file_hash}.json"
+    if cache_path.exists():
+        with open(cache_path, encoding="utf-8") as f:
+            pages = [Document(page_content=p["page_content"], metadata=p["metadata"]) for p in json.load(f)]
+    else:
+        print(f"📄 Chargement de {source}...")
+        pages = PyPDFLoader(str(path)).load()
+        for page in pages:
+            # Le texte extrait peut contenir des caractères invalides (surrogates)
+            page.page_content = page.page_content.encode("utf-8", "ignore").decode("utf-8")
+        PAGES_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([{"page_content": p.page_content, "metadata": p.metadata} for p in pages], f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+
+    for page in pages:
+        page.metadata["source"] = source
+    return pages
+
+
+def make_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
         separators=["\n\n", "\n", " ", ""],
-        chunk_size=800, 
+        chunk_size=800,
         chunk_overlap=100,
         length_function=len)
-    
-    raw_chunks = text_splitter.split_documents(all_docs)
 
+
+def clean_chunks(raw_chunks: list) -> list:
     # --- ÉTAPE DE SÉCURITÉ : NETTOYAGE ---
     # On enlève les chunks vides ou qui ne sont pas du texte pur
     chunks = []
@@ -39,34 +97,218 @@ def run_ingestion():
         if len(text_content.strip()) > 20:
             c.page_content = text_content
             chunks.append(c)
-            
-    #print(f"Nombre de chunks créés : {len(chunks)}")
-    #print(f"Contenu du 2eme chunk : {chunks[1].page_content}")
-    
-    #3. Initialisation du client Qdrant Cloud
-    config = get_vector_config()
-    
-    
-    #4. Créer les Embeddings et envoyer vers Qdrant
-    embeddings = MistralAIEmbeddings(api_key=os.getenv("MISTRAL_API_KEY"))
-    
-    print(f"Envoi de {len(chunks)} fragments vers Qdrant...")
-    
-    QdrantVectorStore.from_documents(
-        chunks,
-        embeddings,
-        url = config["url"],
-        api_key = config["api_key"],
-        collection_name = config["collection_name"],
-        batch_size=10,     # <--- On envoie par paquets de 10 chunks (plus léger)
-        force_recreate=True,
-        timeout=180       
+    return chunks
+
+
+def split_pages(pages: list) -> list:
+    """Découpage en chunks + nettoyage (même paramètres qu'avant)"""
+    return clean_chunks(make_splitter().split_documents(pages))
+
+
+def point_ids(source: str, chunks: list) -> list:
+    """
+    IDs déterministes : (source, hash du texte, n-ième occurrence de ce texte).
+    Un chunk inchangé garde son ID même si le reste du fichier bouge.
+    """
+    seen = {}
+    result = []
+    for c in chunks:
+        text_hash = hashlib.sha256(c.page_content.encode("utf-8")).hexdigest()
+        occurrence = seen.get(text_hash, 0)
+        seen[text_hash] = occurrence + 1
+        point_id = str(uuid.uuid5(POINT_NAMESPACE, f"{source}|{text_hash}|{occurrence}"))
+        result.append((point_id, text_hash))
+    return result
+
+
+def existing_point_ids(client: QdrantClient, collection: str) -> set:
+    ids, offset = set(), None
+    while True:
+        points, offset = client.scroll(collection_name=collection, limit=1000, offset=offset)
+        ids.update(str(point.id) for point in points)
+        if offset is None:
+            return ids
+
+
+def list_documents(documents_dir: Path = DOCUMENTS_DIR) -> list:
+    """[(chemin, source)] de tous les PDF ; source = chemin relatif stable (ex: documents/Installation.pdf)"""
+    documents_dir = Path(documents_dir)
+    return [
+        (path, path.relative_to(documents_dir.parent).as_posix())
+        for path in sorted(documents_dir.rglob("*.pdf"))
+    ]
+
+
+def prepare_collection(client: QdrantClient, collection: str, rebuild: bool):
+    """Retourne (fichiers du manifeste précédent, IDs orphelins à supprimer)"""
+    manifest = load_manifest()
+    if rebuild and client.collection_exists(collection):
+        client.delete_collection(collection)
+
+    orphan_ids = set()
+    if not client.collection_exists(collection):
+        # Collection absente (1ère ingestion ou --rebuild) : tout est à envoyer
+        manifest = {"files": {}}
+    elif not MANIFEST_FILE.exists():
+        # Collection créée par l'ancienne ingestion (IDs aléatoires) : ses points
+        # seront remplacés, puis supprimés une fois les nouveaux envoyés
+        orphan_ids = existing_point_ids(client, collection)
+    return manifest["files"], orphan_ids
+
+
+def file_status(previous_files: dict, source: str, file_hash: str) -> str:
+    previous = previous_files.get(source)
+    if previous is None:
+        return "ajoutés"
+    if previous["sha256"] != file_hash:
+        return "modifiés"
+    return "inchangés"
+
+
+def to_point(point_id: str, chunk: Document, vector: list) -> models.PointStruct:
+    # Même payload que langchain_qdrant
+    return models.PointStruct(
+        id=point_id,
+        vector=vector,
+        payload={"page_content": chunk.page_content, "metadata": chunk.metadata}
     )
-    print("Ingestion terminée !👌 Vos deux manuels sont prêts.")
-    
 
-    
+
+def print_summary(diff: dict, added: int, deleted: int, kept: int):
+    print("📋 Résumé des changements :")
+    for status, sources in diff.items():
+        if sources:
+            print(f"   {status:<10} {len(sources):>3} fichier(s) : {', '.join(sources)}")
+    print(f"   chunks : +{added} nouveaux, -{deleted} supprimés, {kept} conservés")
+
+
+def finalize(client: QdrantClient, collection: str, current_files: dict, chunks_by_id: dict, to_delete: list):
+    """Suppressions, artefacts locaux, nouvelle version de la collection puis manifeste"""
+    # Suppression après l'ajout : l'index n'est jamais vide pendant la mise à jour
+    if to_delete:
+        client.delete(
+            collection_name=collection,
+            points_selector=models.PointIdsList(points=to_delete)
+        )
+
+    version = new_collection_version()
+
+    # Snapshot local pour le mode RETRIEVER_BACKEND=numpy
+    exported = export_snapshot(version)
+    print(f"📦 Snapshot local écrit ({exported} vecteurs)")
+
+    # Index lexical BM25 (même payload que Qdrant)
+    ids = list(chunks_by_id)
+    save_lexical_index(
+        ids,
+        [{"page_content": chunks_by_id[i].page_content, "metadata": chunks_by_id[i].metadata} for i in ids],
+        version
+    )
+    print("🔤 Index BM25 écrit")
+
+    # Nouvelle version de la collection : les caches côté serveur sont invalidés
+    bump_collection_version(version)
+
+    # Manifeste en dernier : une ingestion interrompue avant ce point est rejouée
+    save_manifest({"files": current_files})
+
+
+def nothing_to_do(client: QdrantClient, collection: str, documents_dir: Path, chunks_by_id: dict, upserted: int, to_delete: list) -> bool:
+    """
+    Vrai si l'ingestion peut s'arrêter là : aucun extrait pour une collection
+    qui n'existe pas, ou collection à jour avec snapshot et BM25 à la version courante
+    """
+    if not chunks_by_id and not client.collection_exists(collection):
+        print(f"⚠️ Aucun extrait à indexer dans {documents_dir} et pas de collection « {collection} » : rien n'est écrit.")
+        return True
+    if upserted or to_delete:
+        return False
+    if local_artifacts_current():
+        print("Rien à faire ✅ : la collection est déjà à jour.")
+        return True
+    print("♻️ Collection à jour, mais snapshot ou index BM25 absent ou périmé : régénération.")
+    return False
+
+
+def run_ingestion(rebuild: bool = False, documents_dir: Path = DOCUMENTS_DIR):
+    config = get_vector_config()
+    collection = config["collection_name"]
+    client = QdrantClient(url=config["url"], api_key=config["api_key"], timeout=180)
+
+    previous_files, orphan_ids = prepare_collection(client, collection, rebuild)
+
+    # 1. Chargement des documents (seuls les fichiers modifiés sont re-parsés)
+    current_files = {}
+    chunks_by_id = {}
+    diff = {"ajoutés": [], "modifiés": [], "inchangés": [], "supprimés": []}
+
+    for path, source in list_documents(documents_dir):
+        file_hash = sha256_file(path)
+        diff[file_status(previous_files, source, file_hash)].append(source)
+
+        # 2. Découper le texte en (Chunks)
+        chunks = split_pages(load_pages(path, source, file_hash))
+        ids = point_ids(source, chunks)
+        current_files[source] = {"sha256": file_hash, "chunks": [list(pair) for pair in ids]}
+        for (point_id, _), c in zip(ids, chunks):
+            chunks_by_id[point_id] = c
+
+    diff["supprimés"] = sorted(set(previous_files) - set(current_files))
+
+    # 3. Diff des chunks par ID
+    previous_ids = {point_id for entry in previous_files.values() for point_id, _ in entry["chunks"]}
+    previous_ids |= orphan_ids
+    to_upsert = [point_id for point_id in chunks_by_id if point_id not in previous_ids]
+    to_delete = sorted(previous_ids - set(chunks_by_id))
+    print_summary(diff, len(to_upsert), len(to_delete), len(chunks_by_id) - len(to_upsert))
+
+    if nothing_to_do(client, collection, documents_dir, chunks_by_id, len(to_upsert), to_delete):
+        return
+
+    #4. Créer les Embeddings (avec cache) des seuls nouveaux chunks et envoyer vers Qdrant
+    embeddings = get_embeddings()
+    collection_ready = client.collection_exists(collection)
+    for start in range(0, len(to_upsert), EMBED_BATCH_SIZE):
+        batch_ids = to_upsert[start:start + EMBED_BATCH_SIZE]
+        batch = [chunks_by_id[point_id] for point_id in batch_ids]
+        vectors = embeddings.embed_documents([c.page_content for c in batch])
+
+        if not collection_ready:
+            client.create_collection(
+                collection_name=collection,
+                vectors_config=models.VectorParams(size=len(vectors[0]), distance=models.Distance.COSINE)
+            )
+            collection_ready = True
+
+        points = [to_point(point_id, c, vector) for point_id, c, vector in zip(batch_ids, batch, vectors)]
+        for offset in range(0, len(points), UPSERT_BATCH_SIZE):
+            client.upsert(collection_name=collection, points=points[offset:offset + UPSERT_BATCH_SIZE])
+        print(f"   ⬆️  {min(start + EMBED_BATCH_SIZE, len(to_upsert))}/{len(to_upsert)} chunks envoyés")
+
+    finalize(client, collection, current_files, chunks_by_id, to_delete)
+    print("Ingestion terminée !👌 Vos manuels sont prêts.")
+
+
+
 if __name__ == "__main__":
-    run_ingestion()
-    
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingestion incrémentale des manuels dans Qdrant")
+    parser.add_argument("--rebuild", action="store_true", help="Recréer la collection et tout ré-envoyer")
+    parser.add_argument("--documents", type=Path, default=DOCUMENTS_DIR, help="Dossier des PDF (parcouru récursivement)")
+    parser.add_argument("--pipeline", action="store_true", help="Mode parallèle : parsing multi-processus, embeddings concurrents")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processus de parsing (--pipeline)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requêtes d'embedding simultanées (--pipeline)")
+    parser.add_argument("--batch-size", type=int, default=128, help="Chunks par requête d'embedding (--pipeline)")
+    args = parser.parse_args()
+
+    if args.pipeline:
+        import asyncio
+        from ingest_pipeline import run_pipeline
+        asyncio.run(run_pipeline(
+            rebuild=args.rebuild,
+            documents_dir=args.documents,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size
+        ))
+    else:
+        run_ingestion(rebuild=args.rebuild, documents_dir=args.documents)
@@ -0,0 +1,231 @@
+"""
+Ingestion en pipeline pour de gros volumes de manuels :
+- parsing des PDF dans un pool de processus, page par page jusqu'au découpage
+- embeddings par gros lots, avec concurrence bornée et retry/backoff sur les limites de débit
+- upserts Qdrant asynchrones, en parallèle des embeddings
+
+Même manifeste, mêmes IDs et mêmes artefacts (snapshot, BM25) que l'ingestion séquentielle.
+Usage (depuis le dossier ai/) :
+    python ingest_data.py --pipeline [--documents DIR] [--workers 8] [--concurrency 4] [--batch-size 128]
+"""
+import os
+import json
+import time
+import random
+import asyncio
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from qdrantdb import get_vector_config, get_embeddings
+from ingest_data import (
+    DOCUMENTS_DIR,
+    PAGES_DIR,
+    sha256_file,
+    make_splitter,
+    clean_chunks,
+    point_ids,
+    list_documents,
+    prepare_collection,
+    file_status,
+    to_point,
+    print_summary,
+    nothing_to_do,
+    finalize,
+)
+
+MAX_RETRIES = 6
+MAX_BACKOFF_SECONDS = 60
+
+
+def parse_document(path_str: str, source: str) -> dict:
+    """
+    Exécuté dans un processus du pool : hash du fichier, puis chaque page est
+    découpée dès qu'elle est extraite (le document complet n'est jamais en mémoire).
+    Le texte des pages est mis en cache par hash comme dans l'ingestion séquentielle.
+    """
+    file_hash = sha256_file(Path(path_str))
+    cache_path = PAGES_DIR / f"{file_hash}.json"
+    parsed = not cache_path.exists()
+    if parsed:
+        pages = PyPDFLoader(path_str).lazy_load()
+    else:
+        with open(cache_path, encoding="utf-8") as f:
+            pages = [Document(page_content=p["page_content"], metadata=p["metadata"]) for p in json.load(f)]
+
+    splitter = make_splitter()
+    page_records = []
+    chunks = []
+    for page in pages:
+        # Le texte extrait peut contenir des caractères invalides (surrogates)
+        page.page_content = page.page_content.encode("utf-8", "ignore").decode("utf-8")
+        if parsed:
+            page_records.append({"page_content": page.page_content, "metadata": dict(page.metadata)})
+        page.metadata["source"] = source
+        chunks.extend(clean_chunks(splitter.split_documents([page])))
+
+    if parsed:
+        PAGES_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(page_records, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+
+    return {
+        "source": source,
+        "file_hash": file_hash,
+        "pages": len(page_records) if parsed else len(pages),
+        "parsed": parsed,
+        "chunks": [(c.page_content, c.metadata) for c in chunks],
+    }
+
+
+def is_retryable(error: Exception) -> bool:
+    """Limite de débit (429), erreur serveur (5xx) ou timeout"""
+    if isinstance(error, httpx.TimeoutException):
+        return True
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+async def embed_with_retry(embeddings, texts: list) -> list:
+    delay = 1.0
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await embeddings.aembed_documents(texts)
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                raise
+            wait = delay + random.uniform(0, delay / 2)
+            print(f"   ⏳ Embedding limité ({e.__class__.__name__}), nouvel essai dans {wait:.1f} s")
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+
+
+async def run_pipeline(
+    rebuild: bool = False,
+    documents_dir: Path = DOCUMENTS_DIR,
+    workers: int = 4,
+    concurrency: int = 4,
+    batch_size: int = 128,
+):
+    started = time.perf_counter()
+    config = get_vector_config()
+    collection = config["collection_name"]
+    client = QdrantClient(url=config["url"], api_key=config["api_key"], timeout=180)
+    aclient = AsyncQdrantClient(url=config["url"], api_key=config["api_key"], timeout=180)
+    embeddings = get_embeddings()
+
+    previous_files, orphan_ids = prepare_collection(client, collection, rebuild)
+    previous_ids = {point_id for entry in previous_files.values() for point_id, _ in entry["chunks"]}
+    previous_ids |= orphan_ids
+
+    current_files = {}
+    chunks_by_id = {}
+    diff = {"ajoutés": [], "modifiés": [], "inchangés": [], "supprimés": []}
+    stats = {"files": 0, "pages": 0, "parsed": 0, "chunks": 0, "embedded": 0, "upserted": 0}
+
+    # Files bornées : le parsing ne prend pas trop d'avance sur les embeddings
+    embed_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    collection_lock = asyncio.Lock()
+    collection_ready = client.collection_exists(collection)
+
+    async def produce():
+        """Parsing parallèle ; les nouveaux chunks partent en lots dès qu'un fichier est prêt"""
+        loop = asyncio.get_running_loop()
+        pending = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                loop.run_in_executor(pool, parse_document, str(path), source)
+                for path, source in list_documents(documents_dir)
+            ]
+            for future in asyncio.as_completed(futures):
+                result = await future
+                source = result["source"]
+                chunks = [Document(page_content=text, metadata=metadata) for text, metadata in result["chunks"]]
+                ids = point_ids(source, chunks)
+
+                diff[file_status(previous_files, source, result["file_hash"])].append(source)
+                current_files[source] = {"sha256": result["file_hash"], "chunks": [list(pair) for pair in ids]}
+                stats["files"] += 1
+                stats["pages"] += result["pages"]
+                stats["parsed"] += int(result["parsed"])
+                stats["chunks"] += len(chunks)
+
+                for (point_id, _), c in zip(ids, chunks):
+                    chunks_by_id[point_id] = c
+                    if point_id not in previous_ids:
+                        pending.append(point_id)
+                while len(pending) >= batch_size:
+                    await embed_queue.put(pending[:batch_size])
+                    pending = pending[batch_size:]
+
+        if pending:
+            await embed_queue.put(pending)
+        for _ in range(concurrency):
+            await embed_queue.put(None)
+
+    async def ensure_collection(size: int):
+        nonlocal collection_ready
+        async with collection_lock:
+            if not collection_ready:
+                await aclient.create_collection(
+                    collection_name=collection,
+                    vectors_config=models.VectorParams(size=size, distance=models.Distance.COSINE)
+                )
+                collection_ready = True
+
+    async def embedder():
+        while (batch_ids := await embed_queue.get()) is not None:
+            batch = [chunks_by_id[point_id] for point_id in batch_ids]
+            vectors = await embed_with_retry(embeddings, [c.page_content for c in batch])
+            await ensure_collection(len(vectors[0]))
+            stats["embedded"] += len(batch)
+            await upsert_queue.put([to_point(point_id, c, vector) for point_id, c, vector in zip(batch_ids, batch, vectors)])
+
+    async def embed_stage():
+        await asyncio.gather(*(embedder() for _ in range(concurrency)))
+        await upsert_queue.put(None)
+
+    async def upserter():
+        """Les upserts se font pendant que les lots suivants sont encodés"""
+        while (points := await upsert_queue.get()) is not None:
+            await aclient.upsert(collection_name=collection, points=points)
+            stats["upserted"] += len(points)
+            print(f"   ⬆️  {stats['upserted']} chunks envoyés ({stats['files']} fichier(s) parsés)")
+
+    tasks = [asyncio.create_task(coro) for coro in (produce(), embed_stage(), upserter())]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        await aclient.close()
+
+    diff["supprimés"] = sorted(set(previous_files) - set(current_files))
+    to_delete = sorted(previous_ids - set(chunks_by_id))
+    print_summary(diff, stats["upserted"], len(to_delete), len(chunks_by_id) - stats["upserted"])
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"⏱️  {elapsed:.1f} s : {stats['pages'] / elapsed:.1f} pages/s, "
+        f"{stats['chunks'] / elapsed:.1f} chunks/s, {stats['embedded'] / elapsed:.1f} chunks encodés/s "
+        f"({stats['parsed']} PDF parsés, {stats['files'] - stats['parsed']} depuis le cache)"
+    )
+
+    if nothing_to_do(client, collection, documents_dir, chunks_by_id, stats["upserted"], to_delete):
+        return
+
+    finalize(client, collection, current_files, chunks_by_id, to_delete)
+    print("Ingestion terminée !👌 Vos manuels sont prêts.")
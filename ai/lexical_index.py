@@ -0,0 +1,124 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LEXICAL_INDEX_FILE = "bm25.json"
+
+# Mots vides français/anglais : ils ne distinguent aucun extrait
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "cette", "comment", "dans", "de", "des", "du",
+    "elle", "en", "est", "et", "faire", "il", "je", "la", "le", "les", "leur", "ma", "mais",
+    "me", "mes", "mon", "ne", "ni", "nous", "on", "ou", "par", "pas", "pour", "qu", "que",
+    "quel", "quelle", "quelles", "quels", "qui", "sa", "se", "ses", "son", "sont", "sur",
+    "ta", "te", "tes", "ton", "tu", "un", "une", "vos", "votre", "vous", "y",
+    "an", "and", "are", "how", "in", "is", "it", "my", "of", "on", "or", "the", "to", "what",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscules, sans accents, sans mots vides ("Électrovanne" -> "electrovanne")"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [
+        token for token in re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", text)
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+class BM25Index:
+    """
+    Index BM25 compact (index inversé) sur les mêmes extraits que Qdrant.
+    Permet de répondre aux requêtes contenant des termes exacts (pièces,
+    références de modèles) sans appeler le modèle d'embeddings.
+    """
+
+    def __init__(self, ids: List, payloads: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.ids = list(ids)
+        self.payloads = payloads
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        for row, payload in enumerate(payloads):
+            counts = Counter(tokenize(payload.get("page_content", "")))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((row, tf))
+
+        total = len(self.doc_lengths)
+        self.avg_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+        # idf d'un terme absent du corpus (df = 0)
+        self.max_idf = math.log(1 + (total + 0.5) / 0.5) if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        Retourne ([(ligne, score)], couverture) : la couverture est la part
+        (pondérée par l'idf) des termes de la requête présents dans le 1er résultat.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.ids:
+            return [], 0.0
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, set] = {}
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for row, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[row] / (self.avg_length or 1))
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched.setdefault(row, set()).add(term)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if not ranked:
+            return [], 0.0
+
+        total_weight = sum(self.idf.get(term, self.max_idf) for term in terms)
+        best_terms = matched[ranked[0][0]]
+        coverage = sum(self.idf[term] for term in best_terms) / total_weight if total_weight else 0.0
+        return ranked, coverage
+
+    def save(self, directory: Path, collection_version: str) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = directory / (LEXICAL_INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"collection_version": collection_version, "ids": self.ids, "payloads": self.payloads},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, directory / LEXICAL_INDEX_FILE)
+
+    @staticmethod
+    def stored_version(directory: Path) -> Optional[str]:
+        """Version de collection de l'index écrit sur disque, ou None s'il est absent"""
+        path = Path(directory) / LEXICAL_INDEX_FILE
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("collection_version", "0")
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional[Tuple["BM25Index", str]]:
+        """Recharge l'index (reconstruit en mémoire) ; retourne (index, version) ou None"""
+        path = Path(directory) / LEXICAL_INDEX_FILE
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["payloads"]), data.get("collection_version", "0")
@@ -1,15 +1,55 @@
 import os
+import json
+import uuid
+from datetime import datetime
 from dotenv import load_dotenv
 from langchain_mistralai import MistralAIEmbeddings
 from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+try:
+    from ai.embedding_cache import CachedEmbeddings
+    from ai.vector_index import NumpyVectorIndex, fetch_collection, load_snapshot, save_snapshot, snapshot_version
+    from ai.lexical_index import BM25Index
+except ImportError:  # lancé depuis ai/ (python ingest_data.py)
+    from embedding_cache import CachedEmbeddings
+    from vector_index import NumpyVectorIndex, fetch_collection, load_snapshot, save_snapshot, snapshot_version
+    from lexical_index import BM25Index
 
 from pathlib import Path
 
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+# Dossier local des artefacts d'ingestion (version de la collection, index, caches)
+INDEX_DIR = Path(os.getenv("INDEX_DIR", Path(__file__).parent / "index"))
+VERSION_FILE = INDEX_DIR / "collection_version.json"
+SNAPSHOT_DIR = INDEX_DIR / "snapshot"
+
+# Cache (mtime, version) pour ne relire le fichier que s'il a changé
+_version_cache = (None, "0")
+_embeddings_instance = None
+
 def get_embeddings():
-    return MistralAIEmbeddings(api_key=os.getenv("MISTRAL_API_KEY"))
+    """
+    Embeddings Mistral partagés par tout le processus, derrière un cache LRU.
+    EMBEDDING_CACHE_PATH (optionnel, relatif au dossier ai/) persiste le cache
+    dans un fichier SQLite.
+    """
+    global _embeddings_instance
+    if _embeddings_instance is None:
+        persist_path = None
+        if os.getenv("EMBEDDING_CACHE_PATH"):
+            persist_path = Path(__file__).parent / os.getenv("EMBEDDING_CACHE_PATH")
+            persist_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        model = MistralAIEmbeddings(api_key=os.getenv("MISTRAL_API_KEY"))
+        _embeddings_instance = CachedEmbeddings(
+            model,
+            model_name=model.model,
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+            persist_path=str(persist_path) if persist_path else None
+        )
+    return _embeddings_instance
 
 def get_vector_config():
     """Retourne les paramètres de connexion pour Qdrant"""
@@ -18,4 +58,79 @@ def get_vector_config():
         "api_key": os.getenv("QDRANT_API_KEY"),
         "collection_name": "installation-depannage"
     }
-    
\ No newline at end of file
+
+def get_collection_version() -> str:
+    """
+    Version courante de la collection, changée à chaque ingestion.
+    Les caches (réponses, recherches) comparent leurs entrées à cette version.
+    """
+    global _version_cache
+    try:
+        mtime = VERSION_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    if _version_cache[0] != mtime:
+        with open(VERSION_FILE, encoding="utf-8") as f:
+            _version_cache = (mtime, json.load(f).get("version", "0"))
+    return _version_cache[1]
+
+def new_collection_version() -> str:
+    return uuid.uuid4().hex
+
+def bump_collection_version(version: str = None) -> str:
+    """
+    Appelé par l'ingestion : invalide toutes les entrées de cache existantes.
+    Les artefacts locaux (snapshot, BM25) doivent être écrits avant, avec la même version.
+    """
+    version = version or new_collection_version()
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = VERSION_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "updated_at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, VERSION_FILE)
+    return version
+
+def load_vector_index(quantize: bool = False):
+    """
+    Index numpy en mémoire pour RETRIEVER_BACKEND=numpy.
+    Utilise le snapshot local s'il correspond à la version courante,
+    sinon charge tous les points depuis Qdrant (une seule fois).
+    Retourne (index, version).
+    """
+    version = get_collection_version()
+    snapshot = load_snapshot(SNAPSHOT_DIR, quantize=quantize)
+    if snapshot is not None and snapshot[1] == version:
+        return snapshot
+    
+    config = get_vector_config()
+    client = QdrantClient(url=config["url"], api_key=config["api_key"], timeout=60)
+    ids, vectors, payloads = fetch_collection(client, config["collection_name"])
+    print(f"📦 Index numpy chargé depuis Qdrant : {len(ids)} extraits")
+    return NumpyVectorIndex(ids, vectors, payloads, quantize=quantize), version
+
+def export_snapshot(version: str):
+    """Appelé par l'ingestion : écrit le snapshot local de la collection"""
+    config = get_vector_config()
+    client = QdrantClient(url=config["url"], api_key=config["api_key"], timeout=180)
+    ids, vectors, payloads = fetch_collection(client, config["collection_name"])
+    save_snapshot(SNAPSHOT_DIR, ids, vectors, payloads, version)
+    return len(ids)
+
+def local_artifacts_current() -> bool:
+    """
+    Vrai si le snapshot local et l'index BM25 existent et portent la version courante.
+    Sinon l'ingestion doit les réécrire, même sans document modifié.
+    """
+    version = get_collection_version()
+    stored = (snapshot_version(SNAPSHOT_DIR), BM25Index.stored_version(INDEX_DIR))
+    return version != "0" and all(v == version for v in stored)
+
+def load_lexical_index():
+    """Index BM25 écrit par l'ingestion ; retourne (index, version) ou None"""
+    return BM25Index.load(INDEX_DIR)
+
+def save_lexical_index(ids, payloads, version: str):
+    """Appelé par l'ingestion : construit l'index BM25 sur les mêmes extraits que Qdrant"""
+    index = BM25Index(ids, payloads)
+    index.save(INDEX_DIR, version)
+    return index
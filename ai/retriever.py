@@ -0,0 +1,320 @@
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+try:
+    from ai.embedding_cache import normalize_text
+    from ai.vector_index import NumpyVectorIndex
+    from ai.lexical_index import BM25Index
+except ImportError:  # lancé depuis ai/
+    from embedding_cache import normalize_text
+    from vector_index import NumpyVectorIndex
+    from lexical_index import BM25Index
+
+
+def payload_to_document(point_id, score: float, payload: Optional[Dict], collection_name: str) -> Document:
+    """Même format que langchain_qdrant : payload {"page_content": ..., "metadata": {...}}"""
+    payload = payload or {}
+    metadata = dict(payload.get("metadata") or {})
+    metadata["_id"] = point_id
+    metadata["_score"] = score
+    metadata["_collection_name"] = collection_name
+    return Document(page_content=payload.get("page_content", ""), metadata=metadata)
+
+
+class QdrantAsyncRetriever(BaseRetriever):
+    """
+    Retriever Qdrant avec un vrai chemin asynchrone.
+    - ainvoke : embedding via aembed_query + recherche via AsyncQdrantClient,
+      la boucle d'événements n'est jamais bloquée.
+    - invoke : même recherche avec le client synchrone (scripts, tests manuels).
+    Les documents ont le même format que ceux de QdrantVectorStore.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    collection_name: str
+    url: Optional[str] = None
+    api_key: Optional[str] = None
+    k: int = 3
+    timeout: int = 30
+
+    _client: Optional[QdrantClient] = PrivateAttr(default=None)
+    _async_client: Optional[AsyncQdrantClient] = PrivateAttr(default=None)
+
+    @property
+    def client(self) -> QdrantClient:
+        if self._client is None:
+            self._client = QdrantClient(url=self.url, api_key=self.api_key, timeout=self.timeout)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        if self._async_client is None:
+            self._async_client = AsyncQdrantClient(url=self.url, api_key=self.api_key, timeout=self.timeout)
+        return self._async_client
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        response = self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            limit=self.k,
+            with_payload=True,
+        )
+        return [self._to_document(point) for point in response.points]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        response = await self.async_client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            limit=self.k,
+            with_payload=True,
+        )
+        return [self._to_document(point) for point in response.points]
+
+    def _to_document(self, point) -> Document:
+        return payload_to_document(point.id, point.score, point.payload, self.collection_name)
+
+
+class NumpyIndexRetriever(BaseRetriever):
+    """
+    Remplaçant du retriever Qdrant pour un petit corpus : tous les vecteurs sont
+    chargés en mémoire (snapshot local ou collection Qdrant) et la recherche
+    se fait dans le processus, sans appel réseau hormis l'embedding de la requête.
+    L'index est rechargé quand la version de la collection change.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    loader: Callable[[], Tuple[NumpyVectorIndex, str]]
+    version_fn: Callable[[], str]
+    collection_name: str
+    k: int = 3
+
+    _index: Optional[NumpyVectorIndex] = PrivateAttr(default=None)
+    _version: Optional[str] = PrivateAttr(default=None)
+
+    def load(self) -> NumpyVectorIndex:
+        """Charge (ou recharge) l'index ; à appeler au démarrage pour éviter la latence du 1er appel"""
+        self._index, self._version = self.loader()
+        return self._index
+
+    def _current_index(self) -> NumpyVectorIndex:
+        if self._index is None or self._version != self.version_fn():
+            self.load()
+        return self._index
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        index = self._current_index()
+        return self._search(index, self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self._index is None or self._version != self.version_fn():
+            await asyncio.to_thread(self.load)
+        vector = await self.embeddings.aembed_query(query)
+        # Quelques centaines de lignes : la recherche prend quelques microsecondes
+        return self._search(self._index, vector)
+
+    def _search(self, index: NumpyVectorIndex, vector: List[float]) -> List[Document]:
+        return [
+            payload_to_document(index.ids[row], score, index.payloads[row], self.collection_name)
+            for row, score in index.search(vector, self.k)
+        ]
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Cache des résultats de recherche : requête normalisée -> top-k extraits.
+    Chaque entrée est marquée avec la version de la collection ; l'ingestion
+    change la version, donc une entrée obsolète n'est jamais servie.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: BaseRetriever
+    version_fn: Callable[[], str]
+    max_entries: int = 1024
+
+    _entries: "OrderedDict[str, Tuple[str, List[Document]]]" = PrivateAttr(default_factory=OrderedDict)
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key, version = self._key(query), self.version_fn()
+        cached = self._get(key, version)
+        if cached is not None:
+            return cached
+        docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        self._put(key, version, docs)
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key, version = self._key(query), self.version_fn()
+        cached = self._get(key, version)
+        if cached is not None:
+            return cached
+        docs = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        self._put(key, version, docs)
+        return docs
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return normalize_text(query).casefold()
+
+    def _get(self, key: str, version: str) -> Optional[List[Document]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return self._copy(entry[1])
+
+    def _put(self, key: str, version: str, docs: List[Document]) -> None:
+        self._entries[key] = (version, self._copy(docs))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _copy(docs: List[Document]) -> List[Document]:
+        # Copies : un appelant qui modifie ses documents ne corrompt pas le cache
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Recherche lexicale BM25 d'abord, recherche dense seulement si nécessaire.
+    - Si le 1er résultat BM25 couvre la requête (couverture >= min_coverage) et
+      qu'il y a au moins k résultats, on répond sans embedding ni Qdrant.
+    - Sinon on fusionne les deux listes par Reciprocal Rank Fusion.
+    Sans index lexical (pas encore d'ingestion), on passe directement au dense.
+    Statistiques : une réponse BM25 évite toujours la recherche dense, mais
+    n'évite l'embedding que si la requête n'était pas déjà dans le cache
+    d'embeddings (au 1er tour, le cache sémantique l'a déjà calculée).
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    dense: BaseRetriever
+    loader: Callable[[], Optional[Tuple[BM25Index, str]]]
+    version_fn: Callable[[], str]
+    collection_name: str
+    k: int = 3
+    min_coverage: float = 0.8
+    rrf_k: int = 60
+
+    _index: Optional[BM25Index] = PrivateAttr(default=None)
+    _version: Optional[str] = PrivateAttr(default=None)
+    _queries: int = PrivateAttr(default=0)
+    _dense_calls: int = PrivateAttr(default=0)
+    _embeddings_avoided: int = PrivateAttr(default=0)
+
+    def load(self) -> Optional[BM25Index]:
+        """Charge l'index BM25 et l'index dense s'il en a un (numpy) ; à appeler au démarrage"""
+        if hasattr(self.dense, "load"):
+            self.dense.load()
+        return self._current_index()
+
+    def _current_index(self) -> Optional[BM25Index]:
+        version = self.version_fn()
+        if self._version != version:
+            loaded = self.loader()
+            self._index = loaded[0] if loaded else None
+            # Index absent ou périmé : on le garde hors service jusqu'à la prochaine ingestion
+            if loaded and loaded[1] != version:
+                self._index = None
+            self._version = version
+        return self._index
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        lexical = self._lexical(self._current_index(), query)
+        if lexical is not None and lexical[1]:
+            self._count_fast_path(query)
+            return lexical[0]
+        self._dense_calls += 1
+        dense = self.dense.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(dense, lexical[0] if lexical else [])
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self._version != self.version_fn():
+            await asyncio.to_thread(self._current_index)
+        lexical = self._lexical(self._index, query)
+        if lexical is not None and lexical[1]:
+            self._count_fast_path(query)
+            return lexical[0]
+        self._dense_calls += 1
+        dense = await self.dense.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(dense, lexical[0] if lexical else [])
+
+    def stats(self) -> Dict:
+        return {
+            "lexical_index": self._index is not None,
+            "queries": self._queries,
+            "dense_calls": self._dense_calls,
+            "dense_searches_avoided": self._queries - self._dense_calls,
+            "embeddings_avoided": self._embeddings_avoided,
+        }
+
+    def _count_fast_path(self, query: str) -> None:
+        embeddings = getattr(self.dense, "embeddings", None)
+        if not (hasattr(embeddings, "contains") and embeddings.contains(query)):
+            self._embeddings_avoided += 1
+
+    def _lexical(self, index: Optional[BM25Index], query: str) -> Optional[Tuple[List[Document], bool]]:
+        """Résultats BM25 et indicateur de confiance (None sans index)"""
+        self._queries += 1
+        if index is None:
+            return None
+        ranked, coverage = index.search(query, self.k)
+        docs = [
+            payload_to_document(index.ids[row], score, index.payloads[row], self.collection_name)
+            for row, score in ranked
+        ]
+        return docs, coverage >= self.min_coverage and len(docs) >= self.k
+
+    def _fuse(self, dense: List[Document], lexical: List[Document]) -> List[Document]:
+        """Reciprocal Rank Fusion : score = somme de 1 / (rrf_k + rang)"""
+        if not lexical:
+            return dense[:self.k]
+        scores: Dict = {}
+        docs: Dict = {}
+        for results in (dense, lexical):
+            for rank, doc in enumerate(results):
+                key = doc.metadata.get("_id", doc.page_content)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                docs.setdefault(key, doc)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [docs[key] for key in ranked]
@@ -0,0 +1,92 @@
+"""
+Faux serveur MCP stdio (JSON-RPC 2.0, une requête par ligne) pour les essais
+et le benchmark du pool, sans Node.js ni compte Jira.
+
+Répond à initialize, ping, tools/list et tools/call (jira_create_issue renvoie
+une clé KAN-<n>). Les appels sont traités en parallèle, comme un vrai serveur.
+
+Variables d'environnement :
+    FAKE_MCP_STARTUP_MS   délai de démarrage simulé (chargement de Node.js)
+    FAKE_MCP_LATENCY_MS   durée simulée de l'appel Jira
+    FAKE_MCP_CRASH_AFTER  s'arrête brutalement après N appels tools/call (0 = jamais)
+
+Usage :
+    MCP_SERVER_COMMAND="python ai/tools/fake_mcp_server.py" MCP_SERVER_CWD=. ...
+"""
+import asyncio
+import itertools
+import json
+import os
+import sys
+
+STARTUP_MS = float(os.getenv("FAKE_MCP_STARTUP_MS", "0"))
+LATENCY_MS = float(os.getenv("FAKE_MCP_LATENCY_MS", "50"))
+CRASH_AFTER = int(os.getenv("FAKE_MCP_CRASH_AFTER", "0"))
+
+_ticket_numbers = itertools.count(1)
+_calls = itertools.count(1)
+
+
+def write(message: dict) -> None:
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+async def handle(message: dict) -> None:
+    method = message.get("method")
+    request_id = message.get("id")
+    if request_id is None:
+        return  # Notification (notifications/initialized) : pas de réponse
+
+    if method == "initialize":
+        result = {
+            "protocolVersion": message.get("params", {}).get("protocolVersion", "2024-11-05"),
+            "capabilities": {"tools": {}},
+            "serverInfo": {"name": "fake-mcp", "version": "1.0.0"}
+        }
+    elif method == "ping":
+        result = {}
+    elif method == "tools/list":
+        result = {"tools": [{"name": "jira_create_issue", "inputSchema": {"type": "object"}}]}
+    elif method == "tools/call":
+        if CRASH_AFTER and next(_calls) > CRASH_AFTER:
+            os._exit(1)
+        await asyncio.sleep(LATENCY_MS / 1000)
+        key = f"KAN-{next(_ticket_numbers)}"
+        result = {"content": [{"type": "text", "text": json.dumps({"key": key})}]}
+    else:
+        write({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32601, "message": f"Method not found: {method}"}})
+        return
+
+    write({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+
+async def main() -> None:
+    await asyncio.sleep(STARTUP_MS / 1000)
+    # Un vrai serveur Node.js écrit aussi des journaux : le client doit les ignorer
+    print("fake-mcp: ready", file=sys.stderr, flush=True)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    tasks = set()
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        task = asyncio.create_task(handle(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    # stdin fermé : on termine les appels en cours avant de quitter
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,16 +1,89 @@
 import subprocess
 import json
-import os
+import re
+
+from ai.tools.mcp_pool import MCP_DIR, MCPError, get_mcp_pool, mcp_server_command
+
+
+def build_ticket_arguments(summary, description, priority, assignee_group, user_email):
+    """Arguments de l'outil MCP jira_create_issue"""
+    return {
+        "projectKey": "KAN", # Clé projet de ton image
+        "issueType": "Task",
+        "summary": summary,
+        "description": f"RESPONSABLE : {assignee_group}\nPRIORITÉ : {priority}\nEMAIL : {user_email}\n\nDETAILS :\n{description}",
+        "priority": priority.title() if priority else "Medium"
+    }
+
+
+def extract_ticket_key(result):
+    """Clé du ticket Jira (ex. KAN-12) dans le résultat MCP, None si absente"""
+    try:
+        content = result.get("content", [])
+        if content:
+            return json.loads(content[0].get("text", "")).get("key")
+    except Exception:
+        pass
+    return None
+
+
+def format_ticket_result(result, priority, user_email):
+    """Message pour l'utilisateur à partir du résultat MCP (result.content[0].text)"""
+    try:
+        content = result.get("content", [])
+        if content and len(content) > 0:
+            text_data = content[0].get("text", "")
+            try:
+                jira_res = json.loads(text_data)
+                ticket_key = jira_res.get("key")
+                if ticket_key:
+                    return f"ID du ticket: {ticket_key}, Priorité: {priority}, Email: {user_email}"
+            except:
+                clean_text = re.sub(r'http\S+', '', text_data)
+                return f"Succès : {clean_text.strip()}"
+    except Exception as e:
+        return f"Erreur lors du traitement de la réponse MCP : {str(e)}"
+
+    return "Erreur : Le serveur MCP n'a pas renvoyé de réponse valide."
+
+
+async def create_jira_ticket(summary, description, priority, assignee_group, user_email):
+    """
+    Crée le ticket via le pool de serveurs MCP persistants.
+    Lève MCPError en cas d'échec (pour que la file d'attente des tickets puisse réessayer).
+    Renvoie (clé du ticket ou None, message pour l'utilisateur).
+    """
+    result = await get_mcp_pool().call_tool(
+        "jira_create_issue",
+        build_ticket_arguments(summary, description, priority, assignee_group, user_email)
+    )
+    if result.get("isError"):
+        content = result.get("content") or [{}]
+        raise MCPError(content[0].get("text") or "Erreur inconnue")
+    return extract_ticket_key(result), format_ticket_result(result, priority, user_email)
+
+
+async def acall_mcp_jira_ticket(summary, description, priority, assignee_group, user_email):
+    """
+    Crée le ticket via le pool de serveurs MCP persistants (voir mcp_pool.py) :
+    ni démarrage de Node.js ni poignée de main par ticket, et la boucle
+    d'événements n'est jamais bloquée.
+    """
+    try:
+        _, message = await create_jira_ticket(summary, description, priority, assignee_group, user_email)
+        return message
+    except MCPError as e:
+        return f"Erreur Jira (MCP): {str(e)}"
+    except Exception as e:
+        return f"Erreur de connexion: {str(e)}"
+
 
 def call_mcp_jira_ticket(summary, description, priority, assignee_group, user_email):
     """
     Envoie une requête JSON-RPC au serveur MCP Atlassian via STDIO.
+    Lance un processus par appel : réservé aux appels synchrones (ai/main.py),
+    le backend passe par acall_mcp_jira_ticket.
     """
-    # Chemin vers ton dossier mcp-nodejs-atlassian
-    # On le calcule par rapport à l'emplacement de ce fichier (ai/tools/mcp_bridge.py)
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    mcp_dir = os.path.join(base_dir, "mcp-nodejs-atlassian")
-    
     # Construction de la requête JSON-RPC demandée par ton serveur
     request = {
         "jsonrpc": "2.0",
@@ -18,21 +91,15 @@ def call_mcp_jira_ticket(summary, description, priority, assignee_group, user_em
         "method": "tools/call",
         "params": {
             "name": "jira_create_issue",
-            "arguments": {
-                "projectKey": "KAN", # Clé projet de ton image
-                "issueType": "Task",
-                "summary": summary,
-                "description": f"RESPONSABLE : {assignee_group}\nPRIORITÉ : {priority}\nEMAIL : {user_email}\n\nDETAILS :\n{description}",
-                "priority": priority.title() if priority else "Medium"
-            }
+            "arguments": build_ticket_arguments(summary, description, priority, assignee_group, user_email)
         }
     }
 
     try:
-        # On lance 'node dist/index.js' comme dans ton script Node
+        # On lance 'node dist/index.js' (ou MCP_SERVER_COMMAND) comme dans ton script Node
         process = subprocess.Popen(
-            ["node", "dist/index.js"],
-            cwd=mcp_dir,
+            mcp_server_command(),
+            cwd=MCP_DIR,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
@@ -59,25 +126,11 @@ def call_mcp_jira_ticket(summary, description, priority, assignee_group, user_em
                     return f"Erreur Jira (MCP): {error_msg}"
                 
                 # 2. Extraire le résultat
-                try:
-                    content = json_response.get("result", {}).get("content", [])
-                    if content and len(content) > 0:
-                        text_data = content[0].get("text", "")
-                        try:
-                            jira_res = json.loads(text_data)
-                            ticket_key = jira_res.get("key")
-                            if ticket_key:
-                                return f"ID du ticket: {ticket_key}, Priorité: {priority}, Email: {user_email}"
-                        except:
-                            import re
-                            clean_text = re.sub(r'http\S+', '', text_data)
-                            return f"Succès : {clean_text.strip()}"
-                except Exception as e:
-                    return f"Erreur lors du traitement de la réponse MCP : {str(e)}"
+                return format_ticket_result(json_response.get("result", {}), priority, user_email)
             
             return "Erreur : Le serveur MCP n'a pas renvoyé de réponse valide."
         else:
             return f"Erreur système MCP (Code {process.returncode}): {stderr}"
 
     except Exception as e:
-        return f"Erreur de connexion: {str(e)}"
\ No newline at end of file
+        return f"Erreur de connexion: {str(e)}"
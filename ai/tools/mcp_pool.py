@@ -0,0 +1,356 @@
+"""
+Pool de serveurs MCP persistants (stdio, JSON-RPC 2.0).
+
+Au lieu de lancer `node dist/index.js` à chaque ticket, quelques processus
+restent ouverts (sous-processus asyncio) : la poignée de main MCP
+(initialize) n'est faite qu'une fois par processus, et plusieurs appels
+partagent le même processus grâce aux identifiants JSON-RPC.
+Un contrôle de santé (ping) redémarre les processus bloqués ou arrêtés.
+
+Configuration :
+    MCP_SERVER_COMMAND          commande du serveur (défaut : node dist/index.js)
+    MCP_SERVER_CWD              dossier du serveur (défaut : ai/mcp-nodejs-atlassian)
+    MCP_POOL_SIZE               nombre de processus (défaut : 2)
+    MCP_CALL_TIMEOUT_SECONDS    délai maximum d'un appel (défaut : 30)
+    MCP_HEALTH_INTERVAL_SECONDS intervalle du contrôle de santé (défaut : 30)
+"""
+import asyncio
+import itertools
+import json
+import os
+import shlex
+from typing import Dict, List, Optional
+
+MCP_DIR = os.getenv(
+    "MCP_SERVER_CWD",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mcp-nodejs-atlassian")
+)
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+MCP_CALL_TIMEOUT_SECONDS = float(os.getenv("MCP_CALL_TIMEOUT_SECONDS", "30"))
+MCP_HEALTH_INTERVAL_SECONDS = float(os.getenv("MCP_HEALTH_INTERVAL_SECONDS", "30"))
+MCP_PROTOCOL_VERSION = "2024-11-05"
+
+# Taille maximale d'une ligne de stdout (protection mémoire)
+_STREAM_LIMIT = 4 * 1024 * 1024
+
+
+def mcp_server_command() -> List[str]:
+    """Commande du serveur MCP (MCP_SERVER_COMMAND, sinon le serveur Node.js Atlassian)"""
+    return shlex.split(os.getenv("MCP_SERVER_COMMAND", "node dist/index.js"))
+
+
+class MCPError(Exception):
+    """Erreur JSON-RPC renvoyée par le serveur MCP"""
+
+
+class MCPTimeout(MCPError):
+    """Le serveur n'a pas répondu dans le délai"""
+
+
+class MCPWorkerCrashed(MCPError):
+    """Le processus s'est arrêté avant de répondre"""
+
+
+class MCPRequestNotSent(MCPWorkerCrashed):
+    """Le processus était arrêté avant l'envoi : la requête peut être rejouée sans risque"""
+
+
+class MCPWorker:
+    """
+    Un processus serveur MCP ouvert en permanence.
+    Les réponses sont associées aux requêtes par leur id JSON-RPC, donc
+    plusieurs appels peuvent être en cours sur le même processus.
+    """
+
+    def __init__(self, command: List[str], cwd: Optional[str] = None):
+        self.command = command
+        self.cwd = cwd
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._stderr: Optional[asyncio.Task] = None
+        self.stderr_tail: List[str] = []
+        self.consecutive_timeouts = 0
+        self._eof = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None and not self._eof
+
+    @property
+    def load(self) -> int:
+        """Nombre d'appels en cours sur ce processus"""
+        return len(self._pending)
+
+    async def start(self, timeout: float = MCP_CALL_TIMEOUT_SECONDS) -> None:
+        """Lance le processus et fait la poignée de main MCP"""
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=self.cwd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=_STREAM_LIMIT
+        )
+        self._reader = asyncio.create_task(self._read_responses())
+        self._stderr = asyncio.create_task(self._drain_stderr())
+
+        await self.request("initialize", {
+            "protocolVersion": MCP_PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "enerassist-backend", "version": "1.0.0"}
+        }, timeout=timeout)
+        await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    async def request(self, method: str, params: Optional[Dict] = None, timeout: float = MCP_CALL_TIMEOUT_SECONDS):
+        """Envoie une requête et attend la réponse portant le même id"""
+        if not self.alive:
+            raise MCPRequestNotSent("Le processus MCP n'est pas démarré")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+
+        try:
+            await self._send(message)
+            response = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.consecutive_timeouts += 1
+            raise MCPTimeout(f"Pas de réponse MCP à '{method}' après {timeout:g} s")
+        finally:
+            self._pending.pop(request_id, None)
+
+        self.consecutive_timeouts = 0
+        if "error" in response:
+            raise MCPError(response["error"].get("message", "Erreur inconnue"))
+        return response.get("result", {})
+
+    async def _send(self, message: Dict) -> None:
+        try:
+            self.process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise MCPRequestNotSent(f"Le processus MCP ne lit plus ses requêtes : {e}")
+
+    async def _read_responses(self) -> None:
+        """Associe chaque ligne JSON-RPC de stdout à la requête en attente"""
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                text = line.decode("utf-8", errors="replace").strip()
+                # Les journaux du serveur ne sont pas du JSON-RPC : ignorés
+                if not (text.startswith("{") and text.endswith("}")):
+                    continue
+                try:
+                    message = json.loads(text)
+                except json.JSONDecodeError:
+                    continue
+                future = self._pending.get(message.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (asyncio.LimitOverrunError, ValueError) as e:
+            print(f"⚠️ Réponse MCP illisible : {e}")
+        finally:
+            # Processus arrêté : les appels en cours échouent tout de suite
+            self._eof = True
+            error = MCPWorkerCrashed(f"Le processus MCP s'est arrêté : {' | '.join(self.stderr_tail[-3:])}")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _drain_stderr(self) -> None:
+        """Lit stderr en continu (sinon le tampon plein bloquerait le serveur)"""
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            self.stderr_tail = (self.stderr_tail + [line.decode("utf-8", errors="replace").strip()])[-20:]
+
+    async def close(self) -> None:
+        if self.process is not None and self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 2)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        for task in (self._reader, self._stderr):
+            if task is not None:
+                task.cancel()
+
+
+class MCPPool:
+    """
+    Pool de processus MCP : chaque appel va au processus vivant le moins chargé,
+    un processus arrêté (ou qui ne répond plus) est relancé.
+    """
+
+    def __init__(
+        self,
+        command: Optional[List[str]] = None,
+        cwd: Optional[str] = MCP_DIR,
+        size: int = MCP_POOL_SIZE,
+        call_timeout: float = MCP_CALL_TIMEOUT_SECONDS,
+        health_interval: float = MCP_HEALTH_INTERVAL_SECONDS
+    ):
+        self.command = command or mcp_server_command()
+        self.cwd = cwd
+        self.size = max(1, size)
+        self.call_timeout = call_timeout
+        self.health_interval = health_interval
+        self.workers: List[MCPWorker] = []
+        self._lock = asyncio.Lock()
+        # Redémarrages en cours (un seul par processus, attendu par tous les appelants)
+        self._restarting: Dict[MCPWorker, asyncio.Task] = {}
+        self._health: Optional[asyncio.Task] = None
+        self.restarts = 0
+        self.calls = 0
+
+    async def start(self) -> None:
+        """
+        Lance les processus ; ceux qui échouent sont fermés et laissés au contrôle
+        de santé (et aux appels) pour un redémarrage. Lève l'erreur si aucun ne démarre.
+        """
+        async with self._lock:
+            if self.workers:
+                return
+            self.workers = [MCPWorker(self.command, self.cwd) for _ in range(self.size)]
+            # Démarré avant les processus : il tourne même si des poignées de main échouent
+            if self.health_interval > 0 and self._health is None:
+                self._health = asyncio.create_task(self._health_loop())
+            results = await asyncio.gather(
+                *[worker.start(self.call_timeout) for worker in self.workers],
+                return_exceptions=True
+            )
+
+        failures = [(worker, result) for worker, result in zip(self.workers, results) if isinstance(result, BaseException)]
+        for worker, error in failures:
+            print(f"⚠️ Démarrage du serveur MCP impossible : {error}")
+            await worker.close()
+        if len(failures) == len(results):
+            raise failures[0][1]
+
+    async def call_tool(self, name: str, arguments: Dict, timeout: Optional[float] = None) -> Dict:
+        """
+        Appel MCP tools/call ; relancé une fois sur un autre processus seulement
+        si la requête n'a pas pu être envoyée. Un arrêt après l'envoi n'est pas
+        rejoué (le ticket a peut-être été créé) : l'erreur remonte à l'appelant.
+        """
+        if not self.workers:
+            await self.start()
+        self.calls += 1
+
+        for attempt in range(2):
+            worker = await self._pick_worker()
+            try:
+                return await worker.request(
+                    "tools/call",
+                    {"name": name, "arguments": arguments},
+                    timeout=timeout or self.call_timeout
+                )
+            except MCPRequestNotSent:
+                if attempt == 1:
+                    raise
+            except MCPTimeout:
+                # Un processus qui ne répond plus est remplacé ; l'appel n'est pas rejoué
+                # (le ticket a peut-être été créé)
+                if worker.consecutive_timeouts >= 2:
+                    await self._restart(worker)
+                raise
+
+    async def _pick_worker(self) -> MCPWorker:
+        for worker in list(self.workers):
+            if not worker.alive:
+                try:
+                    await self._restart(worker)
+                except Exception as e:
+                    print(f"⚠️ Redémarrage MCP impossible : {e}")
+        alive = [worker for worker in self.workers if worker.alive]
+        if not alive:
+            raise MCPRequestNotSent("Aucun processus MCP disponible")
+        return min(alive, key=lambda worker: worker.load)
+
+    async def _restart(self, worker: MCPWorker) -> None:
+        """Remplace un processus ; un redémarrage déjà en cours est attendu, pas relancé"""
+        async with self._lock:
+            if worker not in self.workers:
+                return
+            task = self._restarting.get(worker)
+            if task is None:
+                task = asyncio.create_task(self._replace(worker))
+                self._restarting[worker] = task
+                task.add_done_callback(lambda _: self._restarting.pop(worker, None))
+        await asyncio.shield(task)
+
+    async def _replace(self, worker: MCPWorker) -> None:
+        """
+        Le remplaçant n'entre dans le pool qu'une fois démarré ; d'ici là l'ancien
+        processus (non vivant, donc jamais choisi) garde sa place
+        """
+        print(f"🔄 Redémarrage du serveur MCP #{self.workers.index(worker)}")
+        await worker.close()
+        replacement = MCPWorker(self.command, self.cwd)
+        try:
+            await replacement.start(self.call_timeout)
+        except BaseException:
+            await replacement.close()
+            raise
+        async with self._lock:
+            if worker not in self.workers:
+                # Pool fermé pendant le démarrage
+                await replacement.close()
+                return
+            self.workers[self.workers.index(worker)] = replacement
+            self.restarts += 1
+
+    async def _health_loop(self) -> None:
+        """Ping périodique : redémarre les processus arrêtés ou muets"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for worker in list(self.workers):
+                try:
+                    if worker.alive:
+                        await worker.request("ping", timeout=min(5.0, self.call_timeout))
+                        continue
+                except (MCPTimeout, MCPWorkerCrashed):
+                    pass
+                except MCPError:
+                    # Une erreur JSON-RPC (ex. ping non géré) prouve que le processus répond
+                    continue
+                try:
+                    await self._restart(worker)
+                except Exception as e:
+                    print(f"⚠️ Redémarrage MCP impossible : {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "workers": len(self.workers),
+            "alive": sum(1 for worker in self.workers if worker.alive),
+            "in_flight": sum(worker.load for worker in self.workers),
+            "calls": self.calls,
+            "restarts": self.restarts
+        }
+
+    async def close(self) -> None:
+        if self._health is not None:
+            self._health.cancel()
+            self._health = None
+        await asyncio.gather(*[worker.close() for worker in self.workers])
+        self.workers = []
+
+
+_pool: Optional[MCPPool] = None
+
+
+def get_mcp_pool() -> MCPPool:
+    """Pool partagé du processus (démarré au premier appel)"""
+    global _pool
+    if _pool is None:
+        _pool = MCPPool()
+    return _pool
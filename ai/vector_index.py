@@ -0,0 +1,150 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_VECTORS = "vectors.npy"
+SNAPSHOT_PAYLOADS = "payloads.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_n(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices des n meilleurs scores, triés par score décroissant"""
+    if n >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, n - 1)[:n]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class NumpyVectorIndex:
+    """
+    Index vectoriel en mémoire pour un petit corpus (quelques centaines d'extraits).
+    Les vecteurs normalisés sont dans une matrice float32 contiguë et la recherche
+    top-k cosinus est un simple produit matrice-vecteur.
+    Avec quantize=True, les scores sont d'abord calculés sur une copie int8
+    (4x plus légère) puis les k * oversample meilleurs candidats sont re-classés
+    avec les vecteurs float32 (qui peuvent rester sur disque via mmap).
+    """
+
+    def __init__(
+        self,
+        ids: List,
+        vectors: np.ndarray,
+        payloads: List[Dict],
+        quantize: bool = False,
+        oversample: int = 4,
+        normalized: bool = False,
+    ):
+        self.ids = list(ids)
+        self.payloads = payloads
+        self.oversample = oversample
+        if normalized:
+            self.vectors = vectors
+        else:
+            self.vectors = _normalize_rows(np.ascontiguousarray(vectors, dtype=np.float32))
+
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        if quantize and len(self.ids):
+            scales = np.abs(self.vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes = np.round(self.vectors / scales[:, None]).astype(np.int8)
+            self._scales = scales.astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def quantized(self) -> bool:
+        return self._codes is not None
+
+    def search(self, query: List[float], k: int) -> List[Tuple[int, float]]:
+        """Retourne [(ligne, score cosinus)] des k extraits les plus proches"""
+        if not self.ids:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+
+        if self._codes is None:
+            scores = self.vectors @ q
+            top = _top_n(scores, k)
+            return [(int(row), float(scores[row])) for row in top]
+
+        # Pré-sélection sur les codes int8, puis re-classement exact en float32
+        approx = (self._codes @ q) * self._scales
+        rows = np.sort(_top_n(approx, k * self.oversample))
+        exact = np.asarray(self.vectors[rows]) @ q
+        order = np.argsort(-exact)[:k]
+        return [(int(rows[i]), float(exact[i])) for i in order]
+
+
+def fetch_collection(client, collection_name: str, batch_size: int = 256):
+    """Charge tous les points (ids, vecteurs, payloads) d'une collection Qdrant"""
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            vector = point.vector
+            if isinstance(vector, dict):  # vecteurs nommés : on prend le vecteur par défaut
+                vector = vector.get("", next(iter(vector.values())))
+            ids.append(point.id)
+            vectors.append(vector)
+            payloads.append(point.payload or {})
+        if offset is None:
+            break
+    return ids, np.asarray(vectors, dtype=np.float32), payloads
+
+
+def save_snapshot(directory: Path, ids: List, vectors: np.ndarray, payloads: List[Dict], collection_version: str) -> None:
+    """Écrit un snapshot local (vecteurs normalisés + payloads) pour le mode numpy"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    matrix = _normalize_rows(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    tmp_vectors = directory / (SNAPSHOT_VECTORS + ".tmp")
+    with open(tmp_vectors, "wb") as f:
+        np.save(f, matrix)
+    tmp_payloads = directory / (SNAPSHOT_PAYLOADS + ".tmp")
+    with open(tmp_payloads, "w", encoding="utf-8") as f:
+        json.dump({"collection_version": collection_version, "ids": ids, "payloads": payloads}, f, ensure_ascii=False)
+
+    os.replace(tmp_vectors, directory / SNAPSHOT_VECTORS)
+    os.replace(tmp_payloads, directory / SNAPSHOT_PAYLOADS)
+
+
+def snapshot_version(directory: Path) -> Optional[str]:
+    """Version de collection du snapshot local, ou None s'il est absent ou incomplet"""
+    directory = Path(directory)
+    if not (directory / SNAPSHOT_VECTORS).exists() or not (directory / SNAPSHOT_PAYLOADS).exists():
+        return None
+    with open(directory / SNAPSHOT_PAYLOADS, encoding="utf-8") as f:
+        return json.load(f).get("collection_version", "0")
+
+
+def load_snapshot(directory: Path, quantize: bool = False) -> Optional[Tuple[NumpyVectorIndex, str]]:
+    """Charge un snapshot local ; retourne (index, version de collection) ou None"""
+    directory = Path(directory)
+    if not (directory / SNAPSHOT_VECTORS).exists() or not (directory / SNAPSHOT_PAYLOADS).exists():
+        return None
+    with open(directory / SNAPSHOT_PAYLOADS, encoding="utf-8") as f:
+        meta = json.load(f)
+    # En mode quantifié les float32 ne servent qu'au re-classement : on les laisse sur disque
+    vectors = np.load(directory / SNAPSHOT_VECTORS, mmap_mode="r" if quantize else None)
+    index = NumpyVectorIndex(meta["ids"], vectors, meta["payloads"], quantize=quantize, normalized=True)
+    return index, meta.get("collection_version", "0")
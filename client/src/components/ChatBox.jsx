@@ -26,22 +26,83 @@ const ChatBox = () => {
   // Derived state for favorites
   const favorites = messages.filter(m => m.is_favorite);
 
-  // Helper to parse SSE data
-  // ... (keep helper)
-  const parseSSE = (buffer) => {
-    const events = [];
-    const lines = buffer.split('\n\n');
-    for (const line of lines) {
-      if (line.startsWith('data: ')) {
+  // Helper to parse one SSE frame ("id: N" + "data: {...}" lines)
+  const parseFrame = (part) => {
+    let id = null;
+    let data = null;
+    for (const line of part.split('\n')) {
+      if (line.startsWith('id: ')) {
+        id = Number(line.slice(4));
+      } else if (line.startsWith('data: ')) {
         try {
-          const data = JSON.parse(line.slice(6));
-          events.push(data);
+          data = JSON.parse(line.slice(6));
         } catch (e) {
           console.error("Failed to parse SSE line", line);
         }
       }
     }
-    return events;
+    return data ? { id, data } : null;
+  };
+
+  // Reads an SSE response until it ends; returns true once the answer is complete
+  const readStream = async (response, onEvent, cursor) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let finished = false;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+
+      const parts = buffer.split('\n\n');
+      buffer = parts.pop();
+
+      for (const part of parts) {
+        const frame = parseFrame(part);
+        if (!frame) continue;
+        if (frame.id !== null) cursor.lastEventId = frame.id;
+        onEvent(frame.data);
+        if (frame.data.type === 'done' || frame.data.type === 'error') finished = true;
+      }
+    }
+    return finished;
+  };
+
+  // Adds a ticket outcome to the assistant message that requested it
+  const appendTicketResult = (assistantId, ticket) => {
+    const text = ticket.status === 'created'
+      ? `\n✅ ${ticket.result}\n`
+      : `\n⚠️ Ticket non créé : ${ticket.error || 'erreur inconnue'}\n`;
+    setMessages((prev) => prev.map((msg, index) => {
+      const isTarget = assistantId ? msg.id === assistantId : index === prev.length - 1;
+      return isTarget ? { ...msg, content: msg.content + text } : msg;
+    }));
+  };
+
+  // Tickets still queued when the stream ended: poll their status for a while
+  const pollTickets = async (ticketIds, assistantId) => {
+    let remaining = [...ticketIds];
+    for (let attempt = 0; remaining.length && attempt < 24; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, 5000));
+      const still = [];
+      for (const ticketId of remaining) {
+        try {
+          const { data } = await api.get(`/chat/tickets/${ticketId}`);
+          if (data.status === 'created' || data.status === 'failed') {
+            appendTicketResult(assistantId, data);
+          } else {
+            still.push(ticketId);
+          }
+        } catch (err) {
+          console.warn("Ticket status failed", err);
+          still.push(ticketId);
+        }
+      }
+      remaining = still;
+    }
   };
 
   const onSubmit = async (e) => {
@@ -84,72 +145,94 @@ const ChatBox = () => {
 
       if (!response.ok) throw new Error("Stream failed");
 
-      const reader = response.body.getReader();
-      const decoder = new TextDecoder();
-      let buffer = '';
-
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-
-        const parts = buffer.split('\n\n');
-        buffer = parts.pop();
-
-        for (const part of parts) {
-          if (part.startsWith('data: ')) {
-            try {
-              const data = JSON.parse(part.substring(6));
-
-              if (data.type === 'meta') {
-                console.log("🔍 FRONTEND: Received meta", data);
-                // CRITICAL: Save the conversation ID for subsequent messages!
-                if (data.conversation_id && chatId === "temp") {
-                  console.log("  Updating chatId from temp to", data.conversation_id);
-                  chatId = data.conversation_id;
-                  // Update selectedChat with the real ID
-                  setSelectedChat(prev => ({
-                    ...prev,
-                    _id: data.conversation_id
-                  }));
-                  // Update chats list to replace temp with real conversation
-                  setChats(prev => prev.map(c =>
-                    c._id === "temp" ? { ...c, _id: data.conversation_id } : c
-                  ));
-                }
-              } else if (data.type === 'content') {
-                setMessages((prev) => {
-                  const newMsgs = [...prev];
-                  const lastMsg = newMsgs[newMsgs.length - 1];
-                  if (lastMsg && lastMsg.role === 'assistant') {
-                    lastMsg.content += data.chunk;
-                  }
-                  return newMsgs;
-                });
-              } else if (data.type === 'done') {
-                console.log("🔍 FRONTEND: Stream done", data);
-                if (data.user_message_id && data.assistant_message_id) {
-                  setMessages((prev) => {
-                    const newMsgs = [...prev];
-                    // The last message is assistant, the one before is user
-                    if (newMsgs.length >= 2) {
-                      newMsgs[newMsgs.length - 1].id = data.assistant_message_id;
-                      newMsgs[newMsgs.length - 2].id = data.user_message_id;
-                    }
-                    return newMsgs;
-                  });
-                }
-              } else if (data.type === 'error') {
-                console.error("Stream error:", data.error);
-              }
-            } catch (err) {
-              console.error("JSON parse error", err);
+      // Position in the stream, to resume after a dropped connection
+      const cursor = { streamId: null, lastEventId: 0, assistantId: null, pendingTickets: new Set() };
+
+      const handleEvent = (data) => {
+        if (data.type === 'meta') {
+          console.log("🔍 FRONTEND: Received meta", data);
+          cursor.streamId = data.stream_id;
+          // CRITICAL: Save the conversation ID for subsequent messages!
+          if (data.conversation_id && chatId === "temp") {
+            console.log("  Updating chatId from temp to", data.conversation_id);
+            chatId = data.conversation_id;
+            // Update selectedChat with the real ID
+            setSelectedChat(prev => ({
+              ...prev,
+              _id: data.conversation_id
+            }));
+            // Update chats list to replace temp with real conversation
+            setChats(prev => prev.map(c =>
+              c._id === "temp" ? { ...c, _id: data.conversation_id } : c
+            ));
+          }
+        } else if (data.type === 'content') {
+          setMessages((prev) => {
+            const newMsgs = [...prev];
+            const lastMsg = newMsgs[newMsgs.length - 1];
+            if (lastMsg && lastMsg.role === 'assistant') {
+              lastMsg.content += data.chunk;
             }
+            return newMsgs;
+          });
+        } else if (data.type === 'done') {
+          console.log("🔍 FRONTEND: Stream done", data);
+          if (data.user_message_id && data.assistant_message_id) {
+            setMessages((prev) => {
+              const newMsgs = [...prev];
+              // The last message is assistant, the one before is user
+              if (newMsgs.length >= 2) {
+                newMsgs[newMsgs.length - 1].id = data.assistant_message_id;
+                newMsgs[newMsgs.length - 2].id = data.user_message_id;
+              }
+              return newMsgs;
+            });
+            cursor.assistantId = data.assistant_message_id;
+          }
+          // The stream may stay open for ticket outcomes: the answer itself is complete
+          setLoading(false);
+        } else if (data.type === 'ticket_pending') {
+          cursor.pendingTickets.add(data.ticket_id);
+        } else if (data.type === 'ticket_created' || data.type === 'ticket_failed') {
+          // Outcome of a queued ticket (an already-created one is in the answer text)
+          if (cursor.pendingTickets.delete(data.ticket_id)) {
+            appendTicketResult(cursor.assistantId, data);
           }
+        } else if (data.type === 'error') {
+          console.error("Stream error:", data.error);
+        }
+      };
+
+      let finished = false;
+      try {
+        finished = await readStream(response, handleEvent, cursor);
+      } catch (err) {
+        console.warn("Stream interrupted", err);
+      }
+
+      // Connection dropped mid-answer: replay the missed frames (the server keeps generating)
+      for (let attempt = 1; !finished && cursor.streamId && attempt <= 5; attempt++) {
+        await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+        try {
+          const resumed = await fetch(`http://localhost:8000/chat/stream/${cursor.streamId}`, {
+            headers: {
+              'Authorization': `Bearer ${token}`,
+              'Last-Event-ID': String(cursor.lastEventId)
+            }
+          });
+          // Stream expired or frames evicted: give up, the answer is still saved server-side
+          if (resumed.status === 404 || resumed.status === 410) break;
+          if (!resumed.ok) continue;
+          finished = await readStream(resumed, handleEvent, cursor);
+        } catch (err) {
+          console.warn("Stream resume failed", err);
         }
       }
 
+      if (cursor.pendingTickets.size) {
+        pollTickets([...cursor.pendingTickets], cursor.assistantId);
+      }
+
     } catch (error) {
       console.error(error)
       setMessages((prev) => {
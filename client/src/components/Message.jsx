@@ -38,6 +38,12 @@ const Message = ({ message, onUpdate }) => {
     URL.revokeObjectURL(url);
   }
 
+  // Messages saved before ids existed get one from the migration; until then they cannot be favorited
+  const canFavorite = Boolean(message.id)
+  const favoriteTitle = !canFavorite
+    ? "Favori indisponible pour cet ancien message"
+    : isFavorite ? "Retirer des favoris" : "Ajouter aux favoris"
+
   const handleFavorite = async () => {
     if (!message.id || !selectedChat?._id) return;
 
@@ -74,8 +80,9 @@ const Message = ({ message, onUpdate }) => {
             <div className='absolute top-2 right-2 opacity-0 group-hover:opacity-100 transition-opacity flex gap-1 bg-white/50 dark:bg-black/20 rounded-md p-0.5 backdrop-blur-sm'>
               <button
                 onClick={handleFavorite}
-                className={`p-1 hover:bg-black/10 dark:hover:bg-white/10 rounded cursor-pointer ${isFavorite ? 'text-yellow-500' : 'text-gray-400'}`}
-                title={isFavorite ? "Retirer des favoris" : "Ajouter aux favoris"}
+                disabled={!canFavorite}
+                className={`p-1 hover:bg-black/10 dark:hover:bg-white/10 rounded cursor-pointer disabled:cursor-not-allowed disabled:opacity-40 ${isFavorite ? 'text-yellow-500' : 'text-gray-400'}`}
+                title={favoriteTitle}
               >
                 <Star size={14} fill={isFavorite ? "currentColor" : "none"} />
               </button>
@@ -122,8 +129,9 @@ const Message = ({ message, onUpdate }) => {
               <div className='absolute top-2 right-2 opacity-0 group-hover:opacity-100 transition-opacity flex gap-1 bg-white/50 dark:bg-black/20 rounded-md p-0.5 backdrop-blur-sm'>
                 <button
                   onClick={handleFavorite}
-                  className={`p-1 hover:bg-black/10 dark:hover:bg-white/10 rounded cursor-pointer ${isFavorite ? 'text-yellow-500' : 'text-gray-500 dark:text-gray-400'}`}
-                  title={isFavorite ? "Retirer des favoris" : "Ajouter aux favoris"}
+                  disabled={!canFavorite}
+                  className={`p-1 hover:bg-black/10 dark:hover:bg-white/10 rounded cursor-pointer disabled:cursor-not-allowed disabled:opacity-40 ${isFavorite ? 'text-yellow-500' : 'text-gray-500 dark:text-gray-400'}`}
+                  title={favoriteTitle}
                 >
                   <Star size={14} fill={isFavorite ? "currentColor" : "none"} />
                 </button>
@@ -9,6 +9,9 @@ from server.routes.conversations import router as conversations_router
 from server.routes.auth import router as auth_router
 #import database setup 
 from server.database import create_indexes
+from server.middlewares.compression import CompressionMiddleware
+from server.services import get_ai_service, get_ticket_outbox
+from ai.tools.mcp_pool import get_mcp_pool
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -16,12 +19,21 @@ async def lifespan(app: FastAPI):
     # Startup
     print("Starting chatbot backend...")
     await create_indexes()
+    try:
+        await get_ai_service().warm_up()
+    except Exception as e:
+        # The retriever is built again lazily on the first chat request
+        print(f"⚠️ AI warm-up failed: {e}")
+    # Ticket outbox workers (tickets queued before a restart are picked up again)
+    get_ticket_outbox().start()
     print("Backend initialized successfully")
     
     yield
     
     # Shutdown
     print("Shutting down chatbot backend...")
+    await get_ticket_outbox().stop()
+    await get_mcp_pool().close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -45,6 +57,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# br/gzip for complete responses above COMPRESSION_MIN_BYTES (SSE streams pass through)
+app.add_middleware(CompressionMiddleware)
 # Health check endpoint
 @app.get("/health")
 @app.get("/")
@@ -18,6 +18,12 @@ database = client.chatbot_db
 user_collection = database.get_collection("users")
 history_collection = database.get_collection("histories")
 conversation_collection = database.get_collection("conversations")
+message_collection = database.get_collection("messages")
+ticket_collection = database.get_collection("ticket_outbox")
+
+# Layout of new conversations: "embedded" (messages array on the conversation)
+# or "collection" (one document per message in the messages collection)
+MESSAGE_STORAGE = os.getenv("MESSAGE_STORAGE", "embedded").lower()
 
 
 async def create_indexes():
@@ -25,8 +31,22 @@ async def create_indexes():
     # Conversations indexes
     await conversation_collection.create_index([("historique_id", 1), ("last_updated", -1)])
     await conversation_collection.create_index([("_id", 1), ("historique_id", 1)])
+    # Sidebar listing: only non-empty conversations, already in display order (_id for keyset cursors)
+    await conversation_collection.create_index(
+        [("historique_id", 1), ("is_pinned", -1), ("last_updated", -1), ("_id", -1)],
+        partialFilterExpression={"message_count": {"$gt": 0}}
+    )
+    
+    # Messages indexes (separate layout)
+    await message_collection.create_index([("conversation_id", 1), ("seq", 1)], unique=True)
+    await message_collection.create_index([("conversation_id", 1), ("id", 1)])
     
     # Histories indexes
     await history_collection.create_index([("user_id", 1)], unique=True)
     
+    # Ticket outbox indexes (dedupe, worker claims, status lookups)
+    await ticket_collection.create_index([("idempotency_key", 1)], unique=True)
+    await ticket_collection.create_index([("status", 1), ("next_attempt_at", 1)])
+    await ticket_collection.create_index([("status", 1), ("lease_until", 1)])
+    
     print("✅ Database indexes created successfully")
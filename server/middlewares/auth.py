@@ -1,28 +1,75 @@
+import os
+import time
+from typing import Dict
+
+from bson import ObjectId
+from bson.errors import InvalidId
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from server.cache import TTLCache
 from server.database import user_collection
 from server.utils import SECRET_KEY, ALGORITHM
 from server.models import TokenData
+from server.services.history_service import remember_history_id
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# Verified token -> user document (without the password hash); never outlives the token
+_users = TTLCache(max_entries=USER_CACHE_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: str) -> int:
+    """
+    Forget the cached user of every token of this user
+    Call it after updating or deleting a user document
+    """
+    return _users.invalidate_where(lambda user: str(user["_id"]) == user_id)
+
+
+def user_cache_stats() -> Dict:
+    return _users.stats()
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if USER_CACHE_TTL_SECONDS > 0:
+        cached = _users.get(token)
+        if cached is not None:
+            return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = TokenData(sub=email)
+        token_data = TokenData(sub=email, uid=payload.get("uid"), hid=payload.get("hid"))
     except JWTError:
         raise credentials_exception
-        
-    user = await user_collection.find_one({"email": token_data.sub})
+    
+    # Tokens issued before the uid claim are resolved by email
+    try:
+        query = {"_id": ObjectId(token_data.uid)} if token_data.uid else {"email": token_data.sub}
+    except InvalidId:
+        raise credentials_exception
+    
+    user = await user_collection.find_one(query, {"password": 0})
     if user is None:
         raise credentials_exception
+    
+    # Signed by us at login: the history ID is trusted without a lookup
+    if token_data.hid:
+        remember_history_id(str(user["_id"]), token_data.hid)
+    
+    if USER_CACHE_TTL_SECONDS > 0:
+        expires_in = payload.get("exp", 0) - time.time()
+        if expires_in > 0:
+            _users.set(token, user, ttl_seconds=min(USER_CACHE_TTL_SECONDS, expires_in))
     return user
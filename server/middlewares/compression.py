@@ -0,0 +1,164 @@
+"""
+Compression Middleware - Negotiated brotli / gzip compression of large responses
+Complete (single body) JSON and text responses of at least COMPRESSION_MIN_BYTES
+are compressed with the best encoding the client accepts (br, then gzip).
+Streamed responses (SSE chat streams) are passed through untouched so their
+frames are not held back.
+
+The identity and on-the-wire sizes of every complete response are recorded
+per route (response_size_stats, shown on /chat/health).
+brotli is optional: without it only gzip is offered.
+"""
+import gzip
+import os
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli's default (11) is far too slow for live responses
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+_stats: Dict = {
+    "responses": 0,
+    "compressed": 0,
+    "streamed": 0,
+    "identity_bytes": 0,
+    "wire_bytes": 0,
+    "by_encoding": {},
+    "routes": {}
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding accepted by the client (br over gzip), None for identity"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    offered = (("br", "gzip") if brotli is not None else ("gzip",))
+    for encoding in offered:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+def route_template(scope) -> str:
+    """Route path with its router prefix (/conversations/{conversation_id}), 'unmatched' if none"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # Included routers may give the route without their prefix: take it back from the request path
+    filled = template.format(**{name: str(value) for name, value in scope.get("path_params", {}).items()})
+    path = scope.get("path", "")
+    if filled != path and path.endswith(filled):
+        return path[:len(path) - len(filled)] + template
+    return template
+
+
+def _record(scope, identity_bytes: int, wire_bytes: int, encoding: str) -> None:
+    path = route_template(scope)
+    _stats["responses"] += 1
+    _stats["identity_bytes"] += identity_bytes
+    _stats["wire_bytes"] += wire_bytes
+    _stats["by_encoding"][encoding] = _stats["by_encoding"].get(encoding, 0) + 1
+    if encoding != "identity":
+        _stats["compressed"] += 1
+
+    route_stats = _stats["routes"].setdefault(path, {"count": 0, "identity_bytes": 0, "wire_bytes": 0, "max_bytes": 0})
+    route_stats["count"] += 1
+    route_stats["identity_bytes"] += identity_bytes
+    route_stats["wire_bytes"] += wire_bytes
+    route_stats["max_bytes"] = max(route_stats["max_bytes"], identity_bytes)
+
+
+def response_size_stats() -> Dict:
+    """Response counts and sizes (before and after compression), overall and per route"""
+    return {
+        **_stats,
+        "by_encoding": dict(_stats["by_encoding"]),
+        "routes": {path: dict(stats) for path, stats in _stats["routes"].items()}
+    }
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses above a size threshold"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held until the first body part tells if the response is streamed
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            held, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(held["headers"]))
+
+            if message.get("more_body", False):
+                _stats["streamed"] += 1
+                await send(held)
+                await send(message)
+                return
+
+            content_type = headers.get("content-type", "")
+            if (
+                encoding is None
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                _record(scope, len(body), len(body), "identity")
+                await send(held)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            _record(scope, len(body), len(compressed), encoding)
+            await send({**held, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
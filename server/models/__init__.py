@@ -1,6 +1,7 @@
 from server.models.schemas import (
     MessageBase,
     MessageResponse,
+    MessagePageResponse,
     ConversationBase,
     ConversationCreate,
     ConversationResponse,
@@ -9,6 +10,8 @@ from server.models.schemas import (
     HistoryResponse,
     ChatRequest,
     ChatResponse,
+    ChatContext,
+    TicketStatusResponse,
     PaginationParams,
     UserLogin,
     UserCreate,
@@ -21,6 +24,7 @@ from server.models.schemas import (
 __all__ = [
     "MessageBase",
     "MessageResponse",
+    "MessagePageResponse",
     "ConversationBase",
     "ConversationCreate",
     "ConversationResponse",
@@ -29,6 +33,8 @@ __all__ = [
     "HistoryResponse",
     "ChatRequest",
     "ChatResponse",
+    "ChatContext",
+    "TicketStatusResponse",
     "PaginationParams",
     "UserLogin",
     "UserCreate",
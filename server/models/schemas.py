@@ -17,6 +17,7 @@ class MessageBase(BaseModel):
     texte: str = Field(..., min_length=1, max_length=10000)
     date: datetime = Field(default_factory=datetime.utcnow)
     is_favorite: bool = False
+    token_count: Optional[int] = None
 
     model_config = {
         "json_schema_extra": {
@@ -32,8 +33,22 @@ class MessageBase(BaseModel):
 
 
 class MessageResponse(MessageBase):
-    """Message response model for API responses"""
-    pass
+    """
+    Message response model for API responses
+    id is None for a message saved before ids existed, until migrate_message_ids
+    runs (never a random id: it would change on every read and could not be favorited)
+    """
+    id: Optional[str] = None
+    seq: Optional[int] = None
+
+
+class MessagePageResponse(BaseModel):
+    """Page of messages of a conversation, oldest first"""
+    conversation_id: str
+    messages: List[MessageResponse]
+    message_count: int
+    has_more: bool
+    next_before: Optional[int] = None
 
 
 # ==================== Conversation Models ====================
@@ -58,6 +73,8 @@ class ConversationResponse(BaseModel):
     created_at: str
     last_updated: str
     message_count: int
+    summary: Optional[str] = None
+    summary_message_count: int = 0
 
 
 class ConversationListItem(BaseModel):
@@ -68,15 +85,18 @@ class ConversationListItem(BaseModel):
     last_updated: str
     message_count: int
     preview: Optional[str] = None
+    last_role: Optional[str] = None
+    last_message: Optional[str] = None
 
 
 class ConversationListResponse(BaseModel):
     """Paginated conversation list response"""
     conversations: List[ConversationListItem]
-    total: int
+    total: Optional[int] = None
     skip: int
     limit: int
     has_more: bool
+    next_cursor: Optional[str] = None  # Pass as `after` to get the next page
 
 
 # ==================== History Models ====================
@@ -108,6 +128,33 @@ class ChatResponse(BaseModel):
     is_new_conversation: bool = False
 
 
+class ChatContext(BaseModel):
+    """What the AI step needs from a conversation (chat preflight)"""
+    conversation_id: str
+    messages: List[MessageResponse] = []  # Latest messages, oldest first
+    message_count: int = 0
+    summary: Optional[str] = None
+    summary_message_count: int = 0
+
+    @property
+    def history_offset(self) -> int:
+        """seq of messages[0]: number of older messages left in the database"""
+        return self.message_count - len(self.messages)
+
+
+class TicketStatusResponse(BaseModel):
+    """State of a ticket creation queued in the ticket outbox"""
+    ticket_id: str
+    conversation_id: str
+    status: str  # pending, processing, created or failed
+    attempts: int = 0
+    ticket_key: Optional[str] = None  # Jira key, once created
+    result: Optional[str] = None  # Message shown to the user, once created
+    error: Optional[str] = None  # Last failure
+    created_at: str
+    updated_at: str
+
+
 # ==================== Pagination Models ====================
 
 class PaginationParams(BaseModel):
@@ -141,6 +188,8 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     sub: Optional[str] = None
+    uid: Optional[str] = None  # User ID; tokens issued before it are resolved by email
+    hid: Optional[str] = None  # History ID, when HISTORY_ID_IN_TOKEN is enabled
 
 class AuthResponse(BaseModel):
     access_token: str
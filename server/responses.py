@@ -0,0 +1,26 @@
+"""
+Responses - orjson response class for large JSON payloads
+Used by the routes returning whole conversations or histories: the payload is
+serialized once by orjson, FastAPI's response_model validation and encoding
+are skipped (the response_model stays on the route for the API docs).
+"""
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not know natively (datetimes, UUIDs and dicts are native)"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(Response):
+    """JSON response serialized with orjson; accepts Pydantic models and plain data"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
@@ -1,7 +1,16 @@
 from fastapi import APIRouter, HTTPException, status
 from server.database import user_collection
+from server.middlewares.auth import invalidate_user
 from server.models import UserCreate, UserLogin, Token, AuthResponse
-from server.utils import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from server.utils import (
+    get_password_hash_async,
+    verify_password_async,
+    password_needs_rehash,
+    create_access_token,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    HISTORY_ID_IN_TOKEN
+)
+from server.services.history_service import get_history_service
 from datetime import timedelta, datetime
 
 router = APIRouter()
@@ -13,7 +22,7 @@ async def signup(user: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = {
         "username": user.username,
         "email": user.email,
@@ -26,7 +35,7 @@ async def signup(user: UserCreate):
     # Create Token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=await _token_claims(user.email, str(result.inserted_id)), expires_delta=access_token_expires
     )
     
     return {
@@ -45,12 +54,22 @@ async def login(user_credentials: UserLogin):
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
-    if not verify_password(user_credentials.password, user["password"]):
+    if not await verify_password_async(user_credentials.password, user["password"]):
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    
+    # Transparent upgrade when BCRYPT_ROUNDS changed since the hash was made
+    if password_needs_rehash(user["password"]):
+        new_hash = await get_password_hash_async(user_credentials.password)
+        result = await user_collection.update_one(
+            {"_id": user["_id"], "password": user["password"]},
+            {"$set": {"password": new_hash}}
+        )
+        if result.modified_count:
+            invalidate_user(str(user["_id"]))
         
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"]}, expires_delta=access_token_expires
+        data=await _token_claims(user["email"], str(user["_id"])), expires_delta=access_token_expires
     )
     
     return {
@@ -62,3 +81,11 @@ async def login(user_credentials: UserLogin):
             "email": user["email"]
         }
     }
+
+
+async def _token_claims(email: str, user_id: str) -> dict:
+    """JWT payload: subject and user ID, plus the history ID when HISTORY_ID_IN_TOKEN is enabled"""
+    claims = {"sub": email, "uid": user_id}
+    if HISTORY_ID_IN_TOKEN:
+        claims["hid"] = await get_history_service().get_or_create_history(user_id)
+    return claims
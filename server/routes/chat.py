@@ -2,39 +2,74 @@
 Chat Routes - Main chatbot API endpoints
 Handles AI conversation interactions
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from fastapi.responses import StreamingResponse
 from datetime import datetime
+from typing import Optional
+from bson import ObjectId
 import json
 
-from server.middlewares.auth import get_current_user
-from server.models import ChatRequest, ChatResponse, MessageBase, MessageResponse
+from server.middlewares.auth import get_current_user, user_cache_stats
+from server.middlewares.compression import response_size_stats
+from server.models import ChatRequest, ChatResponse, ChatContext, MessageBase, MessageResponse, TicketStatusResponse
 from server.services import (
     get_ai_service,
     get_conversation_service,
     get_history_service,
+    get_summary_service,
     AIService,
     ConversationService,
-    HistoryService
+    HistoryService,
+    SummaryService,
+    StreamRegistry,
+    StreamGap,
+    get_stream_registry,
+    TicketOutbox,
+    get_ticket_outbox,
+    history_id_cache_stats
 )
+from server.services.history_budget import HISTORY_MAX_MESSAGES
+from server.services.ticket_outbox import TICKET_STREAM_WAIT_SECONDS
 
 router = APIRouter()
 
 
+async def _chat_context(
+    conversation_service: ConversationService,
+    conversation_id: str,
+    historique_id: str
+) -> ChatContext:
+    """Chat preflight; a conversation of another user is reported as forbidden"""
+    try:
+        return await conversation_service.get_chat_context(
+            conversation_id=conversation_id,
+            historique_id=historique_id,
+            message_limit=HISTORY_MAX_MESSAGES
+        )
+    except HTTPException as e:
+        if e.status_code == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have access to this conversation"
+            )
+        raise
+
+
 @router.post("/send", response_model=ChatResponse, status_code=status.HTTP_200_OK)
 async def send_message(
     chat_request: ChatRequest,
     current_user: dict = Depends(get_current_user),
     ai_service: AIService = Depends(get_ai_service),
     conversation_service: ConversationService = Depends(get_conversation_service),
-    history_service: HistoryService = Depends(get_history_service)
+    history_service: HistoryService = Depends(get_history_service),
+    summary_service: SummaryService = Depends(get_summary_service)
 ):
     """
     Send a message to the AI chatbot
     
     Flow:
-    1. Validate or create conversation
-    2. Fetch conversation context
+    1. New conversation: generate its ID (created with the first turn), or
+    2. Validate it and fetch its context (single query)
     3. Call AI model with context
     4. Store user message + AI response
     5. Return response
@@ -49,42 +84,26 @@ async def send_message(
         
         # Step 2: Determine conversation ID
         is_new_conversation = False
+        titre = None
         conversation_id = chat_request.conversation_id
         
         if not conversation_id:
-            # Create new conversation
+            # New conversation: created together with the first turn (Step 6)
             is_new_conversation = True
+            conversation_id = str(ObjectId())
             
             # Generate title from first message if not provided
             titre = chat_request.conversation_title
             if not titre:
                 titre = ai_service.generate_conversation_title(chat_request.message)
             
-            conversation_id = await conversation_service.create_conversation(
-                historique_id=historique_id,
-                titre=titre,
-                initial_messages=[]
-            )
+            # Nothing to fetch: a new conversation has no context yet
+            conversation = ChatContext(conversation_id=conversation_id)
         else:
-            # Validate that conversation belongs to user
-            try:
-                await conversation_service.get_conversation_by_id(
-                    conversation_id=conversation_id,
-                    historique_id=historique_id
-                )
-            except HTTPException as e:
-                if e.status_code == status.HTTP_404_NOT_FOUND:
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail="You don't have access to this conversation"
-                    )
-                raise
+            # Step 3: Validate that conversation belongs to user and fetch its context (one query)
+            conversation = await _chat_context(conversation_service, conversation_id, historique_id)
         
-        # Step 3: Fetch conversation for context
-        conversation = await conversation_service.get_conversation_by_id(
-            conversation_id=conversation_id,
-            historique_id=historique_id
-        )
+        history_offset = conversation.history_offset
         
         # Step 4: Call AI model
         try:
@@ -93,7 +112,11 @@ async def send_message(
                 user_message=chat_request.message,
                 conversation_id=conversation_id,
                 chat_history=conversation.messages,
-                user_email=user_email
+                user_email=user_email,
+                summary=conversation.summary,
+                summary_message_count=conversation.summary_message_count,
+                history_offset=history_offset,
+                owner_id=user_id
             )
         except Exception as e:
             raise HTTPException(
@@ -114,11 +137,21 @@ async def send_message(
             date=datetime.utcnow()
         )
         
-        # Step 6: Store messages in conversation
+        # Step 6: Store messages in conversation (one write, creating it if new)
         await conversation_service.add_messages(
             conversation_id=conversation_id,
             historique_id=historique_id,
-            messages=[user_message, assistant_message]
+            messages=[user_message, assistant_message],
+            create_with_title=titre
+        )
+        
+        # Fold turns that left the token budget into the summary (background)
+        summary_service.schedule_refresh(
+            conversation_id=conversation_id,
+            messages=conversation.messages + [user_message, assistant_message],
+            summary=conversation.summary,
+            summary_message_count=conversation.summary_message_count,
+            offset=history_offset
         )
         
         # Step 7: Return response
@@ -144,10 +177,20 @@ async def stream_message(
     current_user: dict = Depends(get_current_user),
     ai_service: AIService = Depends(get_ai_service),
     conversation_service: ConversationService = Depends(get_conversation_service),
-    history_service: HistoryService = Depends(get_history_service)
+    history_service: HistoryService = Depends(get_history_service),
+    summary_service: SummaryService = Depends(get_summary_service),
+    stream_registry: StreamRegistry = Depends(get_stream_registry),
+    ticket_outbox: TicketOutbox = Depends(get_ticket_outbox)
 ):
     """
     Stream a message from the AI chatbot (SSE format)
+    Frames are numbered (SSE id); the meta frame carries the stream_id used to
+    resume with GET /chat/stream/{stream_id} after a dropped connection.
+    The answer is generated and saved even if the client disconnects.
+    Tickets are created in the background: a ticket_pending frame comes right
+    away, then ticket_created (or ticket_failed) after the done frame if the
+    ticket is handled within TICKET_STREAM_WAIT_SECONDS; otherwise poll
+    GET /chat/tickets/{ticket_id}.
     """
     # We must validate everything *before* returning StreamingResponse
     try:
@@ -155,38 +198,35 @@ async def stream_message(
         historique_id = await history_service.get_or_create_history(user_id)
         
         is_new_conversation = False
+        titre = None
         conversation_id = chat_request.conversation_id
         
         if not conversation_id:
+            # Created together with the first turn, once the answer is complete
             is_new_conversation = True
+            conversation_id = str(ObjectId())
             titre = chat_request.conversation_title
             if not titre:
                 titre = ai_service.generate_conversation_title(chat_request.message)
             
-            conversation_id = await conversation_service.create_conversation(
-                historique_id=historique_id,
-                titre=titre,
-                initial_messages=[]
-            )
+            conversation = ChatContext(conversation_id=conversation_id)
         else:
-            # Validate access
-            await conversation_service.get_conversation_by_id(
-                conversation_id=conversation_id,
-                historique_id=historique_id
-            )
+            # Validate access and fetch context (one query)
+            conversation = await _chat_context(conversation_service, conversation_id, historique_id)
             
-        # Fetch context
-        conversation = await conversation_service.get_conversation_by_id(
-            conversation_id=conversation_id,
-            historique_id=historique_id
-        )
+        history_offset = conversation.history_offset
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error preparing stream: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    stream = stream_registry.create(owner_id=user_id)
+    
     async def response_generator():
         full_response = ""
+        pending_tickets = []
         
         try:
             user_email = current_user.get("email", "Non spécifié")
@@ -194,9 +234,10 @@ async def stream_message(
             meta = {
                 "type": "meta",
                 "conversation_id": conversation_id,
-                "is_new_conversation": is_new_conversation
+                "is_new_conversation": is_new_conversation,
+                "stream_id": stream.id
             }
-            yield f"data: {json.dumps(meta)}\n\n"
+            yield meta
             
             print(f"📨 DEBUG: Starting stream for conversation {conversation_id}")
             print(f"   Is new: {is_new_conversation}")
@@ -209,11 +250,20 @@ async def stream_message(
                 user_message=chat_request.message,
                 conversation_id=conversation_id,
                 chat_history=conversation.messages,
-                user_email=user_email
+                user_email=user_email,
+                summary=conversation.summary,
+                summary_message_count=conversation.summary_message_count,
+                history_offset=history_offset,
+                owner_id=user_id
             ):
+                if isinstance(chunk, dict):
+                    # Ticket event: forwarded as its own frame
+                    if chunk["type"] == "ticket_pending":
+                        pending_tickets.append(chunk["ticket_id"])
+                    yield chunk
+                    continue
                 full_response += chunk
-                chunk_data = {"type": "content", "chunk": chunk}
-                yield f"data: {json.dumps(chunk_data)}\n\n"
+                yield {"type": "content", "chunk": chunk}
             
             
             # 3. Save to DB after streaming is done
@@ -232,30 +282,141 @@ async def stream_message(
             await conversation_service.add_messages(
                 conversation_id=conversation_id,
                 historique_id=historique_id,
-                messages=[user_msg, ai_msg]
+                messages=[user_msg, ai_msg],
+                create_with_title=titre
             )
             
             print(f"✅ DEBUG: Messages saved successfully!")
             
+            summary_service.schedule_refresh(
+                conversation_id=conversation_id,
+                messages=conversation.messages + [user_msg, ai_msg],
+                summary=conversation.summary,
+                summary_message_count=conversation.summary_message_count,
+                offset=history_offset
+            )
+            
             # 4. Yield done signal with message IDs
-            yield f"data: {json.dumps({'type': 'done', 'user_message_id': user_msg.id, 'assistant_message_id': ai_msg.id})}\n\n"
+            yield {"type": "done", "user_message_id": user_msg.id, "assistant_message_id": ai_msg.id}
+            
+            # 5. Report the outcome of queued tickets, as long as they are handled soon
+            if pending_tickets:
+                async for ticket in ticket_outbox.watch(pending_tickets, owner_id=user_id, timeout=TICKET_STREAM_WAIT_SECONDS):
+                    yield {"type": f"ticket_{ticket['status']}", **ticket}
             
         except Exception as e:
             print(f"Stream error: {e}")
-            error_data = {"type": "error", "error": str(e)}
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield {"type": "error", "error": str(e)}
+
+    # Generation runs in the background; this response is only the first reader
+    stream_registry.run(stream, response_generator())
+    return StreamingResponse(_sse_frames(stream, last_event_id=0), media_type="text/event-stream")
+
+
+@router.get("/stream/{stream_id}", status_code=status.HTTP_200_OK)
+async def resume_stream(
+    stream_id: str,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id: Optional[int] = Query(None, ge=0, description="Fallback for the Last-Event-ID header"),
+    current_user: dict = Depends(get_current_user),
+    stream_registry: StreamRegistry = Depends(get_stream_registry)
+):
+    """
+    Resume a chat stream after a dropped connection
+    Replays the frames after Last-Event-ID, then continues live
+    (no second generation). Streams are kept STREAM_RETENTION_SECONDS after
+    they finish.
+    
+    Authentication: Required (JWT)
+    """
+    stream = stream_registry.get(stream_id, owner_id=str(current_user["_id"]))
+    if stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stream not found or expired"
+        )
+    
+    try:
+        resume_from = int(last_event_id_header) if last_event_id_header is not None else (last_event_id or 0)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Last-Event-ID"
+        )
+    
+    if not stream.can_resume_from(resume_from):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Missed frames are no longer buffered, reload the conversation"
+        )
+    
+    return StreamingResponse(_sse_frames(stream, last_event_id=resume_from), media_type="text/event-stream")
 
-    return StreamingResponse(response_generator(), media_type="text/event-stream")
+
+@router.get("/tickets/{ticket_id}", response_model=TicketStatusResponse, status_code=status.HTTP_200_OK)
+async def get_ticket_status(
+    ticket_id: str,
+    current_user: dict = Depends(get_current_user),
+    ticket_outbox: TicketOutbox = Depends(get_ticket_outbox)
+):
+    """
+    State of a ticket queued from a chat answer
+    (pending, processing, created or failed, with the Jira key once created)
+    
+    Authentication: Required (JWT)
+    """
+    try:
+        ticket = await ticket_outbox.get(ticket_id, owner_id=str(current_user["_id"]))
+        if ticket is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Ticket not found"
+            )
+        return TicketStatusResponse(**ticket)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get ticket status: {str(e)}"
+        )
+
+
+async def _sse_frames(stream, last_event_id: int):
+    """SSE encoding of a stream's frames, each with its event ID"""
+    try:
+        async for event_id, data in stream.frames_after(last_event_id):
+            yield f"id: {event_id}\ndata: {json.dumps(data)}\n\n"
+    except StreamGap as e:
+        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
 
 
 @router.get("/health", status_code=status.HTTP_200_OK)
-async def chat_health_check():
+async def chat_health_check(
+    ai_service: AIService = Depends(get_ai_service),
+    summary_service: SummaryService = Depends(get_summary_service),
+    stream_registry: StreamRegistry = Depends(get_stream_registry),
+    ticket_outbox: TicketOutbox = Depends(get_ticket_outbox)
+):
     """
     Health check endpoint for chat service
+    Includes answer cache, retrieval (dense calls avoided), single-flight, summary,
+    history ID, user cache, resumable stream and ticket outbox counters, and
+    response sizes (before and after compression)
     No authentication required
     """
     return {
         "status": "healthy",
         "service": "chat",
+        "answer_cache": ai_service.cache_stats(),
+        "retrieval": ai_service.retrieval_stats(),
+        "single_flight": ai_service.single_flight_stats(),
+        "history_summary": summary_service.stats(),
+        "history_id_cache": history_id_cache_stats(),
+        "user_cache": user_cache_stats(),
+        "streams": stream_registry.stats(),
+        "tickets": ticket_outbox.stats(),
+        "responses": response_size_stats(),
         "timestamp": datetime.utcnow().isoformat()
     }
\ No newline at end of file
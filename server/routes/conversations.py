@@ -5,10 +5,12 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import Optional
 
 from server.middlewares.auth import get_current_user
+from server.responses import ORJSONResponse
 from server.models import (
     ConversationResponse,
     ConversationListResponse,
     ConversationCreate,
+    MessagePageResponse,
     PaginationParams
 )
 from server.services import (
@@ -62,13 +64,20 @@ async def create_new_conversation(
 async def list_user_conversations(
     skip: int = Query(0, ge=0, description="Number of items to skip"),
     limit: int = Query(20, ge=1, le=100, description="Maximum items to return"),
+    total_mode: str = Query(
+        "exact",
+        pattern="^(exact|cached|none)$",
+        description="exact: counted, cached: counted at most once a minute, none: total is null"
+    ),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page (replaces skip)"),
     current_user: dict = Depends(get_current_user),
     conversation_service: ConversationService = Depends(get_conversation_service),
     history_service: HistoryService = Depends(get_history_service)
 ):
     """
     List all conversations for the authenticated user
-    Supports pagination
+    Supports offset (skip) and cursor (after / next_cursor) pagination;
+    has_more does not depend on the total
     
     Authentication: Required (JWT)
     """
@@ -82,11 +91,15 @@ async def list_user_conversations(
         pagination = PaginationParams(skip=skip, limit=limit)
         conversations = await conversation_service.list_conversations(
             historique_id=historique_id,
-            pagination=pagination
+            pagination=pagination,
+            total_mode=total_mode,
+            after=after
         )
         
         return conversations
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -104,6 +117,7 @@ async def get_conversation(
     """
     Get a specific conversation by ID
     Validates ownership automatically
+    Serialized with orjson (large payload), compressed when the client accepts it
     
     Authentication: Required (JWT)
     """
@@ -119,7 +133,7 @@ async def get_conversation(
             historique_id=historique_id
         )
         
-        return conversation
+        return ORJSONResponse(conversation)
         
     except HTTPException:
         raise
@@ -130,6 +144,44 @@ async def get_conversation(
         )
 
 
+@router.get("/{conversation_id}/messages", response_model=MessagePageResponse)
+async def get_conversation_messages(
+    conversation_id: str,
+    before: Optional[int] = Query(None, ge=0, description="Only messages with a seq lower than this"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum messages to return"),
+    current_user: dict = Depends(get_current_user),
+    conversation_service: ConversationService = Depends(get_conversation_service),
+    history_service: HistoryService = Depends(get_history_service)
+):
+    """
+    Get a page of messages of a conversation (latest page when `before` is omitted)
+    Pass `next_before` from the response to load older messages
+    
+    Authentication: Required (JWT)
+    """
+    try:
+        user_id = str(current_user["_id"])
+        
+        # Get user's history
+        historique_id = await history_service.get_or_create_history(user_id)
+        
+        # Fetch the page (ownership validation happens inside)
+        return await conversation_service.get_messages_page(
+            conversation_id=conversation_id,
+            historique_id=historique_id,
+            before=before,
+            limit=limit
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch messages: {str(e)}"
+        )
+
+
 @router.delete("/{conversation_id}", status_code=status.HTTP_200_OK)
 async def delete_conversation(
     conversation_id: str,
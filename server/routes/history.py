@@ -4,6 +4,7 @@ History Routes - User conversation history API endpoints
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from server.middlewares.auth import get_current_user
+from server.responses import ORJSONResponse
 from server.models import HistoryResponse
 from server.services import get_history_service, HistoryService
 
@@ -20,6 +21,7 @@ async def get_full_history(
     Includes all conversations with metadata
     
     Auto-creates history if it doesn't exist yet
+    Serialized with orjson (large payload), compressed when the client accepts it
     
     Authentication: Required (JWT)
     """
@@ -29,7 +31,7 @@ async def get_full_history(
         # Fetch complete history
         history = await history_service.get_full_history(user_id)
         
-        return history
+        return ORJSONResponse(history)
         
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,3 @@
+"""
+Maintenance scripts (run with python -m server.scripts.<name>)
+"""
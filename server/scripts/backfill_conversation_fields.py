@@ -0,0 +1,112 @@
+"""
+Backfill - Denormalized conversation fields used by the listings
+
+Computes message_count, preview (first user message), last_role and
+last_message for existing conversations, and defaults is_pinned to False.
+Embedded conversations are updated server-side (pipeline update, no message
+leaves MongoDB); conversations in the messages collection layout use indexed
+lookups on (conversation_id, seq).
+
+Usage (from the project root):
+    python -m server.scripts.backfill_conversation_fields [--batch-size 500] [--dry-run]
+
+Safe to run again at any time: the fields are recomputed from the messages.
+"""
+import argparse
+import asyncio
+
+from server.database import conversation_collection, message_collection
+from server.services.message_store import PREVIEW_LENGTH, LAST_MESSAGE_LENGTH, snippet, snippet_expression
+
+
+def _snippet_or_null(message, length: int):
+    """snippet_expression of message.texte, null when there is no such message"""
+    return {"$cond": [{"$ifNull": [message, False]}, snippet_expression(f"{message}.texte", length), None]}
+
+
+# Same values as the write path (message_store.denormalized_fields)
+EMBEDDED_PIPELINE = [{"$set": {
+    "message_count": {"$size": "$messages"},
+    "preview": {"$let": {
+        "vars": {"first": {"$arrayElemAt": [
+            {"$filter": {"input": "$messages", "cond": {"$eq": ["$$this.role", "user"]}}}, 0
+        ]}},
+        "in": _snippet_or_null("$$first", PREVIEW_LENGTH)
+    }},
+    "last_role": {"$let": {
+        "vars": {"last": {"$arrayElemAt": ["$messages", -1]}},
+        "in": {"$ifNull": ["$$last.role", None]}
+    }},
+    "last_message": {"$let": {
+        "vars": {"last": {"$arrayElemAt": ["$messages", -1]}},
+        "in": _snippet_or_null("$$last", LAST_MESSAGE_LENGTH)
+    }},
+    "is_pinned": {"$ifNull": ["$is_pinned", False]}
+}}]
+
+
+async def backfill_separate(conversation_id) -> None:
+    """Fields of a conversation whose messages are in the messages collection"""
+    count = await message_collection.count_documents({"conversation_id": conversation_id})
+    first_user = await message_collection.find_one(
+        {"conversation_id": conversation_id, "role": "user"},
+        {"texte": 1},
+        sort=[("seq", 1)]
+    )
+    last = await message_collection.find_one(
+        {"conversation_id": conversation_id},
+        {"role": 1, "texte": 1},
+        sort=[("seq", -1)]
+    )
+    await conversation_collection.update_one(
+        {"_id": conversation_id},
+        [{"$set": {
+            "message_count": count,
+            "preview": {"$literal": snippet(first_user["texte"], PREVIEW_LENGTH) if first_user else None},
+            "last_role": {"$literal": last["role"] if last else None},
+            "last_message": {"$literal": snippet(last["texte"], LAST_MESSAGE_LENGTH) if last else None},
+            "is_pinned": {"$ifNull": ["$is_pinned", False]}
+        }}]
+    )
+
+
+async def run_backfill(batch_size: int, dry_run: bool):
+    if dry_run:
+        total = await conversation_collection.count_documents({})
+        missing = await conversation_collection.count_documents({"message_count": {"$exists": False}})
+        print(f"🔎 {total} conversations, {missing} without denormalized fields")
+        return
+
+    updated = 0
+    last_id = None
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        # Only conversations of the messages collection layout have a next_seq counter
+        cursor = conversation_collection.find(query, {"_id": 1, "next_seq": 1}).sort("_id", 1).limit(batch_size)
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            break
+
+        embedded_ids = [conv["_id"] for conv in batch if "next_seq" not in conv]
+        if embedded_ids:
+            await conversation_collection.update_many(
+                {"_id": {"$in": embedded_ids}, "messages": {"$exists": True}},
+                EMBEDDED_PIPELINE
+            )
+        for conversation in batch:
+            if "next_seq" in conversation:
+                await backfill_separate(conversation["_id"])
+
+        updated += len(batch)
+        last_id = batch[-1]["_id"]
+        print(f"   ⬆️  {updated} conversations updated")
+
+    print(f"✅ Backfill done: {updated} conversations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the denormalized conversation fields")
+    parser.add_argument("--batch-size", type=int, default=500, help="Conversations updated per query")
+    parser.add_argument("--dry-run", action="store_true", help="Only count conversations to update")
+    args = parser.parse_args()
+    asyncio.run(run_backfill(args.batch_size, args.dry_run))
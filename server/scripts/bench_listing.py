@@ -0,0 +1,90 @@
+"""
+Benchmark - Conversation listing with full documents vs denormalized fields
+
+Seeds a throwaway database with one user history holding long conversations,
+then compares the former listing read (whole documents, messages included)
+with the projected read used by list_conversations / get_full_history.
+
+Usage (from the project root, uses MONGO_URI):
+    python -m server.scripts.bench_listing [--conversations 50] [--messages 200] [--rounds 10]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+
+from server.database import client
+from server.services.message_store import PREVIEW_LENGTH, LAST_MESSAGE_LENGTH, LIST_PROJECTION, snippet
+
+BENCH_DATABASE = "chatbot_bench_listing"
+
+
+def make_conversation(historique_id: ObjectId, index: int, message_count: int) -> dict:
+    now = datetime.utcnow()
+    messages = [
+        {
+            "id": str(uuid.uuid4()),
+            "role": "user" if seq % 2 == 0 else "assistant",
+            "texte": f"Message {seq} : la vanne V-{index} fuit au niveau de la membrane. " * 8,
+            "date": now - timedelta(minutes=message_count - seq),
+            "is_favorite": False
+        }
+        for seq in range(message_count)
+    ]
+    return {
+        "historique_id": historique_id,
+        "titre": f"Conversation {index}",
+        "is_pinned": False,
+        "messages": messages,
+        "message_count": len(messages),
+        "preview": snippet(messages[0]["texte"], PREVIEW_LENGTH),
+        "last_role": messages[-1]["role"],
+        "last_message": snippet(messages[-1]["texte"], LAST_MESSAGE_LENGTH),
+        "created_at": now,
+        "last_updated": now - timedelta(minutes=index)
+    }
+
+
+async def timed_read(collection, query, projection, rounds: int):
+    timings, payload = [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        docs = await collection.find(query, projection).sort("last_updated", -1).to_list(length=None)
+        timings.append((time.perf_counter() - start) * 1000)
+        payload = sum(len(bson.encode(doc)) for doc in docs)
+    return statistics.median(timings), payload
+
+
+async def main(conversations: int, messages: int, rounds: int):
+    database = client[BENCH_DATABASE]
+    collection = database.get_collection("conversations")
+    await collection.drop()
+    await collection.create_index([("historique_id", 1), ("last_updated", -1)])
+
+    historique_id = ObjectId()
+    await collection.insert_many([make_conversation(historique_id, i, messages) for i in range(conversations)])
+    print(f"{conversations} conversations x {messages} messages, {rounds} rounds")
+
+    query = {"historique_id": historique_id}
+    full_ms, full_bytes = await timed_read(collection, query, None, rounds)
+    projected_ms, projected_bytes = await timed_read(collection, query, LIST_PROJECTION, rounds)
+
+    print(f"full documents   p50={full_ms:8.2f} ms  payload={full_bytes / 1024:10.1f} KiB")
+    print(f"list projection  p50={projected_ms:8.2f} ms  payload={projected_bytes / 1024:10.1f} KiB")
+    print(f"reduction        x{full_ms / max(projected_ms, 1e-6):.1f} latency, x{full_bytes / max(projected_bytes, 1):.0f} payload")
+
+    await client.drop_database(BENCH_DATABASE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the conversation listing payload")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.conversations, args.messages, args.rounds))
@@ -0,0 +1,67 @@
+"""
+Benchmark - Password verification under concurrent logins
+
+Runs a burst of concurrent bcrypt verifications the way /auth/login does,
+first inline on the event loop (former behaviour), then on the bcrypt thread
+pool, while a ticker task measures how long the event loop is stalled
+(what an open chat stream would feel).
+No database is needed.
+
+Usage (from the project root):
+    python -m server.scripts.bench_login [--logins 32] [--rounds 12]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import bcrypt
+
+from server import utils
+
+PASSWORD = "mot-de-passe-de-test"
+TICK_SECONDS = 0.005
+
+
+async def ticker(stalls: list, stop: asyncio.Event):
+    """Records how late each tick is: the event loop was busy for that long"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        stalls.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+
+async def burst(logins: int, hashed: str, verify):
+    stalls, stop = [], asyncio.Event()
+    tick_task = asyncio.create_task(ticker(stalls, stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[verify(PASSWORD, hashed) for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await tick_task
+    assert all(results)
+    return logins / elapsed, max(stalls, default=0.0), statistics.median(stalls) if stalls else 0.0
+
+
+async def verify_inline(plain_password: str, hashed_password: str) -> bool:
+    return utils.verify_password(plain_password, hashed_password)
+
+
+async def main(logins: int, rounds: int):
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+    print(f"{logins} concurrent logins, bcrypt cost {rounds}, {utils.PASSWORD_HASH_WORKERS} pool workers")
+
+    for name, verify in (("inline (event loop)", verify_inline), ("thread pool", utils.verify_password_async)):
+        throughput, max_stall, median_stall = await burst(logins, hashed, verify)
+        print(f"{name:20} {throughput:7.1f} logins/s  loop stall max={max_stall:8.1f} ms  p50={median_stall:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of password verification under concurrency")
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=utils.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.rounds))
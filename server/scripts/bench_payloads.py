@@ -0,0 +1,139 @@
+"""
+Benchmark - Large conversation payloads: serialization and compression
+
+Serves one long conversation (500 messages by default) from memory, without
+MongoDB, and measures the CPU time per request and the bytes on the wire of:
+    - the former response: messages validated into MessageResponse, then
+      response_model validation and FastAPI's JSON encoding, never compressed
+    - GET /conversations/{id} as served now (orjson, no re-validation), with
+      identity, gzip and brotli encodings
+
+Usage (from the project root):
+    python -m server.scripts.bench_payloads [--messages 500] [--rounds 50]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+
+import main
+from server.middlewares.auth import get_current_user
+from server.middlewares.compression import brotli
+from server.models import ConversationResponse, MessageResponse
+from server.services import get_conversation_service, get_history_service, ConversationService
+
+USER = {"_id": ObjectId(), "email": "bench@example.com"}
+
+
+def make_conversation(message_count: int) -> dict:
+    now = datetime.utcnow()
+    messages = []
+    for seq in range(message_count):
+        user_turn = seq % 2 == 0
+        texte = (
+            f"La vanne V-{seq} fuit au niveau de la membrane, que dois-je vérifier ?"
+            if user_turn
+            else f"Étape {seq} : coupez l'alimentation, vérifiez le joint torique et la bobine. " * 6
+        )
+        messages.append({
+            "id": str(uuid.uuid4()),
+            "role": "user" if user_turn else "assistant",
+            "texte": texte,
+            "date": now - timedelta(minutes=message_count - seq),
+            "is_favorite": seq % 50 == 0,
+            "token_count": len(texte) // 3,
+            "seq": seq
+        })
+    return {
+        "_id": ObjectId(),
+        "titre": "Fuite vanne V-12",
+        "is_pinned": False,
+        "messages": messages,
+        "message_count": message_count,
+        "created_at": now - timedelta(days=1),
+        "last_updated": now
+    }
+
+
+class InMemoryHistoryService:
+    async def get_or_create_history(self, user_id: str) -> str:
+        return str(ObjectId())
+
+
+class InMemoryConversationService(ConversationService):
+    """Real response formatting, conversation read from memory"""
+
+    def __init__(self, conversation: dict):
+        self.conversation = conversation
+
+    async def get_conversation_by_id(self, conversation_id, historique_id, message_limit=None):
+        return self._format_conversation_response(self.conversation, self.conversation["messages"])
+
+
+def former_app(conversation: dict) -> FastAPI:
+    """The route as it was: validated messages, response_model encoding, no compression"""
+    app = FastAPI()
+
+    @app.get("/conversations/{conversation_id}", response_model=ConversationResponse)
+    async def get_conversation(conversation_id: str):
+        return ConversationResponse(
+            id=str(conversation["_id"]),
+            titre=conversation["titre"],
+            is_pinned=conversation["is_pinned"],
+            messages=[MessageResponse(**msg) for msg in conversation["messages"]],
+            created_at=conversation["created_at"].isoformat(),
+            last_updated=conversation["last_updated"].isoformat(),
+            message_count=conversation["message_count"]
+        )
+
+    return app
+
+
+async def measure(app, path: str, accept_encoding: str, rounds: int):
+    """CPU ms per request (client included, same for every case) and bytes on the wire"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Accept-Encoding": accept_encoding}
+        response = await client.get(path, headers=headers)
+        response.raise_for_status()
+        wire_bytes = int(response.headers["content-length"])
+        identity_bytes = len(response.content)
+
+        start = time.process_time()
+        for _ in range(rounds):
+            await client.get(path, headers=headers)
+        cpu_ms = (time.process_time() - start) * 1000 / rounds
+    return cpu_ms, identity_bytes, wire_bytes, response.headers.get("content-encoding", "identity")
+
+
+async def run(message_count: int, rounds: int):
+    conversation = make_conversation(message_count)
+    path = f"/conversations/{conversation['_id']}"
+
+    main.app.dependency_overrides[get_current_user] = lambda: USER
+    main.app.dependency_overrides[get_history_service] = InMemoryHistoryService
+    main.app.dependency_overrides[get_conversation_service] = lambda: InMemoryConversationService(conversation)
+
+    cases = [("former (pydantic + JSON)", former_app(conversation), "gzip, deflate, br")]
+    cases += [("orjson, identity", main.app, "identity"), ("orjson + gzip", main.app, "gzip")]
+    if brotli is not None:
+        cases.append(("orjson + brotli", main.app, "br, gzip"))
+
+    print(f"GET /conversations/{{id}}, {message_count} messages, {rounds} requests per case")
+    print(f"{'case':<26} {'CPU ms/req':>10} {'JSON bytes':>11} {'wire bytes':>11} {'encoding':>9}")
+    for name, app, accept_encoding in cases:
+        cpu_ms, identity_bytes, wire_bytes, encoding = await measure(app, path, accept_encoding, rounds)
+        print(f"{name:<26} {cpu_ms:>10.2f} {identity_bytes:>11} {wire_bytes:>11} {encoding:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare conversation payload serialization and compression")
+    parser.add_argument("--messages", type=int, default=500, help="Messages in the conversation")
+    parser.add_argument("--rounds", type=int, default=50, help="Requests per case")
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.rounds))
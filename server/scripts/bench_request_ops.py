@@ -0,0 +1,141 @@
+"""
+Benchmark - MongoDB operations per authenticated request
+
+Counts the commands sent to MongoDB (pymongo CommandListener), and how many
+of them are writes, while serving /conversations/list and /chat/stream (turns
+of an existing and of a new conversation), with cold caches (user looked up
+on every request, history ID taken from the token) and with warm caches.
+The LLM is replaced by a canned answer: only the database work is measured.
+A throwaway user is created in the configured database and removed afterwards.
+
+Usage (from the project root, uses MONGO_URI):
+    python -m server.scripts.bench_request_ops [--requests 20]
+"""
+import argparse
+import asyncio
+import uuid
+from collections import Counter
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts started commands by name (handshake and session commands excluded)"""
+
+    IGNORED = {"endSessions", "hello", "isMaster", "ismaster", "ping"}
+    WRITES = {"insert", "update", "delete", "findAndModify"}
+
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        if event.command_name not in self.IGNORED:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Listeners only apply to clients created afterwards: register before importing the app
+counter = CommandCounter()
+monitoring.register(counter)
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+from server.database import user_collection, history_collection, conversation_collection, message_collection  # noqa: E402
+from server.middlewares import auth as auth_middleware  # noqa: E402
+from server.services import get_ai_service  # noqa: E402
+from server.services import history_service  # noqa: E402
+
+
+class CannedAIService:
+    """Stands in for AIService so no LLM is called"""
+
+    def generate_conversation_title(self, message: str) -> str:
+        return message[:40]
+
+    async def stream_response(self, **kwargs):
+        for chunk in ("Vérifiez ", "la membrane ", "de la vanne."):
+            yield chunk
+
+
+def clear_caches():
+    auth_middleware._users.clear()
+    history_service._history_ids.clear()
+
+
+async def measure(client: httpx.AsyncClient, name: str, send, requests: int, cold: bool):
+    counter.commands.clear()
+    for _ in range(requests):
+        if cold:
+            clear_caches()
+        response = await send()
+        response.raise_for_status()
+    total = sum(counter.commands.values())
+    writes = sum(count for command, count in counter.commands.items() if command in CommandCounter.WRITES)
+    detail = ", ".join(f"{command}={count / requests:.1f}" for command, count in sorted(counter.commands.items()))
+    print(
+        f"{name:26} {'cold' if cold else 'warm'}  {total / requests:5.1f} ops/request"
+        f"  {writes / requests:4.1f} writes  ({detail})"
+    )
+
+
+async def main(requests: int):
+    app.dependency_overrides[get_ai_service] = CannedAIService
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/auth/signup", json={
+            "username": "bench",
+            "email": email,
+            "password": "bench-password"
+        })
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        first = await client.post("/chat/stream", json={"message": "Ma vanne fuit"}, headers=headers)
+        conversation_id = first.text.split('"conversation_id": "')[1].split('"')[0]
+
+        def list_conversations():
+            return client.get("/conversations/list", params={"total_mode": "none"}, headers=headers)
+
+        def stream():
+            return client.post(
+                "/chat/stream",
+                json={"message": "Et ensuite ?", "conversation_id": conversation_id},
+                headers=headers
+            )
+
+        def stream_new_conversation():
+            return client.post("/chat/stream", json={"message": "Nouvelle panne"}, headers=headers)
+
+        try:
+            print(f"{requests} requests per scenario")
+            scenarios = (
+                ("/conversations/list", list_conversations),
+                ("/chat/stream", stream),
+                ("/chat/stream (new)", stream_new_conversation)
+            )
+            for name, send in scenarios:
+                await measure(client, name, send, requests, cold=True)
+                await measure(client, name, send, requests, cold=False)
+        finally:
+            user = await user_collection.find_one({"email": email})
+            history = await history_collection.find_one({"user_id": user["_id"]})
+            conversation_ids = await conversation_collection.distinct("_id", {"historique_id": history["_id"]})
+            await message_collection.delete_many({"conversation_id": {"$in": conversation_ids}})
+            await conversation_collection.delete_many({"historique_id": history["_id"]})
+            await history_collection.delete_one({"_id": history["_id"]})
+            await user_collection.delete_one({"_id": user["_id"]})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of MongoDB operations per request")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
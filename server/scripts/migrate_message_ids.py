@@ -0,0 +1,191 @@
+"""
+Migration - Backfill message `id` / `is_favorite` and stamp schema_version
+
+Messages saved before they had an `id` (needed to favorite them) or an
+`is_favorite` flag get them here, once, instead of on every conversation read.
+Each migrated conversation gets schema_version = MESSAGE_SCHEMA_VERSION; new
+conversations are created with it.
+
+Embedded conversations are updated in place: only the missing fields are
+$set (messages.<index>.id), never the whole array, and each of them is
+guarded in the filter (with the messages array itself), so a conversation
+changed or moved to the collection layout in the meantime is left
+untouched and picked up by the next run. Messages of the collection layout
+get the same guarded $set, one bulk write per batch.
+
+Usage (from the project root):
+    python -m server.scripts.migrate_message_ids [--batch-size 200] [--pause-ms 100] [--dry-run]
+
+The migration is resumable: conversations already at MESSAGE_SCHEMA_VERSION
+are skipped, so it can be stopped and started again at any time.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from server.database import conversation_collection, message_collection
+from server.services.message_store import MESSAGE_SCHEMA_VERSION
+
+# Conversations that still need the migration (no schema_version before it)
+OUTDATED = {"$or": [
+    {"schema_version": {"$exists": False}},
+    {"schema_version": {"$lt": MESSAGE_SCHEMA_VERSION}}
+]}
+MISSING_FIELDS = {"$or": [{"id": {"$exists": False}}, {"is_favorite": {"$exists": False}}]}
+
+
+def missing_fields(message: Dict, prefix: str = "") -> Dict:
+    """$set values of the fields a message lacks (paths under `prefix`)"""
+    fields = {}
+    if "id" not in message:
+        fields[f"{prefix}id"] = str(uuid.uuid4())
+    if "is_favorite" not in message:
+        fields[f"{prefix}is_favorite"] = False
+    return fields
+
+
+def guarded_update(document_id, fields: Dict, embedded: bool = False) -> UpdateOne:
+    """
+    $set of backfilled fields, applied only while every one of them is still missing
+    Embedded conversations are also stamped, and only updated while their messages
+    are still an array: once moved to the collection layout, messages.<index>.id
+    would create a `messages` subdocument instead of matching nothing
+    """
+    query = {"_id": document_id, **{path: {"$exists": False} for path in fields}}
+    update = dict(fields)
+    if embedded:
+        query["messages"] = {"$type": "array"}
+        update["schema_version"] = MESSAGE_SCHEMA_VERSION
+    return UpdateOne(query, {"$set": update})
+
+
+async def migrate_batch(batch: List[Dict]) -> Dict:
+    """Backfill one batch of conversations; returns what was done"""
+    stats = {"messages": 0, "stamped": 0, "skipped": 0}
+    operations = []
+    complete_ids = []
+    separate_ids = []
+    for conversation in batch:
+        if "messages" not in conversation:
+            separate_ids.append(conversation["_id"])
+            continue
+
+        fields = {}
+        for index, message in enumerate(conversation["messages"]):
+            message_fields = missing_fields(message, prefix=f"messages.{index}.")
+            if message_fields:
+                fields.update(message_fields)
+                stats["messages"] += 1
+        if fields:
+            operations.append(guarded_update(conversation["_id"], fields, embedded=True))
+        else:
+            complete_ids.append(conversation["_id"])
+
+    if operations:
+        result = await conversation_collection.bulk_write(operations, ordered=False)
+        stats["stamped"] += result.modified_count
+        # A guard failed: the conversation changed while this batch was read
+        stats["skipped"] += len(operations) - result.modified_count
+
+    if separate_ids:
+        message_operations = []
+        async for message in message_collection.find(
+            {"conversation_id": {"$in": separate_ids}, **MISSING_FIELDS},
+            {"id": 1, "is_favorite": 1}
+        ):
+            message_operations.append(guarded_update(message["_id"], missing_fields(message)))
+        if message_operations:
+            result = await message_collection.bulk_write(message_operations, ordered=False)
+            stats["messages"] += result.modified_count
+        # New messages of this layout are always written with both fields
+        complete_ids.extend(separate_ids)
+
+    if complete_ids:
+        result = await conversation_collection.update_many(
+            {"_id": {"$in": complete_ids}, **OUTDATED},
+            {"$set": {"schema_version": MESSAGE_SCHEMA_VERSION}}
+        )
+        stats["stamped"] += result.modified_count
+    return stats
+
+
+async def count_remaining() -> Dict:
+    """Conversations to migrate and messages missing a field"""
+    conversations = await conversation_collection.count_documents(OUTDATED)
+    pipeline = [
+        {"$match": {**OUTDATED, "messages": {"$exists": True}}},
+        {"$project": {"missing": {"$size": {"$filter": {
+            "input": "$messages",
+            "cond": {"$or": [
+                {"$eq": [{"$type": "$$this.id"}, "missing"]},
+                {"$eq": [{"$type": "$$this.is_favorite"}, "missing"]}
+            ]}
+        }}}}},
+        {"$group": {"_id": None, "messages": {"$sum": "$missing"}}}
+    ]
+    embedded = await conversation_collection.aggregate(pipeline).to_list(length=1)
+    separate = await message_collection.count_documents(MISSING_FIELDS)
+    return {
+        "conversations": conversations,
+        "messages": (embedded[0]["messages"] if embedded else 0) + separate
+    }
+
+
+async def run_migration(batch_size: int, pause_ms: int, dry_run: bool):
+    remaining = await count_remaining()
+    print(f"🔎 {remaining['conversations']} conversations to migrate, {remaining['messages']} messages missing an id or is_favorite")
+    if dry_run or remaining["conversations"] == 0:
+        return
+
+    total = remaining["conversations"]
+    done = 0
+    totals = {"messages": 0, "stamped": 0, "skipped": 0}
+    started = time.monotonic()
+    last_id = None
+    while True:
+        query = dict(OUTDATED)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        # Only the fields to test are read, not the message texts
+        cursor = conversation_collection.find(
+            query,
+            {"messages.id": 1, "messages.is_favorite": 1, "next_seq": 1}
+        ).sort("_id", 1).limit(batch_size)
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            break
+
+        stats = await migrate_batch(batch)
+        for name, value in stats.items():
+            totals[name] += value
+        done += len(batch)
+        last_id = batch[-1]["_id"]
+
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed > 0 else 0
+        eta = (total - done) / rate if rate > 0 and total > done else 0
+        print(
+            f"   ⬆️  {done}/{total} conversations ({done * 100 // max(total, 1)}%), "
+            f"{totals['messages']} messages backfilled, {rate:.0f} conv/s, ETA {eta:.0f}s"
+        )
+
+        # Throttling: leave room for the application's own queries
+        if pause_ms > 0:
+            await asyncio.sleep(pause_ms / 1000)
+
+    print(f"✅ Migration done: {totals['stamped']} conversations at schema_version {MESSAGE_SCHEMA_VERSION}, {totals['messages']} messages backfilled")
+    if totals["skipped"]:
+        print(f"⚠️ {totals['skipped']} conversations changed while migrating, run the migration again")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill message ids and favorites, then stamp schema_version")
+    parser.add_argument("--batch-size", type=int, default=200, help="Conversations read per query")
+    parser.add_argument("--pause-ms", type=int, default=100, help="Pause between batches (throttling)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be migrated")
+    args = parser.parse_args()
+    asyncio.run(run_migration(args.batch_size, args.pause_ms, args.dry_run))
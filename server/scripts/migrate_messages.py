@@ -0,0 +1,113 @@
+"""
+Migration - Move embedded conversation messages to the messages collection
+
+Each message of a conversation's `messages` array becomes a document of the
+`messages` collection with seq = its array index, then the array is removed
+from the conversation (its `next_seq` counter takes over).
+
+Usage (from the project root):
+    python -m server.scripts.migrate_messages [--batch-size 100] [--dry-run]
+
+The migration is resumable: migrated conversations have no messages array and
+are skipped, and re-inserting a message replaces it ((conversation_id, seq) is unique).
+Set MESSAGE_STORAGE=collection so new conversations use the same layout.
+"""
+import argparse
+import asyncio
+import uuid
+
+from pymongo import ReplaceOne
+
+from server.database import conversation_collection, message_collection, create_indexes
+from server.services.history_budget import count_tokens
+from server.services.message_store import message_document
+
+MAX_ATTEMPTS = 3
+
+
+async def migrate_conversation(conversation_id) -> int:
+    """
+    Copy the messages of one conversation, then drop its array
+    Returns the number of migrated messages (-1 if it kept changing)
+    """
+    for _ in range(MAX_ATTEMPTS):
+        conversation = await conversation_collection.find_one(
+            {"_id": conversation_id, "messages": {"$exists": True}},
+            {"messages": 1}
+        )
+        if conversation is None:
+            return 0  # Migrated in the meantime
+
+        messages = conversation["messages"]
+        operations = []
+        for seq, msg in enumerate(messages):
+            msg = dict(msg)
+            msg.setdefault("id", str(uuid.uuid4()))
+            msg.setdefault("is_favorite", False)
+            msg.setdefault("token_count", count_tokens(msg.get("texte", "")))
+            operations.append(ReplaceOne(
+                {"conversation_id": conversation_id, "seq": seq},
+                message_document(conversation_id, seq, msg),
+                upsert=True
+            ))
+        if operations:
+            await message_collection.bulk_write(operations, ordered=False)
+
+        # Only switch layout if no message was appended while copying
+        result = await conversation_collection.update_one(
+            {"_id": conversation_id, "messages": {"$size": len(messages)}},
+            {"$unset": {"messages": ""}, "$set": {"next_seq": len(messages)}}
+        )
+        if result.modified_count == 1:
+            return len(messages)
+    return -1
+
+
+async def run_migration(batch_size: int, dry_run: bool):
+    await create_indexes()
+
+    query = {"messages": {"$exists": True}}
+    if dry_run:
+        pipeline = [
+            {"$match": query},
+            {"$group": {"_id": None, "conversations": {"$sum": 1}, "messages": {"$sum": {"$size": "$messages"}}}}
+        ]
+        totals = await conversation_collection.aggregate(pipeline).to_list(length=1)
+        totals = totals[0] if totals else {"conversations": 0, "messages": 0}
+        print(f"🔎 {totals['conversations']} conversations ({totals['messages']} messages) to migrate")
+        return
+
+    migrated_conversations = 0
+    migrated_messages = 0
+    skipped = []
+    last_id = None
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        cursor = conversation_collection.find(batch_query, {"_id": 1}).sort("_id", 1).limit(batch_size)
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            break
+
+        for conversation in batch:
+            count = await migrate_conversation(conversation["_id"])
+            if count < 0:
+                skipped.append(str(conversation["_id"]))
+                continue
+            migrated_conversations += 1
+            migrated_messages += count
+        last_id = batch[-1]["_id"]
+        print(f"   ⬆️  {migrated_conversations} conversations, {migrated_messages} messages migrated")
+
+    print(f"✅ Migration done: {migrated_conversations} conversations, {migrated_messages} messages")
+    if skipped:
+        print(f"⚠️ {len(skipped)} busy conversations skipped, run the migration again: {', '.join(skipped)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move embedded messages to the messages collection")
+    parser.add_argument("--batch-size", type=int, default=100, help="Conversations read per query")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be migrated")
+    args = parser.parse_args()
+    asyncio.run(run_migration(args.batch_size, args.dry_run))
@@ -4,7 +4,15 @@ Business logic layer for the chatbot backend
 """
 from server.services.ai_service import AIService, get_ai_service, AIServiceException
 from server.services.conversation_service import ConversationService, get_conversation_service
-from server.services.history_service import HistoryService, get_history_service
+from server.services.history_service import (
+    HistoryService,
+    get_history_service,
+    remember_history_id,
+    history_id_cache_stats
+)
+from server.services.history_budget import SummaryService, get_summary_service
+from server.services.stream_registry import StreamRegistry, StreamGap, get_stream_registry
+from server.services.ticket_outbox import TicketOutbox, get_ticket_outbox
 
 __all__ = [
     "AIService",
@@ -14,4 +22,13 @@ __all__ = [
     "get_conversation_service",
     "HistoryService",
     "get_history_service",
+    "remember_history_id",
+    "history_id_cache_stats",
+    "SummaryService",
+    "get_summary_service",
+    "StreamRegistry",
+    "StreamGap",
+    "get_stream_registry",
+    "TicketOutbox",
+    "get_ticket_outbox",
 ]
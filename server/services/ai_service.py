@@ -4,17 +4,55 @@ Provides a clean interface to interact with the chatbot AI model
 """
 import sys
 import os
-from typing import List, Dict, AsyncGenerator
+import json
+import asyncio
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, List, Dict, AsyncGenerator, Optional, Tuple, Union
 from datetime import datetime
 
 # Add the ai directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "ai"))
 
-from ai.chatbot import get_chatbot_chain, create_atlassian_ticket
+from ai.chatbot import get_answer_chain, get_retriever, format_docs
+from ai.qdrantdb import get_embeddings, get_collection_version
 from server.models import MessageBase
+from server.services.answer_cache import SemanticAnswerCache
+from server.services.history_budget import build_history_window
+from server.services.ticket_outbox import get_ticket_outbox
 from langchain_core.messages import HumanMessage, AIMessage
 
 
+@dataclass
+class _TurnRecord:
+    """What a generated turn was built from, used to decide if it can be cached"""
+    chunk_ids: List[str] = field(default_factory=list)
+    parts: List[str] = field(default_factory=list)
+    used_tools: bool = False
+    completed: bool = False
+
+
+@dataclass
+class _TicketRequest:
+    """A ticket asked by the model, not queued yet (arguments without user data)"""
+    args: Dict
+
+
+# Concurrent identical first questions share one generation (alarm bursts)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+
+@dataclass
+class _Flight:
+    """One upstream generation and the chunks it produced so far, shared by its subscribers"""
+    chunks: List[Union[str, _TicketRequest]] = field(default_factory=list)
+    done: bool = False
+    error: Optional[BaseException] = None
+    subscribers: int = 0
+    task: Optional[asyncio.Task] = None
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+
 class AIService:
     """
     Service layer for AI model integration
@@ -24,60 +62,316 @@ class AIService:
     def __init__(self):
         """Initialize the AI service with the chatbot chain"""
         self._chain = None
+        self._retriever = None
+        self._embeddings = None
+        self._answer_cache = SemanticAnswerCache()
+        self._flights: Dict[str, _Flight] = {}
+        self._flight_stats = {"started": 0, "coalesced": 0, "cancelled": 0}
+        self._tickets = get_ticket_outbox()
     
     def _get_chain(self):
-        """Lazy initialization of the chatbot chain"""
+        """Lazy initialization of the answer chain (prompt + LLM)"""
         if self._chain is None:
-            self._chain = get_chatbot_chain()
+            self._chain = get_answer_chain()
         return self._chain
     
+    def _get_retriever(self):
+        """Lazy initialization of the knowledge base retriever"""
+        if self._retriever is None:
+            self._retriever = get_retriever()
+        return self._retriever
+    
+    async def warm_up(self) -> None:
+        """
+        Build the retriever before the first request
+        In-process indexes (BM25 fast path, RETRIEVER_BACKEND=numpy) are loaded
+        in a worker thread by the outermost layer that has them
+        """
+        layer = self._get_retriever()
+        while layer is not None and not hasattr(layer, "load"):
+            layer = getattr(layer, "retriever", None) or getattr(layer, "dense", None)
+        if layer is not None:
+            await asyncio.to_thread(layer.load)
+    
+    def _get_embeddings(self):
+        """Lazy initialization of the embeddings used as semantic cache keys"""
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+    
     async def stream_response(
         self,
         user_message: str,
         conversation_id: str,
         chat_history: List[MessageBase],
-        user_email: str = "Non spécifié"
-    ) -> AsyncGenerator[str, None]:
+        user_email: str = "Non spécifié",
+        summary: Optional[str] = None,
+        summary_message_count: int = 0,
+        history_offset: int = 0,
+        owner_id: Optional[str] = None
+    ) -> AsyncGenerator[Union[str, Dict], None]:
         """
         Stream AI response for a user message
+        First-turn questions go through the semantic answer cache
+        Only the recent turns that fit the token budget are sent verbatim,
+        older ones are represented by the conversation summary
+        (history_offset is the seq of chat_history[0] when only the latest
+        messages were loaded)
+        Ticket requests are queued in the ticket outbox (owned by owner_id):
+        the stream yields a ticket event dict after their text chunk
         """
         try:
-            chain = self._get_chain()
+            window = build_history_window(
+                chat_history,
+                summary,
+                summary_message_count,
+                offset=history_offset
+            )
+            if window.dropped:
+                print(f"⚠️ {window.dropped} old messages left out until the summary is refreshed")
             
             # Convert DB history to LangChain messages
             lc_history = []
-            for msg in chat_history:
+            for msg in window.messages:
                 if msg.role == "user":
                     lc_history.append(HumanMessage(content=msg.texte))
                 elif msg.role == "assistant":
                     lc_history.append(AIMessage(content=msg.texte))
             
-            async for chunk in self._stream_response(
-                chain=chain,
-                user_message=user_message,
-                chat_history=lc_history,
-                user_email=user_email
-            ):
+            if not chat_history and not history_offset:
+                stream = self._stream_first_turn_coalesced(user_message, user_email, conversation_id, owner_id)
+            else:
+                stream = self._stream_response(
+                    user_message=user_message,
+                    chat_history=lc_history,
+                    user_email=user_email,
+                    history_summary=window.summary,
+                    conversation_id=conversation_id,
+                    owner_id=owner_id
+                )
+            
+            async for chunk in stream:
                 yield chunk
             
         except Exception as e:
             print(f"❌ AI Service Error: {str(e)}")
             raise AIServiceException(f"Failed to generate AI response: {str(e)}")
 
+    def _stream_first_turn_coalesced(
+        self,
+        user_message: str,
+        user_email: str,
+        conversation_id: str,
+        owner_id: Optional[str]
+    ) -> AsyncGenerator[Union[str, Dict], None]:
+        """
+        First-turn stream, shared with identical questions already in flight
+        The shared generation carries no user data: a ticket asked by the
+        model is queued by each subscriber, in its own conversation and with
+        its own email
+        """
+        if not SINGLE_FLIGHT_ENABLED:
+            return self._generate_first_turn(user_message, user_email, conversation_id, owner_id)
+        
+        shared = partial(self._generate_first_turn, user_message, defer_tickets=True)
+        return self._queue_deferred_tickets(
+            self._subscribe(self._flight_key(user_message), shared),
+            user_email,
+            conversation_id,
+            owner_id
+        )
+    
+    def _generate_first_turn(
+        self,
+        user_message: str,
+        user_email: str = "Non spécifié",
+        conversation_id: Optional[str] = None,
+        owner_id: Optional[str] = None,
+        defer_tickets: bool = False
+    ) -> AsyncGenerator[Union[str, Dict, _TicketRequest], None]:
+        if self._answer_cache.enabled:
+            return self._stream_first_turn(user_message, user_email, conversation_id, owner_id, defer_tickets)
+        return self._stream_response(
+            user_message=user_message,
+            chat_history=[],
+            user_email=user_email,
+            conversation_id=conversation_id,
+            owner_id=owner_id,
+            defer_tickets=defer_tickets
+        )
+    
+    async def _queue_deferred_tickets(
+        self,
+        stream: AsyncGenerator[Union[str, _TicketRequest], None],
+        user_email: str,
+        conversation_id: Optional[str],
+        owner_id: Optional[str]
+    ) -> AsyncGenerator[Union[str, Dict], None]:
+        """Queue the ticket requests of a shared stream for this subscriber"""
+        async for chunk in stream:
+            if isinstance(chunk, _TicketRequest):
+                args = {**chunk.args, "user_email": user_email}
+                async for item in self._queue_ticket(conversation_id, owner_id, args):
+                    yield item
+            else:
+                yield chunk
+    
+    @staticmethod
+    def _flight_key(user_message: str) -> str:
+        """Case and whitespace insensitive key of a first question (empty history)"""
+        return " ".join(user_message.lower().split())
+    
+    async def _subscribe(self, key: str, generate) -> AsyncGenerator[Union[str, _TicketRequest], None]:
+        """
+        Stream the flight of this key, starting it if none is in flight
+        Late subscribers first get the chunks already produced. The upstream
+        generation is cancelled only when its last subscriber leaves.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run_flight(key, flight, generate()))
+            self._flight_stats["started"] += 1
+        else:
+            self._flight_stats["coalesced"] += 1
+        
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: len(flight.chunks) > position or flight.done)
+                    pending = flight.chunks[position:]
+                    done = flight.done
+                
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+                
+                if done and position >= len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                self._flight_stats["cancelled"] += 1
+    
+    async def _run_flight(self, key: str, flight: _Flight, stream: AsyncGenerator[Union[str, _TicketRequest], None]) -> None:
+        """Pump the upstream stream into the flight, then close it"""
+        try:
+            async for chunk in stream:
+                async with flight.changed:
+                    flight.chunks.append(chunk)
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            # Only when nobody listens anymore (or on shutdown)
+            flight.error = AIServiceException("Generation cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            await stream.aclose()
+            # New identical questions start a new flight from now on
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+    
+    def single_flight_stats(self) -> Dict:
+        """Shared first-turn generations: started, joined by another request, cancelled"""
+        return {"in_flight": len(self._flights), **self._flight_stats}
+    
+    async def _stream_first_turn(
+        self,
+        user_message: str,
+        user_email: str,
+        conversation_id: Optional[str] = None,
+        owner_id: Optional[str] = None,
+        defer_tickets: bool = False
+    ) -> AsyncGenerator[Union[str, Dict, _TicketRequest], None]:
+        """
+        Replay a cached answer for a similar first question, or generate and cache one
+        """
+        collection_version = get_collection_version()
+        vector = await self._get_embeddings().aembed_query(user_message)
+        
+        cached = self._answer_cache.lookup(vector, collection_version)
+        if cached is not None:
+            async for chunk in self._answer_cache.replay(cached):
+                yield chunk
+            return
+        
+        record = _TurnRecord()
+        async for chunk in self._stream_response(
+            user_message=user_message,
+            chat_history=[],
+            user_email=user_email,
+            record=record,
+            conversation_id=conversation_id,
+            owner_id=owner_id,
+            defer_tickets=defer_tickets
+        ):
+            yield chunk
+        
+        # Ticket creations and fallback answers must never be replayed
+        if record.completed and not record.used_tools:
+            self._answer_cache.store(
+                vector=vector,
+                question=user_message,
+                answer="".join(record.parts),
+                chunk_ids=record.chunk_ids,
+                collection_version=collection_version
+            )
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the semantic answer cache"""
+        return self._answer_cache.stats()
+    
+    def retrieval_stats(self) -> Dict:
+        """
+        Counters of the retriever layers (retrieval cache, lexical fast path)
+        Empty until the retriever has been built
+        """
+        stats = {}
+        retriever = self._retriever
+        while retriever is not None:
+            if hasattr(retriever, "stats"):
+                stats[type(retriever).__name__] = retriever.stats()
+            retriever = getattr(retriever, "retriever", None) or getattr(retriever, "dense", None)
+        return stats
+
     async def generate_response(
         self,
         user_message: str,
         conversation_id: str,
         chat_history: List[MessageBase],
-        user_email: str = "Non spécifié"
+        user_email: str = "Non spécifié",
+        summary: Optional[str] = None,
+        summary_message_count: int = 0,
+        history_offset: int = 0,
+        owner_id: Optional[str] = None
     ) -> str:
         """
         Generate AI response for a user message
+        (queued tickets are reported by their text chunk only)
         """
         try:
             response_chunks = []
-            async for chunk in self.stream_response(user_message, conversation_id, chat_history, user_email):
-                response_chunks.append(chunk)
+            async for chunk in self.stream_response(
+                user_message,
+                conversation_id,
+                chat_history,
+                user_email,
+                summary=summary,
+                summary_message_count=summary_message_count,
+                history_offset=history_offset,
+                owner_id=owner_id
+            ):
+                if isinstance(chunk, str):
+                    response_chunks.append(chunk)
             
             return "".join(response_chunks)
             
@@ -87,43 +381,147 @@ class AIService:
     
     async def _stream_response(
         self,
-        chain,
         user_message: str,
         chat_history: List,
-        user_email: str = "Non spécifié"
-    ) -> AsyncGenerator[str, None]:
+        user_email: str = "Non spécifié",
+        record: Optional[_TurnRecord] = None,
+        history_summary: str = "",
+        conversation_id: Optional[str] = None,
+        owner_id: Optional[str] = None,
+        defer_tickets: bool = False
+    ) -> AsyncGenerator[Union[str, Dict, _TicketRequest], None]:
         """
         Stream AI response chunks while handling tool calls
+        With defer_tickets, ticket requests are yielded as _TicketRequest for
+        the caller to queue instead of being queued here
         """
+        record = record if record is not None else _TurnRecord()
         try:
-            # Use invoke to properly capture tool_calls
-            response = chain.invoke({"input": user_message, "chat_history": chat_history})
+            docs = await self._get_retriever().ainvoke(user_message)
+            record.chunk_ids = [doc.metadata.get("_id") for doc in docs]
             
-            # 1. Yield text content if any
-            if response.content:
-                yield response.content
+            has_output = False
             
-            # 2. Handle tool calls
-            if hasattr(response, 'tool_calls') and response.tool_calls:
-                for tool_call in response.tool_calls:
-                    if tool_call["name"] == "create_atlassian_ticket":
-                        yield "\n⚙️ Connexion au serveur MCP en cours...\n"
-                        
-                        # Inject user_email into arguments
-                        args = tool_call["args"]
-                        args["user_email"] = user_email
-                        
-                        # Execute the tool
-                        ticket_result = create_atlassian_ticket.invoke(args)
-                        yield f"\n✅ {ticket_result}\n"
+            async for kind, payload in self._astream_model_events(
+                self._get_chain(),
+                {
+                    "input": user_message,
+                    "chat_history": chat_history,
+                    "history_summary": history_summary,
+                    "context": format_docs(docs)
+                }
+            ):
+                # 1. Forward text deltas as soon as the model produces them
+                if kind == "content":
+                    has_output = True
+                    record.parts.append(payload)
+                    yield payload
+                    continue
+                
+                # 2. Handle completed tool calls
+                has_output = True
+                record.used_tools = True
+                if payload["name"] == "create_atlassian_ticket":
+                    args = payload["args"]
+                    if defer_tickets:
+                        yield _TicketRequest(args=args)
+                        continue
+                    
+                    # Inject user_email into arguments
+                    args["user_email"] = user_email
+                    
+                    async for item in self._queue_ticket(conversation_id, owner_id, args):
+                        yield item
             
             # Fallback for empty responses to avoid Pydantic validation error
-            if not response.content and not (hasattr(response, 'tool_calls') and response.tool_calls):
+            if not has_output:
                 yield "Désolé, je n'ai pas pu traiter votre demande. Pouvez-vous reformuler ?"
+            else:
+                record.completed = True
                     
         except Exception as e:
             raise AIServiceException(f"Error generating AI response: {str(e)}")
     
+    async def _queue_ticket(
+        self,
+        conversation_id: Optional[str],
+        owner_id: Optional[str],
+        args: Dict
+    ) -> AsyncGenerator[Union[str, Dict], None]:
+        """
+        Queue the ticket in the outbox instead of waiting for Jira
+        Yields the text for the answer, then the ticket event (ticket_pending,
+        or ticket_created if the same ticket was already created)
+        """
+        try:
+            ticket = await self._tickets.enqueue(conversation_id, owner_id, args)
+        except ValueError as e:
+            print(f"⚠️ Ignoring ticket request: {e}")
+            yield "\n⚠️ Ticket non créé : informations incomplètes.\n"
+            return
+        
+        if ticket["status"] == "created":
+            yield f"\n✅ {ticket['result']}\n"
+            yield {"type": "ticket_created", **ticket}
+        else:
+            yield f"\n🎫 Demande de ticket enregistrée, création en cours (suivi : {ticket['ticket_id']})\n"
+            yield {"type": "ticket_pending", **ticket}
+    
+    async def _astream_model_events(
+        self,
+        chain,
+        inputs: Dict
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        """
+        Stream the chain output as ("content", text) and ("tool_call", call) events
+        
+        Text deltas are emitted as they arrive. Tool calls arrive as partial
+        tool_call_chunks and are only emitted once the stream is complete.
+        """
+        pending_calls: Dict[Any, Dict] = {}
+        last_key = None
+        
+        async for chunk in chain.astream(inputs):
+            text = self._chunk_text(chunk.content)
+            if text:
+                yield "content", text
+            
+            for call_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+                # Chunks of the same call share an index (or at least an id)
+                key = call_chunk.get("index")
+                if key is None:
+                    key = call_chunk.get("id")
+                if key is None:
+                    # Neither: a continuation of the call being streamed
+                    key = last_key if last_key is not None else 0
+                last_key = key
+                call = pending_calls.setdefault(key, {"name": "", "args": "", "id": None})
+                call["name"] += call_chunk.get("name") or ""
+                call["args"] += call_chunk.get("args") or ""
+                if call_chunk.get("id"):
+                    call["id"] = call_chunk["id"]
+        
+        for call in pending_calls.values():
+            try:
+                args = json.loads(call["args"]) if call["args"] else {}
+            except json.JSONDecodeError:
+                print(f"⚠️ Ignoring tool call with invalid arguments: {call['name']}")
+                continue
+            yield "tool_call", {"name": call["name"], "args": args, "id": call["id"]}
+    
+    @staticmethod
+    def _chunk_text(content: Any) -> str:
+        """Extract the text part of a message chunk content"""
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return "".join(
+                part if isinstance(part, str) else part.get("text", "")
+                for part in content
+                if isinstance(part, (str, dict))
+            )
+        return ""
+    
     def generate_conversation_title(self, first_message: str) -> str:
         """
         Generate a meaningful title from the first message
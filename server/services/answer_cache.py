@@ -0,0 +1,175 @@
+"""
+Semantic Answer Cache - Replays answers to first-turn questions
+Questions are matched by embedding similarity, not by exact text
+"""
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Dict, List, Optional
+
+import numpy as np
+
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+
+# Words per replayed chunk, so cached answers render like a live stream
+REPLAY_WORDS_PER_CHUNK = 4
+
+
+@dataclass
+class CachedAnswer:
+    """A cached answer and the retrieval it was generated from"""
+    question: str
+    answer: str
+    chunk_ids: List[str]
+    collection_version: str
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """
+    In-memory LRU of first-turn answers keyed by question embedding
+
+    A lookup hits when the cosine similarity with a cached question is above
+    the threshold. Entries expire after the TTL, the least recently used entry
+    is evicted when full, and everything is dropped when the collection
+    version changes (re-ingestion).
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        enabled: bool = SEMANTIC_CACHE_ENABLED
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+        self._next_key = 0
+        self._collection_version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_skips = 0
+
+    def lookup(self, vector: List[float], collection_version: str) -> Optional[CachedAnswer]:
+        """Return the closest cached answer above the threshold, if any"""
+        self._check_version(collection_version)
+        self._purge_expired()
+
+        if self._entries:
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = np.stack([self._vectors[key] for key in self._matrix_keys])
+
+            scores = self._matrix @ self._normalize(vector)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                key = self._matrix_keys[best]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def store(
+        self,
+        vector: List[float],
+        question: str,
+        answer: str,
+        chunk_ids: List[str],
+        collection_version: str
+    ) -> None:
+        """
+        Cache an answer generated against the given collection version
+        Skipped if the knowledge base was re-ingested while it was generated:
+        the answer is stale and the entries of the new version are kept
+        """
+        if self._collection_version is None:
+            self._collection_version = collection_version
+        elif collection_version != self._collection_version:
+            self.stale_skips += 1
+            return
+
+        key = self._next_key
+        self._next_key += 1
+        self._entries[key] = CachedAnswer(
+            question=question,
+            answer=answer,
+            chunk_ids=[str(chunk_id) for chunk_id in chunk_ids],
+            collection_version=collection_version
+        )
+        self._vectors[key] = self._normalize(vector)
+        self._matrix = None
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def replay(self, entry: CachedAnswer) -> AsyncGenerator[str, None]:
+        """Yield a cached answer in small chunks, like a live model stream"""
+        words = re.findall(r"\S+\s*|\s+", entry.answer)
+        for start in range(0, len(words), REPLAY_WORDS_PER_CHUNK):
+            yield "".join(words[start:start + REPLAY_WORDS_PER_CHUNK])
+            await asyncio.sleep(0)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._vectors.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_skips": self.stale_skips,
+            "collection_version": self._collection_version
+        }
+
+    def _check_version(self, collection_version: str) -> None:
+        """Drop every entry when the knowledge base has been re-ingested"""
+        if collection_version != self._collection_version:
+            if self._entries:
+                self.invalidations += 1
+            self.clear()
+            self._collection_version = collection_version
+
+    def _purge_expired(self) -> None:
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry.created_at < deadline]
+        for key in expired:
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: int) -> None:
+        self._entries.pop(key, None)
+        self._vectors.pop(key, None)
+        self._matrix = None
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
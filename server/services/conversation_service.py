@@ -1,26 +1,87 @@
 """
 Conversation Service - Business logic for conversation management
 """
+import os
+import asyncio
+import base64
+import json
 from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from fastapi import HTTPException, status
-import uuid
 
+from server.cache import TTLCache
 from server.database import conversation_collection, history_collection
+from server.services.history_budget import count_tokens
+from server.services.message_store import MessageStore, LIST_PROJECTION
 from server.models import (
-    ConversationResponse,
+    ChatContext,
     ConversationListItem,
     ConversationListResponse,
     MessageBase,
     MessageResponse,
+    MessagePageResponse,
     PaginationParams
 )
 
 
+CONVERSATION_TOTAL_TTL_SECONDS = int(os.getenv("CONVERSATION_TOTAL_TTL_SECONDS", "60"))
+
+# Non-empty conversation count per history, for total_mode="cached" listings
+_conversation_totals = TTLCache(max_entries=10000, ttl_seconds=CONVERSATION_TOTAL_TTL_SECONDS)
+
+# Listing order; keyset cursors encode the values of these fields for the last item
+LIST_SORT = {"is_pinned": -1, "last_updated": -1, "_id": -1}
+# is_pinned values in that order; conversations that predate the field (None) sort last
+PIN_GROUPS = [True, False, None]
+
+
+def encode_list_cursor(conversation: Dict) -> str:
+    """Opaque cursor pointing after this conversation in the listing order"""
+    payload = {
+        "p": conversation.get("is_pinned"),
+        "t": conversation["last_updated"].isoformat(),
+        "i": str(conversation["_id"])
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_list_cursor(cursor: str) -> Dict:
+    """
+    Keyset filter matching the conversations after the cursor, in LIST_SORT order
+    Raises HTTPException 400 for a malformed cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        position = PIN_GROUPS.index(payload["p"])
+        last_updated = datetime.fromisoformat(payload["t"])
+        last_id = ObjectId(payload["i"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+    # None matches conversations that predate the is_pinned field
+    same_pin = {"is_pinned": PIN_GROUPS[position]}
+    after = [
+        {**same_pin, "last_updated": {"$lt": last_updated}},
+        {**same_pin, "last_updated": last_updated, "_id": {"$lt": last_id}}
+    ]
+    later_groups = PIN_GROUPS[position + 1:]
+    if later_groups:
+        after.append({"is_pinned": {"$in": later_groups}})
+    return {"$or": after}
+
+
 class ConversationService:
     """Service for managing conversations"""
     
+    def __init__(self):
+        self.store = MessageStore()
+    
     async def create_conversation(
         self,
         historique_id: str,
@@ -42,19 +103,23 @@ class ConversationService:
             conversation_doc = {
                 "historique_id": ObjectId(historique_id),
                 "titre": titre,
-                "messages": [msg.model_dump() for msg in (initial_messages or [])],
+                "is_pinned": False,
+                **self.store.new_conversation_fields(),
                 "created_at": datetime.utcnow(),
                 "last_updated": datetime.utcnow()
             }
             
             result = await conversation_collection.insert_one(conversation_doc)
             
-            # Update history's updated_at timestamp
-            await history_collection.update_one(
-                {"_id": ObjectId(historique_id)},
-                {"$set": {"updated_at": datetime.utcnow()}}
-            )
+            if initial_messages:
+                await self.store.append(
+                    conversation_id=result.inserted_id,
+                    historique_id=ObjectId(historique_id),
+                    messages=[self._message_document(msg) for msg in initial_messages],
+                    set_fields={}
+                )
             
+            # The history's activity date is derived from its conversations (see get_full_history)
             return str(result.inserted_id)
             
         except Exception as e:
@@ -66,8 +131,9 @@ class ConversationService:
     async def get_conversation_by_id(
         self,
         conversation_id: str,
-        historique_id: str
-    ) -> ConversationResponse:
+        historique_id: str,
+        message_limit: Optional[int] = None
+    ) -> Dict:
         """
         Get a specific conversation by ID
         Validates that the conversation belongs to the user's history
@@ -75,14 +141,30 @@ class ConversationService:
         Args:
             conversation_id: The conversation ID
             historique_id: The user's history ID (for ownership validation)
+            message_limit: Only load the most recent messages (e.g. chat context)
             
         Returns:
-            Conversation details
+            Conversation details (ConversationResponse payload, see _format_conversation_response)
             
         Raises:
             HTTPException: If not found or access denied
         """
         try:
+            if message_limit is not None:
+                page = await self.store.page(
+                    conversation_id=ObjectId(conversation_id),
+                    historique_id=ObjectId(historique_id),
+                    before=None,
+                    limit=message_limit
+                )
+                if page is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Conversation not found or access denied"
+                    )
+                conversation, _ = page
+                return self._format_conversation_response(conversation, conversation["messages"])
+            
             conversation = await conversation_collection.find_one({
                 "_id": ObjectId(conversation_id),
                 "historique_id": ObjectId(historique_id)
@@ -94,23 +176,61 @@ class ConversationService:
                     detail="Conversation not found or access denied"
                 )
             
-            # Lazy Migration: Ensure all messages have IDs
-            messages = conversation.get("messages", [])
-            updated = False
-            for msg in messages:
-                if "id" not in msg:
-                    msg["id"] = str(uuid.uuid4())
-                    if "is_favorite" not in msg:
-                        msg["is_favorite"] = False
-                    updated = True
-            
-            if updated:
-                await conversation_collection.update_one(
-                    {"_id": ObjectId(conversation_id)},
-                    {"$set": {"messages": messages}}
+            # Read-only: messages saved without an `id` are backfilled offline
+            # (python -m server.scripts.migrate_message_ids, see schema_version)
+            return self._format_conversation_response(conversation, await self.store.load_all(conversation))
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to fetch conversation: {str(e)}"
+            )
+    
+    async def get_chat_context(
+        self,
+        conversation_id: str,
+        historique_id: str,
+        message_limit: int
+    ) -> ChatContext:
+        """
+        Chat preflight: validates ownership and loads the latest messages and the
+        summary in a single query (plus the messages query for the separate layout)
+        
+        Args:
+            conversation_id: The conversation ID
+            historique_id: The user's history ID (for ownership validation)
+            message_limit: Number of recent messages to load
+            
+        Returns:
+            Chat context for the AI step
+            
+        Raises:
+            HTTPException: If not found or access denied
+        """
+        try:
+            page = await self.store.page(
+                conversation_id=ObjectId(conversation_id),
+                historique_id=ObjectId(historique_id),
+                before=None,
+                limit=message_limit,
+                fields=["summary", "summary_message_count"]
+            )
+            if page is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found or access denied"
                 )
             
-            return self._format_conversation_response(conversation)
+            conversation, _ = page
+            return ChatContext(
+                conversation_id=conversation_id,
+                messages=[MessageResponse(**msg) for msg in conversation["messages"]],
+                message_count=conversation["message_count"],
+                summary=conversation.get("summary"),
+                summary_message_count=conversation.get("summary_message_count", 0)
+            )
             
         except HTTPException:
             raise
@@ -120,17 +240,74 @@ class ConversationService:
                 detail=f"Failed to fetch conversation: {str(e)}"
             )
     
+    async def get_messages_page(
+        self,
+        conversation_id: str,
+        historique_id: str,
+        before: Optional[int],
+        limit: int
+    ) -> MessagePageResponse:
+        """
+        Get a page of messages, newest first page, oldest first within a page
+        
+        Args:
+            conversation_id: The conversation ID
+            historique_id: The user's history ID (for ownership validation)
+            before: Only messages with a seq lower than this (None = latest)
+            limit: Maximum messages to return
+            
+        Returns:
+            The messages and the cursor of the previous page
+        """
+        try:
+            page = await self.store.page(
+                conversation_id=ObjectId(conversation_id),
+                historique_id=ObjectId(historique_id),
+                before=before,
+                limit=limit
+            )
+            if page is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found or access denied"
+                )
+            
+            conversation, has_more = page
+            messages = [MessageResponse(**msg) for msg in conversation["messages"]]
+            return MessagePageResponse(
+                conversation_id=conversation_id,
+                messages=messages,
+                message_count=conversation["message_count"],
+                has_more=has_more,
+                next_before=messages[0].seq if has_more and messages else None
+            )
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to fetch messages: {str(e)}"
+            )
+    
     async def list_conversations(
         self,
         historique_id: str,
-        pagination: PaginationParams
+        pagination: PaginationParams,
+        total_mode: str = "exact",
+        after: Optional[str] = None
     ) -> ConversationListResponse:
         """
         List all conversations for a history with pagination
+        Offset pages (skip) get the page and the total from a single aggregation ($facet);
+        keyset pages (after) seek directly into the listing index
         
         Args:
             historique_id: The user's history ID
             pagination: Pagination parameters
+            total_mode: "exact" (counted), "cached" (counted at most once per
+                CONVERSATION_TOTAL_TTL_SECONDS) or "none" (total is null)
+            after: Cursor returned as next_cursor by the previous page (skip is ignored)
             
         Returns:
             Paginated list of conversations
@@ -138,18 +315,55 @@ class ConversationService:
         try:
             query = {
                 "historique_id": ObjectId(historique_id),
-                "messages.0": {"$exists": True} # Only return conversations with at least 1 message
+                **self.store.non_empty_filter() # Only return conversations with at least 1 message
             }
             
-            # Get total count
-            total = await conversation_collection.count_documents(query)
-            
-            # Get paginated conversations, sorted by is_pinned (desc) then last_updated (desc)
-            cursor = conversation_collection.find(query).sort(
-                [("is_pinned", -1), ("last_updated", -1)]
-            ).skip(pagination.skip).limit(pagination.limit)
-            
-            conversations = await cursor.to_list(length=pagination.limit)
+            total = None
+            if total_mode == "cached":
+                total = _conversation_totals.get(historique_id)
+            count_needed = total_mode == "exact" or (total_mode == "cached" and total is None)
+            
+            # Sorted by is_pinned (desc) then last_updated (desc), _id breaks ties; one extra item tells if there is a next page
+            # Denormalized fields only: message bodies never leave MongoDB
+            if after:
+                page_pipeline = [
+                    {"$match": {**query, **decode_list_cursor(after)}},
+                    {"$sort": LIST_SORT},
+                    {"$limit": pagination.limit + 1},
+                    {"$project": LIST_PROJECTION}
+                ]
+                page_query = conversation_collection.aggregate(page_pipeline).to_list(length=pagination.limit + 1)
+                
+                # The total is over the whole listing, so it cannot share the keyset $match
+                if count_needed:
+                    conversations, total = await asyncio.gather(
+                        page_query,
+                        conversation_collection.count_documents(query)
+                    )
+                    _conversation_totals.set(historique_id, total)
+                else:
+                    conversations = await page_query
+            else:
+                pipeline = [
+                    {"$match": query},
+                    {"$sort": LIST_SORT},
+                    {"$project": LIST_PROJECTION}
+                ]
+                page_stages = [{"$skip": pagination.skip}, {"$limit": pagination.limit + 1}]
+                
+                if count_needed:
+                    pipeline.append({"$facet": {"page": page_stages, "total": [{"$count": "count"}]}})
+                    result = await conversation_collection.aggregate(pipeline).to_list(length=1)
+                    conversations = result[0]["page"]
+                    total = result[0]["total"][0]["count"] if result[0]["total"] else 0
+                    _conversation_totals.set(historique_id, total)
+                else:
+                    conversations = await conversation_collection.aggregate(pipeline + page_stages).to_list(
+                        length=pagination.limit + 1
+                    )
+            
+            has_more = len(conversations) > pagination.limit
+            conversations = conversations[:pagination.limit]
             
             # Format response
             conversation_items = [
@@ -160,11 +374,14 @@ class ConversationService:
             return ConversationListResponse(
                 conversations=conversation_items,
                 total=total,
-                skip=pagination.skip,
+                skip=0 if after else pagination.skip,
                 limit=pagination.limit,
-                has_more=pagination.skip + len(conversations) < total
+                has_more=has_more,
+                next_cursor=encode_list_cursor(conversations[-1]) if has_more else None
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -214,21 +431,16 @@ class ConversationService:
         Toggle favorite status for a specific message
         """
         try:
-            # First check if conversation exists and belongs to user
-            # Then update specific message in array using positional operator $
-            query = {
-                "_id": ObjectId(conversation_id),
-                "historique_id": ObjectId(historique_id),
-                "messages.id": message_id
-            }
-            
-            update = {
-                "$set": {"messages.$.is_favorite": is_favorite}
-            }
-            
-            result = await conversation_collection.update_one(query, update)
+            # Embedded messages are updated with the positional operator $,
+            # separately stored ones in the messages collection
+            found = await self.store.set_favorite(
+                conversation_id=ObjectId(conversation_id),
+                historique_id=ObjectId(historique_id),
+                message_id=message_id,
+                is_favorite=is_favorite
+            )
             
-            if result.matched_count == 0:
+            if not found:
                 # Could mean conversation not found OR message not found
                 # Check conversation existence separately if needed, but 404 is appropriate
                 raise HTTPException(
@@ -249,47 +461,54 @@ class ConversationService:
         self,
         conversation_id: str,
         historique_id: str,
-        messages: List[MessageBase]
+        messages: List[MessageBase],
+        create_with_title: Optional[str] = None
     ) -> bool:
         """
         Add messages to a conversation
+        With create_with_title, a conversation that does not exist yet is
+        created by the same write (chat turns of a new conversation)
         
         Args:
-            conversation_id: The conversation ID
+            conversation_id: The conversation ID (generated by the caller when creating)
             historique_id: The user's history ID (for validation)
             messages: List of messages to add
+            create_with_title: Title of the conversation if it has to be created
             
         Returns:
             Success status
         """
         try:
-            result = await conversation_collection.update_one(
-                {
-                    "_id": ObjectId(conversation_id),
-                    "historique_id": ObjectId(historique_id)
-                },
-                {
-                    "$push": {
-                        "messages": {
-                            "$each": [msg.model_dump() for msg in messages]
-                        }
-                    },
-                    "$set": {"last_updated": datetime.utcnow()}
-                }
-            )
+            now = datetime.utcnow()
+            documents = [self._message_document(msg) for msg in messages]
+            
+            if create_with_title is None:
+                previous_count = await self.store.append(
+                    conversation_id=ObjectId(conversation_id),
+                    historique_id=ObjectId(historique_id),
+                    messages=documents,
+                    set_fields={"last_updated": now}
+                )
+            else:
+                previous_count = await self.store.create_or_append(
+                    conversation_id=ObjectId(conversation_id),
+                    historique_id=ObjectId(historique_id),
+                    messages=documents,
+                    set_fields={"last_updated": now},
+                    insert_fields={"titre": create_with_title, "is_pinned": False, "created_at": now}
+                )
             
-            if result.matched_count == 0:
+            if previous_count is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Conversation not found or access denied"
                 )
             
-            # Update history timestamp
-            await history_collection.update_one(
-                {"_id": ObjectId(historique_id)},
-                {"$set": {"updated_at": datetime.utcnow()}}
-            )
+            # The conversation now shows up in the listings
+            if previous_count == 0:
+                _conversation_totals.invalidate(historique_id)
             
+            # No history write: its activity date is derived from last_updated
             return True
             
         except HTTPException:
@@ -327,6 +546,9 @@ class ConversationService:
                     detail="Conversation not found or access denied"
                 )
             
+            await self.store.delete_for([ObjectId(conversation_id)])
+            _conversation_totals.invalidate(historique_id)
+            
             # Update history timestamp
             await history_collection.update_one(
                 {"_id": ObjectId(historique_id)},
@@ -343,45 +565,65 @@ class ConversationService:
                 detail=f"Failed to delete conversation: {str(e)}"
             )
     
-    def _format_conversation_response(self, conversation: Dict) -> ConversationResponse:
-        """Format MongoDB document to ConversationResponse"""
-        messages = [
-            MessageResponse(**msg) for msg in conversation.get("messages", [])
-        ]
-        
-        return ConversationResponse(
-            id=str(conversation["_id"]),
-            titre=conversation["titre"],
-            is_pinned=conversation.get("is_pinned", False),
-            messages=messages,
-            created_at=conversation["created_at"].isoformat(),
-            last_updated=conversation["last_updated"].isoformat(),
-            message_count=len(messages)
-        )
+    def _format_conversation_response(self, conversation: Dict, messages: List[Dict]) -> Dict:
+        """
+        ConversationResponse payload of a MongoDB document and its loaded messages
+        Plain data for ORJSONResponse: stored messages are not validated again
+        (they were written from MessageBase.model_dump)
+        """
+        return {
+            "id": str(conversation["_id"]),
+            "titre": conversation["titre"],
+            "is_pinned": conversation.get("is_pinned", False),
+            "messages": [_message_payload(msg) for msg in messages],
+            "created_at": conversation["created_at"].isoformat(),
+            "last_updated": conversation["last_updated"].isoformat(),
+            "message_count": conversation.get("message_count", len(messages)),
+            "summary": conversation.get("summary"),
+            "summary_message_count": conversation.get("summary_message_count", 0)
+        }
+    
+    def _message_document(self, message: MessageBase) -> Dict:
+        """Message as stored, with its token count for the history budget"""
+        if message.token_count is None:
+            message.token_count = count_tokens(message.texte)
+        return message.model_dump()
     
     def _format_conversation_list_item(self, conversation: Dict) -> ConversationListItem:
-        """Format MongoDB document to ConversationListItem"""
-        messages = conversation.get("messages", [])
-        preview = None
-        
-        # Get first user message as preview
-        for msg in messages:
-            if msg.get("role") == "user":
-                preview = msg.get("texte", "")[:100]
-                if len(msg.get("texte", "")) > 100:
-                    preview += "..."
-                break
-        
+        """Format MongoDB document (list projection) to ConversationListItem"""
         return ConversationListItem(
             id=str(conversation["_id"]),
             titre=conversation["titre"],
             is_pinned=conversation.get("is_pinned", False),
             last_updated=conversation["last_updated"].isoformat(),
-            message_count=len(messages),
-            preview=preview
+            message_count=conversation.get("message_count", 0),
+            preview=conversation.get("preview"),
+            last_role=conversation.get("last_role"),
+            last_message=conversation.get("last_message")
         )
 
 
+def _message_payload(message: Dict) -> Dict:
+    """
+    MessageResponse fields of a stored message (defaults for fields older messages lack)
+    A message not migrated yet has no id: None, not a new one on every read
+    """
+    return {
+        "id": message.get("id"),
+        "role": message["role"],
+        "texte": message["texte"],
+        "date": message["date"],
+        "is_favorite": message.get("is_favorite", False),
+        "token_count": message.get("token_count"),
+        "seq": message.get("seq")
+    }
+
+
+def invalidate_conversation_total(historique_id: str) -> None:
+    """Forget the cached conversation count of a history"""
+    _conversation_totals.invalidate(historique_id)
+
+
 def get_conversation_service() -> ConversationService:
     """Dependency injection for ConversationService"""
     return ConversationService()
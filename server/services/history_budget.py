@@ -0,0 +1,215 @@
+"""
+History Budget - Token-budgeted chat history with a rolling summary
+Recent turns are sent verbatim, older turns are folded into a summary
+stored on the conversation document and refreshed in the background
+"""
+import os
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from ai.chatbot import get_summary_chain
+from server.database import conversation_collection
+from server.models import MessageBase
+
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_MIN_RECENT_MESSAGES = int(os.getenv("HISTORY_MIN_RECENT_MESSAGES", "2"))
+# Most recent messages loaded for the chat context (the budget applies within them)
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "40"))
+# When a refresh runs, the summary catches up to the window of this fraction of
+# the budget, so the following turns fit without summarizing again
+SUMMARY_TARGET_RATIO = float(os.getenv("SUMMARY_TARGET_RATIO", "0.5"))
+
+# Estimate without a tokenizer download: Mistral averages ~3.5 characters per
+# token on French technical text, plus a few tokens of role formatting
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text: str) -> int:
+    """Estimated token count of a message, stored with it on insert"""
+    return int(len(text) / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS
+
+
+def message_tokens(message: MessageBase) -> int:
+    """Stored token count, estimated for messages saved before it existed"""
+    if message.token_count is not None:
+        return message.token_count
+    return count_tokens(message.texte)
+
+
+def window_start(messages: List[MessageBase], budget: int) -> int:
+    """
+    Index of the oldest message of the newest suffix that fits in the budget
+    The last HISTORY_MIN_RECENT_MESSAGES messages are always kept
+    """
+    start = len(messages)
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        used += message_tokens(messages[index])
+        if used > budget and len(messages) - index > HISTORY_MIN_RECENT_MESSAGES:
+            break
+        start = index
+    return start
+
+
+@dataclass
+class HistoryWindow:
+    """What is sent to the model for the previous turns"""
+    messages: List[MessageBase] = field(default_factory=list)
+    summary: str = ""
+    dropped: int = 0
+
+
+def build_history_window(
+    messages: List[MessageBase],
+    summary: Optional[str] = None,
+    summary_message_count: int = 0,
+    budget: int = HISTORY_TOKEN_BUDGET,
+    offset: int = 0
+) -> HistoryWindow:
+    """
+    Select the verbatim history for the next turn
+
+    Messages covered by the summary are never repeated verbatim. Messages
+    older than the budget window and not yet summarized are dropped until
+    the background refresh catches up (reported in `dropped`).
+    `offset` is the seq of messages[0] when only the latest messages were loaded.
+    """
+    summary_message_count = min(max(0, summary_message_count - offset), len(messages))
+    start = window_start(messages, budget)
+    if summary:
+        start = max(start, min(summary_message_count, len(messages) - HISTORY_MIN_RECENT_MESSAGES))
+    return HistoryWindow(
+        messages=messages[start:],
+        summary=summary or "",
+        dropped=max(0, start - summary_message_count)
+    )
+
+
+def format_transcript(messages: List[MessageBase]) -> str:
+    """Plain text transcript given to the summary model"""
+    labels = {"user": "Utilisateur", "assistant": "Assistant"}
+    return "\n".join(f"{labels.get(msg.role, msg.role)} : {msg.texte}" for msg in messages)
+
+
+class SummaryService:
+    """
+    Keeps the rolling summary of each conversation up to date
+
+    Refreshes run as background tasks (one at a time per conversation) and
+    only write if nobody else moved the summary in the meantime.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET):
+        self.budget = budget
+        self._chain = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._refreshes = 0
+        self._failures = 0
+
+    def _get_chain(self):
+        """Lazy initialization of the summary chain (small model)"""
+        if self._chain is None:
+            self._chain = get_summary_chain()
+        return self._chain
+
+    def schedule_refresh(
+        self,
+        conversation_id: str,
+        messages: List[MessageBase],
+        summary: Optional[str],
+        summary_message_count: int,
+        offset: int = 0
+    ) -> bool:
+        """
+        Start a background refresh if messages fell out of the budget window
+        without being summarized. Returns True when a refresh was started.
+        `offset` is the seq of messages[0] when only the latest messages were loaded.
+        """
+        previous_count = summary_message_count
+        summary_message_count = min(max(0, summary_message_count - offset), len(messages))
+        if window_start(messages, self.budget) <= summary_message_count:
+            return False
+        if conversation_id in self._tasks:
+            return False
+
+        target = window_start(messages, int(self.budget * SUMMARY_TARGET_RATIO))
+        target = min(target, len(messages) - HISTORY_MIN_RECENT_MESSAGES)
+        if target <= summary_message_count:
+            return False
+
+        task = asyncio.create_task(self._refresh(
+            conversation_id=conversation_id,
+            previous_summary=summary or "",
+            previous_count=previous_count,
+            new_messages=messages[summary_message_count:target],
+            target=offset + target
+        ))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(conversation_id, None))
+        return True
+
+    async def _refresh(
+        self,
+        conversation_id: str,
+        previous_summary: str,
+        previous_count: int,
+        new_messages: List[MessageBase],
+        target: int
+    ) -> None:
+        try:
+            summary = await self._get_chain().ainvoke({
+                "summary": previous_summary or "(aucun)",
+                "messages": format_transcript(new_messages)
+            })
+            summary = summary.strip()
+            if not summary:
+                return
+
+            # Only move forward from the summary this refresh was built on
+            await conversation_collection.update_one(
+                {
+                    "_id": ObjectId(conversation_id),
+                    # null also matches conversations that were never summarized
+                    "summary_message_count": {"$in": [previous_count, None]} if previous_count == 0 else previous_count
+                },
+                {"$set": {
+                    "summary": summary,
+                    "summary_message_count": target,
+                    "summary_updated_at": datetime.utcnow()
+                }}
+            )
+            self._refreshes += 1
+            print(f"📝 Summary refreshed for conversation {conversation_id} ({target} messages)")
+        except Exception as e:
+            # The next turn schedules another refresh
+            self._failures += 1
+            print(f"⚠️ Summary refresh failed for conversation {conversation_id}: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "budget_tokens": self.budget,
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "in_flight": len(self._tasks)
+        }
+
+
+# Singleton instance
+_summary_service_instance = None
+
+
+def get_summary_service() -> SummaryService:
+    """
+    Dependency injection function for SummaryService
+    Returns a singleton instance (background tasks are tracked per process)
+    """
+    global _summary_service_instance
+    if _summary_service_instance is None:
+        _summary_service_instance = SummaryService()
+    return _summary_service_instance
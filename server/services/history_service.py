@@ -1,22 +1,49 @@
 """
 History Service - Business logic for user history management
 """
-from typing import Optional
+import os
+from typing import Dict, Optional
 from datetime import datetime
 from bson import ObjectId
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
+from server.cache import TTLCache
 from server.database import history_collection, conversation_collection
 from server.models import HistoryResponse, ConversationListItem
+from server.services.message_store import MessageStore, LIST_PROJECTION
+from server.services.conversation_service import invalidate_conversation_total
+
+
+HISTORY_ID_CACHE_SIZE = int(os.getenv("HISTORY_ID_CACHE_SIZE", "10000"))
+HISTORY_ID_CACHE_TTL_SECONDS = int(os.getenv("HISTORY_ID_CACHE_TTL_SECONDS", "3600"))
+
+# user_id -> historique_id; a history is never deleted or reassigned, so entries never go stale
+_history_ids = TTLCache(max_entries=HISTORY_ID_CACHE_SIZE, ttl_seconds=HISTORY_ID_CACHE_TTL_SECONDS)
+
+
+def remember_history_id(user_id: str, historique_id: str) -> None:
+    """Seed the history ID cache (e.g. from the `hid` claim of a verified token)"""
+    _history_ids.set(user_id, historique_id)
+
+
+def history_id_cache_stats() -> Dict:
+    return _history_ids.stats()
 
 
 class HistoryService:
     """Service for managing user conversation histories"""
     
+    def __init__(self):
+        self.store = MessageStore()
+    
     async def get_or_create_history(self, user_id: str) -> str:
         """
         Get user's history or create if it doesn't exist
         Auto-creates history on first access
+        Cached per process; a cold lookup is a single atomic upsert, so
+        concurrent first requests of a user share the same history
         
         Args:
             user_id: The user's ID
@@ -24,22 +51,20 @@ class HistoryService:
         Returns:
             The history ID
         """
+        cached = _history_ids.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            # Try to find existing history
-            history = await history_collection.find_one({"user_id": ObjectId(user_id)})
+            try:
+                history = await self._upsert_history(user_id)
+            except DuplicateKeyError:
+                # Lost the insert race on the unique user_id index: the other upsert created it
+                history = await self._upsert_history(user_id)
             
-            if history:
-                return str(history["_id"])
-            
-            # Create new history if doesn't exist
-            new_history = {
-                "user_id": ObjectId(user_id),
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            
-            result = await history_collection.insert_one(new_history)
-            return str(result.inserted_id)
+            historique_id = str(history["_id"])
+            _history_ids.set(user_id, historique_id)
+            return historique_id
             
         except Exception as e:
             raise HTTPException(
@@ -47,6 +72,16 @@ class HistoryService:
                 detail=f"Failed to get or create history: {str(e)}"
             )
     
+    async def _upsert_history(self, user_id: str) -> Dict:
+        now = datetime.utcnow()
+        return await history_collection.find_one_and_update(
+            {"user_id": ObjectId(user_id)},
+            {"$setOnInsert": {"created_at": now, "updated_at": now}},
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    
     async def get_full_history(self, user_id: str) -> HistoryResponse:
         """
         Get complete history with all conversations
@@ -74,9 +109,11 @@ class HistoryService:
                 )
             
             # Fetch all conversations for this history
-            cursor = conversation_collection.find({
-                "historique_id": history["_id"]
-            }).sort("last_updated", -1)
+            # Denormalized fields only: message bodies never leave MongoDB
+            cursor = conversation_collection.find(
+                {"historique_id": history["_id"]},
+                LIST_PROJECTION
+            ).sort("last_updated", -1)
             
             conversations = await cursor.to_list(length=None)
             
@@ -86,13 +123,19 @@ class HistoryService:
                 for conv in conversations
             ]
             
+            # Messages do not touch the history document: its last activity is
+            # the newest conversation update (or the last deletion)
+            updated_at = history["updated_at"]
+            if conversations:
+                updated_at = max(updated_at, conversations[0]["last_updated"])
+            
             return HistoryResponse(
                 id=str(history["_id"]),
                 user_id=str(history["user_id"]),
                 conversations=conversation_items,
                 total_conversations=len(conversation_items),
                 created_at=history["created_at"].isoformat(),
-                updated_at=history["updated_at"].isoformat()
+                updated_at=updated_at.isoformat()
             )
             
         except Exception as e:
@@ -117,10 +160,15 @@ class HistoryService:
             if not history:
                 return True  # Nothing to delete
             
-            # Delete all conversations
+            # Delete all conversations (and their separately stored messages)
+            conversation_ids = await conversation_collection.distinct(
+                "_id", {"historique_id": history["_id"]}
+            )
             await conversation_collection.delete_many({
                 "historique_id": history["_id"]
             })
+            await self.store.delete_for(conversation_ids)
+            invalidate_conversation_total(str(history["_id"]))
             
             # Update history timestamp
             await history_collection.update_one(
@@ -137,24 +185,15 @@ class HistoryService:
             )
     
     def _format_conversation_item(self, conversation: dict) -> ConversationListItem:
-        """Format conversation for history response"""
-        messages = conversation.get("messages", [])
-        preview = None
-        
-        # Get first user message as preview
-        for msg in messages:
-            if msg.get("role") == "user":
-                preview = msg.get("texte", "")[:100]
-                if len(msg.get("texte", "")) > 100:
-                    preview += "..."
-                break
-        
+        """Format conversation (list projection) for history response"""
         return ConversationListItem(
             id=str(conversation["_id"]),
             titre=conversation["titre"],
             last_updated=conversation["last_updated"].isoformat(),
-            message_count=len(messages),
-            preview=preview
+            message_count=conversation.get("message_count", 0),
+            preview=conversation.get("preview"),
+            last_role=conversation.get("last_role"),
+            last_message=conversation.get("last_message")
         )
 
 
@@ -0,0 +1,358 @@
+"""
+Message Store - Reads and writes conversation messages for both storage layouts
+Embedded: `messages` array on the conversation document (seq = array index)
+Collection: one document per message in `messages`, indexed on (conversation_id, seq)
+
+The layout is decided per conversation, so embedded conversations keep working
+until they are migrated (python -m server.scripts.migrate_messages)
+"""
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from server.database import conversation_collection, message_collection, MESSAGE_STORAGE
+
+
+# Version of the stored message fields, on each conversation (schema_version)
+# 1: every message has an `id` and `is_favorite` (python -m server.scripts.migrate_message_ids)
+MESSAGE_SCHEMA_VERSION = 1
+
+# Fields of a message document that are not part of MessageBase
+_MESSAGE_PROJECTION = {"_id": 0, "conversation_id": 0}
+
+# Denormalized on the conversation document so listings never read messages
+PREVIEW_LENGTH = 100
+LAST_MESSAGE_LENGTH = 100
+LIST_PROJECTION = {
+    "titre": 1,
+    "is_pinned": 1,
+    "last_updated": 1,
+    "message_count": 1,
+    "preview": 1,
+    "last_role": 1,
+    "last_message": 1
+}
+
+
+def snippet(text: str, length: int) -> str:
+    """First characters of a message, with an ellipsis when truncated"""
+    if len(text) > length:
+        return text[:length] + "..."
+    return text
+
+
+def snippet_expression(text, length: int) -> Dict:
+    """Aggregation expression equivalent of snippet() (used by the backfill)"""
+    return {"$cond": [
+        {"$gt": [{"$strLenCP": text}, length]},
+        {"$concat": [{"$substrCP": [text, 0, length]}, "..."]},
+        text
+    ]}
+
+
+def denormalized_fields(messages: List[Dict], count_field: str, set_fields: Dict) -> Dict:
+    """
+    $set stage of a pipeline update appending `messages`: keeps message_count,
+    preview (first user message), last_role and last_message in sync.
+    Values are wrapped in $literal so user text is never read as an expression.
+    """
+    fields = {
+        "message_count": {"$add": [count_field, len(messages)]},
+        **{name: {"$literal": value} for name, value in set_fields.items()}
+    }
+    first_user = next((msg for msg in messages if msg.get("role") == "user"), None)
+    if first_user is not None:
+        fields["preview"] = {"$ifNull": ["$preview", {"$literal": snippet(first_user["texte"], PREVIEW_LENGTH)}]}
+    if messages:
+        fields["last_role"] = {"$literal": messages[-1]["role"]}
+        fields["last_message"] = {"$literal": snippet(messages[-1]["texte"], LAST_MESSAGE_LENGTH)}
+    return fields
+
+
+def _insert_defaults(insert_fields: Optional[Dict]) -> Dict:
+    """Pipeline $set of fields that are only written when the upsert creates the document"""
+    return {
+        name: {"$ifNull": [f"${name}", {"$literal": value}]}
+        for name, value in (insert_fields or {}).items()
+    }
+
+
+def _schema_version_if_created(layout_field: str) -> Dict:
+    """
+    Pipeline value of schema_version for an upsert: stamped when the upsert creates
+    the document (no layout field yet), an existing conversation keeps its own
+    (none before the migration)
+    """
+    return {"$cond": [
+        {"$eq": [{"$type": layout_field}, "missing"]},
+        MESSAGE_SCHEMA_VERSION,
+        "$schema_version"
+    ]}
+
+
+def is_embedded(conversation: Dict) -> bool:
+    """Conversations created in (or migrated to) the collection layout have no messages array"""
+    return "messages" in conversation
+
+
+def message_count(conversation: Dict) -> int:
+    """Number of messages of a conversation document, in either layout"""
+    if "message_count" in conversation:
+        return conversation["message_count"]
+    if is_embedded(conversation):
+        return len(conversation["messages"])
+    return conversation.get("next_seq", 0)
+
+
+def message_document(conversation_id: ObjectId, seq: int, message: Dict) -> Dict:
+    """Message as stored in the messages collection"""
+    return {"conversation_id": conversation_id, "seq": seq, **message}
+
+
+class MessageStore:
+    """Storage-layout aware access to conversation messages"""
+
+    def __init__(self, storage: str = MESSAGE_STORAGE):
+        self.separate = storage == "collection"
+
+    def new_conversation_fields(self) -> Dict:
+        """Layout and denormalized fields of a new, empty conversation document"""
+        fields = {
+            "message_count": 0,
+            "preview": None,
+            "last_role": None,
+            "last_message": None,
+            "schema_version": MESSAGE_SCHEMA_VERSION
+        }
+        if self.separate:
+            return {"next_seq": 0, **fields}
+        return {"messages": [], **fields}
+
+    def non_empty_filter(self) -> Dict:
+        """Query matching conversations with at least one message, in either layout"""
+        return {"message_count": {"$gt": 0}}
+
+    async def append(
+        self,
+        conversation_id: ObjectId,
+        historique_id: ObjectId,
+        messages: List[Dict],
+        set_fields: Dict
+    ) -> Optional[int]:
+        """
+        Append messages (and $set fields) to a conversation
+        Returns the message count before the append, or None when the
+        conversation is not found for this history
+        """
+        if self.separate:
+            appends = (self._append_separate, self._append_embedded)
+        else:
+            appends = (self._append_embedded, self._append_separate)
+
+        for append in appends:
+            previous_count = await append(conversation_id, historique_id, messages, set_fields)
+            if previous_count is not None:
+                return previous_count
+        return None
+
+    async def create_or_append(
+        self,
+        conversation_id: ObjectId,
+        historique_id: ObjectId,
+        messages: List[Dict],
+        set_fields: Dict,
+        insert_fields: Dict
+    ) -> Optional[int]:
+        """
+        Append messages to a conversation, creating it (with `insert_fields`)
+        in the configured layout if it does not exist yet: a single upsert on
+        the conversation, plus the messages insert for the collection layout
+        Meant for conversation IDs generated by the caller
+        Returns the message count before the append (0 when created), or None
+        when the ID belongs to a conversation of another history or layout
+        """
+        append = self._append_separate if self.separate else self._append_embedded
+        try:
+            return await append(conversation_id, historique_id, messages, set_fields, insert_fields)
+        except DuplicateKeyError:
+            # The upsert tried to insert an _id that exists but did not match the filter
+            return None
+
+    async def _append_embedded(self, conversation_id, historique_id, messages, set_fields, insert_fields=None) -> Optional[int]:
+        # Pipeline update: the array and the denormalized fields change atomically
+        current = {"$ifNull": ["$messages", []]}
+        created_fields = {}
+        if insert_fields is not None:
+            created_fields = {**_insert_defaults(insert_fields), "schema_version": _schema_version_if_created("$messages")}
+        before = await conversation_collection.find_one_and_update(
+            {
+                "_id": conversation_id,
+                "historique_id": historique_id,
+                "messages": {"$exists": True}
+            },
+            [{"$set": {
+                **created_fields,
+                **denormalized_fields(messages, {"$size": current}, set_fields),
+                "messages": {"$concatArrays": [current, {"$literal": messages}]}
+            }}],
+            projection={"message_count": 1},
+            upsert=insert_fields is not None,
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            # Nothing before an upsert: the conversation was just created
+            return 0 if insert_fields is not None else None
+        return before.get("message_count", 0)
+
+    async def _append_separate(self, conversation_id, historique_id, messages, set_fields, insert_fields=None) -> Optional[int]:
+        # Reserve the sequence numbers atomically, then insert the messages
+        created_fields = {}
+        if insert_fields is not None:
+            created_fields = {**_insert_defaults(insert_fields), "schema_version": _schema_version_if_created("$next_seq")}
+        conversation = await conversation_collection.find_one_and_update(
+            {
+                "_id": conversation_id,
+                "historique_id": historique_id,
+                "messages": {"$exists": False}
+            },
+            [{"$set": {
+                **created_fields,
+                **denormalized_fields(messages, {"$ifNull": ["$next_seq", 0]}, set_fields),
+                "next_seq": {"$add": [{"$ifNull": ["$next_seq", 0]}, len(messages)]}
+            }}],
+            projection={"next_seq": 1},
+            upsert=insert_fields is not None,
+            return_document=ReturnDocument.AFTER
+        )
+        if conversation is None:
+            return None
+
+        first_seq = conversation["next_seq"] - len(messages)
+        if messages:
+            await message_collection.insert_many([
+                message_document(conversation_id, first_seq + offset, msg)
+                for offset, msg in enumerate(messages)
+            ])
+        return first_seq
+
+    async def load_all(self, conversation: Dict) -> List[Dict]:
+        """All messages of a conversation document, oldest first, with their seq"""
+        if is_embedded(conversation):
+            return [{**msg, "seq": seq} for seq, msg in enumerate(conversation["messages"])]
+
+        cursor = message_collection.find(
+            {"conversation_id": conversation["_id"]},
+            _MESSAGE_PROJECTION
+        ).sort("seq", 1)
+        return await cursor.to_list(length=None)
+
+    async def page(
+        self,
+        conversation_id: ObjectId,
+        historique_id: ObjectId,
+        before: Optional[int],
+        limit: int,
+        fields: Optional[List[str]] = None
+    ) -> Optional[Tuple[Dict, bool]]:
+        """
+        Conversation document whose `messages` holds only up to `limit` messages
+        with seq < before (the newest ones when before is None), oldest first
+        `fields` restricts the other conversation fields returned (all by default)
+        Returns (conversation, has_more) or None if the conversation is not found
+        """
+        before = None if before is None else max(0, before)
+        size = {"$size": {"$ifNull": ["$messages", []]}}
+        end = size if before is None else {"$min": [before, size]}
+
+        pipeline = [{"$match": {"_id": conversation_id, "historique_id": historique_id}}]
+        if fields is not None:
+            pipeline.append({"$project": {
+                name: 1 for name in [*fields, "messages", "message_count", "next_seq"]
+            }})
+
+        # Embedded layout: slice the array server-side, the rest never leaves MongoDB
+        cursor = conversation_collection.aggregate(pipeline + [
+            {"$addFields": {"_end": end}},
+            {"$addFields": {"_start": {"$max": [0, {"$subtract": ["$_end", limit]}]}}},
+            {"$addFields": {
+                "_embedded": {"$isArray": "$messages"},
+                "_total": size,
+                "messages": {"$cond": [
+                    {"$gt": ["$_end", "$_start"]},
+                    {"$slice": [{"$ifNull": ["$messages", []]}, "$_start", {"$subtract": ["$_end", "$_start"]}]},
+                    []
+                ]}
+            }},
+            {"$project": {"_end": 0}}
+        ])
+        found = await cursor.to_list(length=1)
+        if not found:
+            return None
+
+        conversation = found[0]
+        embedded = conversation.pop("_embedded")
+        start = conversation.pop("_start")
+        total = conversation.pop("_total")
+        if embedded:
+            conversation["messages"] = [
+                {**msg, "seq": start + offset} for offset, msg in enumerate(conversation["messages"])
+            ]
+            conversation["message_count"] = total
+            return conversation, start > 0
+
+        query = {"conversation_id": conversation_id}
+        if before is not None:
+            query["seq"] = {"$lt": before}
+        cursor = message_collection.find(query, _MESSAGE_PROJECTION).sort("seq", -1).limit(limit + 1)
+        newest_first = await cursor.to_list(length=limit + 1)
+        del conversation["messages"]
+        conversation["message_count"] = message_count(conversation)
+        conversation["messages"] = list(reversed(newest_first[:limit]))
+        return conversation, len(newest_first) > limit
+
+    async def set_favorite(
+        self,
+        conversation_id: ObjectId,
+        historique_id: ObjectId,
+        message_id: str,
+        is_favorite: bool
+    ) -> bool:
+        """Returns False when the message is not found in a conversation of this history"""
+        result = await conversation_collection.update_one(
+            {
+                "_id": conversation_id,
+                "historique_id": historique_id,
+                "messages.id": message_id
+            },
+            {"$set": {"messages.$.is_favorite": is_favorite}}
+        )
+        if result.matched_count > 0:
+            return True
+
+        owned = await conversation_collection.find_one(
+            {
+                "_id": conversation_id,
+                "historique_id": historique_id,
+                "messages": {"$exists": False}
+            },
+            {"_id": 1}
+        )
+        if owned is None:
+            return False
+
+        result = await message_collection.update_one(
+            {"conversation_id": conversation_id, "id": message_id},
+            {"$set": {"is_favorite": is_favorite}}
+        )
+        return result.matched_count > 0
+
+    async def delete_for(self, conversation_ids: List[ObjectId]) -> None:
+        """Delete the separately stored messages of these conversations"""
+        if conversation_ids:
+            await message_collection.delete_many({"conversation_id": {"$in": conversation_ids}})
+
+
+def get_message_store() -> MessageStore:
+    """Dependency injection for MessageStore"""
+    return MessageStore()
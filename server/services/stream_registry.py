@@ -0,0 +1,151 @@
+"""
+Stream Registry - Resumable chat streams
+Each chat stream is generated by a background task that publishes numbered
+frames into a bounded ring buffer. The HTTP response only reads the buffer, so
+a dropped connection does not stop (or restart) the generation: the client
+reconnects with Last-Event-ID and gets the missed frames, then the live ones.
+
+Streams live in the process that started them: with several workers,
+reconnects must reach the same one (sticky sessions)
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+
+STREAM_BUFFER_FRAMES = int(os.getenv("STREAM_BUFFER_FRAMES", "2048"))
+STREAM_RETENTION_SECONDS = int(os.getenv("STREAM_RETENTION_SECONDS", "120"))
+
+
+class StreamGap(Exception):
+    """Frames after the requested event ID were already evicted from the buffer"""
+
+
+class ChatStream:
+    """Numbered frames of one chat answer, oldest evicted first"""
+
+    def __init__(self, owner_id: str, max_frames: int = STREAM_BUFFER_FRAMES):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.frames: Deque[Tuple[int, Dict]] = deque(maxlen=max_frames)
+        self.last_event_id = 0
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    async def publish(self, data: Dict) -> int:
+        """Append a frame; returns its event ID"""
+        async with self._changed:
+            self.last_event_id += 1
+            self.frames.append((self.last_event_id, data))
+            self._changed.notify_all()
+            return self.last_event_id
+
+    async def finish(self) -> None:
+        async with self._changed:
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+
+    def can_resume_from(self, last_event_id: int) -> bool:
+        """True when every frame after last_event_id is still buffered"""
+        oldest = self.frames[0][0] if self.frames else self.last_event_id + 1
+        return oldest <= last_event_id + 1 and last_event_id <= self.last_event_id
+
+    async def frames_after(self, last_event_id: int = 0) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Buffered frames with an ID above last_event_id, then live frames until the stream ends
+        Raises StreamGap when the reader fell behind the buffer
+        """
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.last_event_id > last_event_id or self.done)
+                pending = [frame for frame in self.frames if frame[0] > last_event_id]
+                done = self.done
+
+            if pending and pending[0][0] != last_event_id + 1:
+                raise StreamGap(f"Frames {last_event_id + 1} to {pending[0][0] - 1} are no longer buffered")
+
+            for event_id, data in pending:
+                yield event_id, data
+                last_event_id = event_id
+
+            if done and last_event_id >= self.last_event_id:
+                return
+
+
+class StreamRegistry:
+    """In-flight and recently finished chat streams of this process"""
+
+    def __init__(self, retention_seconds: int = STREAM_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._streams: Dict[str, ChatStream] = {}
+
+        self.started = 0
+        self.resumed = 0
+
+    def create(self, owner_id: str) -> ChatStream:
+        self._sweep()
+        stream = ChatStream(owner_id)
+        self._streams[stream.id] = stream
+        self.started += 1
+        return stream
+
+    def run(self, stream: ChatStream, frames: AsyncIterator[Dict]) -> None:
+        """Publish the frames from a background task, independent of any connection"""
+        stream.task = asyncio.create_task(self._publish_all(stream, frames))
+
+    async def _publish_all(self, stream: ChatStream, frames: AsyncIterator[Dict]) -> None:
+        try:
+            async for data in frames:
+                await stream.publish(data)
+        finally:
+            await stream.finish()
+
+    def get(self, stream_id: str, owner_id: str) -> Optional[ChatStream]:
+        """Stream of this user, if still kept"""
+        self._sweep()
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.owner_id != owner_id:
+            return None
+        self.resumed += 1
+        return stream
+
+    def _sweep(self) -> None:
+        """Forget streams finished for longer than the retention period"""
+        deadline = time.monotonic() - self.retention_seconds
+        expired = [
+            stream_id for stream_id, stream in self._streams.items()
+            if stream.done and stream.finished_at < deadline
+        ]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    def stats(self) -> Dict:
+        active = sum(1 for stream in self._streams.values() if not stream.done)
+        return {
+            "active": active,
+            "retained": len(self._streams) - active,
+            "started": self.started,
+            "resumed": self.resumed
+        }
+
+
+_stream_registry_instance: Optional[StreamRegistry] = None
+
+
+def get_stream_registry() -> StreamRegistry:
+    """
+    Dependency injection function for StreamRegistry
+    Returns a singleton instance (streams outlive the requests that started them)
+    """
+    global _stream_registry_instance
+    if _stream_registry_instance is None:
+        _stream_registry_instance = StreamRegistry()
+    return _stream_registry_instance
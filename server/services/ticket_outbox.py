@@ -0,0 +1,294 @@
+"""
+Ticket Outbox - Durable queue of Jira ticket creations
+A ticket requested by the model is written to the ticket_outbox collection and
+the chat stream goes on at once (ticket_pending event). Background workers
+claim pending tickets, create them through the MCP pool and retry failures
+with exponential backoff; clients follow them with the ticket_created /
+ticket_failed stream events or GET /chat/tickets/{ticket_id}.
+
+Delivery is at-least-once: a worker stopped (or timed out) during a call
+leaves its ticket to be claimed again once the lease expires, so Jira may
+rarely get a duplicate. The idempotency key only dedupes requests before they
+reach Jira (same ticket asked twice in a conversation).
+"""
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ai.chatbot import ticket_assignee_group
+from ai.tools.mcp_bridge import create_jira_ticket
+from server.database import ticket_collection
+
+
+TICKET_WORKERS = int(os.getenv("TICKET_WORKERS", "2"))
+TICKET_MAX_ATTEMPTS = int(os.getenv("TICKET_MAX_ATTEMPTS", "5"))
+TICKET_RETRY_BASE_SECONDS = float(os.getenv("TICKET_RETRY_BASE_SECONDS", "5"))
+# A claimed ticket is given back to the queue if its worker has not finished by then
+TICKET_LEASE_SECONDS = float(os.getenv("TICKET_LEASE_SECONDS", "120"))
+TICKET_POLL_SECONDS = float(os.getenv("TICKET_POLL_SECONDS", "5"))
+# How long a chat stream stays open after its answer to report ticket outcomes
+TICKET_STREAM_WAIT_SECONDS = float(os.getenv("TICKET_STREAM_WAIT_SECONDS", "30"))
+
+TICKET_FIELDS = ("category", "summary", "description", "priority")
+FINAL_STATUSES = ("created", "failed")
+
+
+def idempotency_key(conversation_id: str, arguments: Dict) -> str:
+    """Same conversation, category and (normalized) summary: same ticket"""
+    summary = " ".join(str(arguments.get("summary", "")).lower().split())
+    category = str(arguments.get("category", "")).lower()
+    return hashlib.sha256(f"{conversation_id}|{category}|{summary}".encode("utf-8")).hexdigest()
+
+
+def ticket_view(ticket: Dict) -> Dict:
+    """Public, JSON-ready fields of an outbox document (stream events and status endpoint)"""
+    return {
+        "ticket_id": str(ticket["_id"]),
+        "conversation_id": ticket["conversation_id"],
+        "status": ticket["status"],
+        "attempts": ticket.get("attempts", 0),
+        "ticket_key": ticket.get("ticket_key"),
+        "result": ticket.get("result"),
+        "error": ticket.get("last_error"),
+        "created_at": ticket["created_at"].isoformat(),
+        "updated_at": ticket["updated_at"].isoformat()
+    }
+
+
+class TicketOutbox:
+    """Service for the ticket outbox and its background workers"""
+
+    def __init__(self, workers: int = TICKET_WORKERS):
+        self.collection = ticket_collection
+        self.workers = max(1, workers)
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        self._wake = asyncio.Event()
+        # Bumped on every outcome, so watchers wake without waiting for the next poll
+        self._outcomes = 0
+        self._changed = asyncio.Condition()
+        self._stats = {"enqueued": 0, "deduplicated": 0, "created": 0, "retried": 0, "failed": 0}
+
+    async def enqueue(self, conversation_id: str, owner_id: Optional[str], arguments: Dict) -> Dict:
+        """
+        Queue a ticket creation, or return the ticket already queued with the same key
+        Raises ValueError when the tool call lacks a required argument
+        """
+        missing = [name for name in TICKET_FIELDS if not arguments.get(name)]
+        if missing:
+            raise ValueError(f"Missing ticket arguments: {', '.join(missing)}")
+
+        key = idempotency_key(conversation_id, arguments)
+        new_id = ObjectId()
+        try:
+            ticket = await self._upsert(new_id, key, conversation_id, owner_id, arguments)
+        except DuplicateKeyError:
+            # Lost the insert race on the unique key: the other upsert created it
+            ticket = await self._upsert(new_id, key, conversation_id, owner_id, arguments)
+
+        if ticket["_id"] == new_id:
+            self._stats["enqueued"] += 1
+        elif ticket["status"] == "failed":
+            # Asked again after giving up: queue the same ticket once more
+            ticket = await self.collection.find_one_and_update(
+                {"_id": ticket["_id"], "status": "failed"},
+                {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            ) or ticket
+            self._stats["enqueued"] += 1
+        else:
+            self._stats["deduplicated"] += 1
+        self._wake.set()
+        return ticket_view(ticket)
+
+    async def _upsert(self, ticket_id: ObjectId, key: str, conversation_id: str, owner_id: Optional[str], arguments: Dict) -> Dict:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"idempotency_key": key},
+            {"$setOnInsert": {
+                "_id": ticket_id,
+                "conversation_id": conversation_id,
+                "owner_id": owner_id,
+                "arguments": arguments,
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+                "updated_at": now
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def get(self, ticket_id: str, owner_id: str) -> Optional[Dict]:
+        """Ticket of this user, None if unknown or not theirs"""
+        if not ObjectId.is_valid(ticket_id):
+            return None
+        ticket = await self.collection.find_one({"_id": ObjectId(ticket_id), "owner_id": owner_id})
+        return ticket_view(ticket) if ticket else None
+
+    async def watch(
+        self,
+        ticket_ids: List[str],
+        owner_id: str,
+        timeout: float = TICKET_STREAM_WAIT_SECONDS
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield each ticket of this user once it is created or failed, until all are or the timeout expires
+        (tickets of other users are never reported, like in get())
+        Outcomes of this process wake the watcher at once, others are seen by polling
+        """
+        remaining = {ObjectId(ticket_id) for ticket_id in ticket_ids if ObjectId.is_valid(ticket_id)}
+        deadline = asyncio.get_running_loop().time() + timeout
+        while remaining:
+            seen = self._outcomes
+            async for ticket in self.collection.find({
+                "_id": {"$in": list(remaining)},
+                "owner_id": owner_id,
+                "status": {"$in": list(FINAL_STATUSES)}
+            }):
+                remaining.discard(ticket["_id"])
+                yield ticket_view(ticket)
+
+            left = deadline - asyncio.get_running_loop().time()
+            if not remaining or left <= 0:
+                return
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self._outcomes != seen),
+                        min(left, TICKET_POLL_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self) -> None:
+        """Start the workers (at most TICKET_WORKERS tickets are created at once)"""
+        if not self._tasks:
+            self._running = True
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; a ticket interrupted mid-call is claimed again after its lease"""
+        # The flag also stops a worker whose cancellation was absorbed by a wait_for
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while self._running:
+            self._wake.clear()
+            try:
+                ticket = await self._claim()
+            except Exception as e:
+                print(f"⚠️ Ticket outbox unavailable: {e}")
+                ticket = None
+
+            if ticket is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), TICKET_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(ticket)
+            except Exception as e:
+                # Outcome not recorded: the ticket is claimed again after its lease
+                print(f"⚠️ Failed to record ticket {ticket['_id']}: {e}")
+
+    async def _claim(self) -> Optional[Dict]:
+        """Take the oldest due ticket (or one whose worker lease expired)"""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "processing", "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": "processing",
+                    "lease_until": now + timedelta(seconds=TICKET_LEASE_SECONDS),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _process(self, ticket: Dict) -> None:
+        arguments = ticket["arguments"]
+        try:
+            ticket_key, message = await create_jira_ticket(
+                arguments["summary"],
+                arguments["description"],
+                arguments["priority"],
+                ticket_assignee_group(arguments["category"]),
+                arguments.get("user_email", "Non spécifié")
+            )
+        except Exception as e:
+            await self._record_failure(ticket, e)
+        else:
+            now = datetime.utcnow()
+            await self.collection.update_one(
+                {"_id": ticket["_id"], "status": {"$ne": "created"}},
+                {
+                    "$set": {"status": "created", "ticket_key": ticket_key, "result": message, "updated_at": now},
+                    "$unset": {"lease_until": "", "last_error": ""}
+                }
+            )
+            self._stats["created"] += 1
+            print(f"🎫 Ticket {ticket_key or ticket['_id']} created (attempt {ticket['attempts']})")
+        await self._notify()
+
+    async def _record_failure(self, ticket: Dict, error: Exception) -> None:
+        """Back to pending with exponential backoff, or failed after TICKET_MAX_ATTEMPTS"""
+        now = datetime.utcnow()
+        attempts = ticket["attempts"]
+        update = {"last_error": str(error), "updated_at": now}
+        if attempts >= TICKET_MAX_ATTEMPTS:
+            update["status"] = "failed"
+            self._stats["failed"] += 1
+            print(f"❌ Ticket {ticket['_id']} failed after {attempts} attempts: {error}")
+        else:
+            update["status"] = "pending"
+            update["next_attempt_at"] = now + timedelta(seconds=TICKET_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            self._stats["retried"] += 1
+            print(f"⚠️ Ticket {ticket['_id']} attempt {attempts} failed, retrying: {error}")
+
+        # Only if no other worker took the ticket over in the meantime (lease expired)
+        await self.collection.update_one(
+            {"_id": ticket["_id"], "status": "processing", "attempts": attempts},
+            {"$set": update, "$unset": {"lease_until": ""}}
+        )
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._outcomes += 1
+            self._changed.notify_all()
+
+    def stats(self) -> Dict:
+        return {"workers": len(self._tasks), **self._stats}
+
+
+_ticket_outbox_instance: Optional[TicketOutbox] = None
+
+
+def get_ticket_outbox() -> TicketOutbox:
+    """
+    Dependency injection function for TicketOutbox
+    Returns a singleton instance (its workers run for the whole process)
+    """
+    global _ticket_outbox_instance
+    if _ticket_outbox_instance is None:
+        _ticket_outbox_instance = TicketOutbox()
+    return _ticket_outbox_instance
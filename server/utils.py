@@ -1,5 +1,7 @@
+import asyncio
 import bcrypt
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -7,6 +9,16 @@ from jose import JWTError, jwt
 SECRET_KEY = os.getenv("SECRET_KEY", "your_super_secret_key_12345")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours
+# Carry the user's history ID in the token (`hid` claim) so requests skip its lookup
+HISTORY_ID_IN_TOKEN = os.getenv("HISTORY_ID_IN_TOKEN", "true").lower() == "true"
+
+# bcrypt work factor of new hashes; existing hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL: a few threads hash in parallel without blocking the event loop,
+# and the bound keeps a login burst from starving the CPU used by chat streams
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 def verify_password(plain_password: str, hashed_password: str):
     try:
@@ -15,9 +27,27 @@ def verify_password(plain_password: str, hashed_password: str):
         return False
 
 def get_password_hash(password: str):
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when the hash was made with another work factor than BCRYPT_ROUNDS"""
+    try:
+        # Modular crypt format: $2b$<rounds>$<salt+hash>
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the bcrypt thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the bcrypt thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,158 @@
+"""
+Shared fixtures: the FastAPI app with in-memory services, and slow async
+fakes of the retriever and the answer chain (no MongoDB, Qdrant or Mistral)
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from bson import ObjectId
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessageChunk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from server.middlewares.auth import get_current_user
+from server.services import (
+    AIService,
+    get_ai_service,
+    get_conversation_service,
+    get_history_service,
+    get_summary_service
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeHistoryService:
+    async def get_or_create_history(self, user_id: str) -> str:
+        return f"history-{user_id}"
+
+
+class FakeConversationService:
+    """Conversations kept in memory, enough for the chat and list routes"""
+
+    def __init__(self):
+        self.saved = {}
+
+    async def add_messages(self, conversation_id, historique_id, messages, create_with_title=None):
+        self.saved.setdefault(conversation_id, []).extend(messages)
+
+    async def list_conversations(self, historique_id, pagination, total_mode="exact", after=None):
+        return {"conversations": [], "total": 0, "skip": pagination.skip, "limit": pagination.limit, "has_more": False}
+
+
+class FakeSummaryService:
+    def schedule_refresh(self, **kwargs) -> None:
+        pass
+
+
+class SlowRetriever:
+    """Async retrieval that takes a while; the sync path blocks the thread like a real client"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.started = asyncio.Event()
+
+    def invoke(self, query):
+        time.sleep(self.delay)
+        return [Document(page_content="Vérifier le joint de la vanne.", metadata={"_id": "chunk-1"})]
+
+    async def ainvoke(self, query):
+        self.started.set()
+        await asyncio.sleep(self.delay)
+        return [Document(page_content="Vérifier le joint de la vanne.", metadata={"_id": "chunk-1"})]
+
+
+class SlowChain:
+    """
+    Answer chain streaming `chunks`; it holds after the first chunk until
+    `release` is set (or `timeout` expires)
+    """
+
+    def __init__(self, chunks, timeout: float = 5):
+        self.chunks = chunks
+        self.timeout = timeout
+        self.release = asyncio.Event()
+        self.finished = False
+        self.calls = 0
+
+    def stream(self, inputs):
+        time.sleep(self.timeout)
+        yield from self.chunks
+
+    async def astream(self, inputs):
+        self.calls += 1
+        for index, chunk in enumerate(self.chunks):
+            yield chunk
+            if index == 0:
+                try:
+                    await asyncio.wait_for(self.release.wait(), self.timeout)
+                except asyncio.TimeoutError:
+                    pass
+        self.finished = True
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+    async def aembed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def text_chunks(*parts):
+    return [AIMessageChunk(content=part) for part in parts]
+
+
+def make_user(email: str = "tech@example.com") -> dict:
+    return {"_id": ObjectId(), "email": email}
+
+
+def make_ai_service(chain, retriever=None) -> AIService:
+    """The real AIService, with its chain, retriever and embeddings swapped for fakes"""
+    service = AIService()
+    service._chain = chain
+    service._retriever = retriever or SlowRetriever()
+    service._embeddings = FakeEmbeddings()
+    service._answer_cache.enabled = False
+    return service
+
+
+@pytest.fixture
+def conversations():
+    return FakeConversationService()
+
+
+@pytest.fixture
+def app(conversations):
+    """main.app with in-memory services; set the AI service and the user per test (with_ai_service, as_user)"""
+    overrides = main.app.dependency_overrides
+    overrides[get_history_service] = FakeHistoryService
+    overrides[get_conversation_service] = lambda: conversations
+    overrides[get_summary_service] = FakeSummaryService
+    yield main.app
+    overrides.clear()
+
+
+def as_user(app, user: dict) -> None:
+    app.dependency_overrides[get_current_user] = lambda: user
+
+
+def with_ai_service(app, service: AIService) -> None:
+    app.dependency_overrides[get_ai_service] = lambda: service
+
+
+def client_for(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
@@ -0,0 +1,21 @@
+"""
+Semantic answer cache and re-ingestion
+"""
+from server.services.answer_cache import SemanticAnswerCache
+
+
+def test_answer_generated_before_a_reingest_is_not_stored():
+    cache = SemanticAnswerCache(enabled=True)
+    assert cache.lookup([1.0, 0.0], "v1") is None
+
+    # Re-ingested while the v1 answer was generated; a v2 answer is already cached
+    assert cache.lookup([0.0, 1.0], "v2") is None
+    cache.store([0.0, 1.0], "Vanne V-2 ?", "Réponse v2", ["chunk-2"], "v2")
+
+    cache.store([1.0, 0.0], "Vanne V-1 ?", "Réponse v1", ["chunk-1"], "v1")
+
+    assert cache.stats()["collection_version"] == "v2"
+    assert cache.stats()["stale_skips"] == 1
+    assert cache.lookup([1.0, 0.0], "v2") is None
+    assert cache.lookup([0.0, 1.0], "v2").answer == "Réponse v2"
+    assert cache.stats()["invalidations"] == 0
@@ -0,0 +1,32 @@
+"""
+Login password rehash and the cache of verified tokens
+"""
+import bcrypt
+import pytest
+from bson import ObjectId
+
+from conftest import client_for
+from server import utils
+from server.middlewares import auth as auth_middleware
+from server.routes import auth as auth_routes
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.mark.anyio
+async def test_login_rehash_drops_the_cached_user(app, monkeypatch):
+    users = mongomock_motor.AsyncMongoMockClient().chatbot_db.users
+    monkeypatch.setattr(auth_routes, "user_collection", users)
+    monkeypatch.setattr(auth_routes, "HISTORY_ID_IN_TOKEN", False)
+    monkeypatch.setattr(utils, "BCRYPT_ROUNDS", 5)
+    old_hash = bcrypt.hashpw(b"vanne-v12", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    user_id = ObjectId()
+    await users.insert_one({"_id": user_id, "username": "tech", "email": "tech@example.com", "password": old_hash})
+    auth_middleware._users.set("earlier-token", {"_id": user_id, "email": "tech@example.com"})
+
+    async with client_for(app) as client:
+        response = await client.post("/auth/login", json={"email": "tech@example.com", "password": "vanne-v12"})
+
+    assert response.status_code == 200
+    assert (await users.find_one({"_id": user_id}))["password"] != old_hash
+    assert auth_middleware._users.get("earlier-token") is None
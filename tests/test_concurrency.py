@@ -0,0 +1,41 @@
+"""
+A chat stream waiting on the retriever and the model must not hold other requests
+"""
+import asyncio
+import json
+
+import pytest
+
+from conftest import SlowChain, SlowRetriever, as_user, client_for, make_ai_service, make_user, text_chunks, with_ai_service
+
+
+def sse_events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+@pytest.mark.anyio
+async def test_conversation_list_is_served_while_a_chat_stream_is_generating(app):
+    retriever = SlowRetriever()
+    chain = SlowChain(text_chunks("Coupez l'alimentation, ", "puis vérifiez le joint."))
+    with_ai_service(app, make_ai_service(chain, retriever))
+    as_user(app, make_user())
+
+    async with client_for(app) as client:
+        stream = asyncio.create_task(client.post("/chat/stream", json={"message": "Ma vanne V-12 fuit"}))
+        await asyncio.wait_for(retriever.started.wait(), 5)
+
+        # The chat generation is in flight: the list must still answer right away
+        listed = await asyncio.wait_for(client.get("/conversations/list"), 2)
+        assert listed.status_code == 200
+        assert listed.json()["conversations"] == []
+        assert not chain.finished
+        assert not stream.done()
+
+        chain.release.set()
+        response = await asyncio.wait_for(stream, 5)
+
+    events = sse_events(response.text)
+    assert "".join(event["chunk"] for event in events if event["type"] == "content") == (
+        "Coupez l'alimentation, puis vérifiez le joint."
+    )
+    assert events[-1]["type"] == "done"
@@ -0,0 +1,89 @@
+"""
+Reading conversations whose messages predate message ids, and keyset
+pagination of the conversation list
+"""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from conftest import as_user, client_for, make_user
+from server.models import MessageResponse, PaginationParams
+from server.services import ConversationService, get_conversation_service, get_history_service
+from server.services import conversation_service as conversation_module
+
+
+def legacy_conversation():
+    now = datetime.utcnow()
+    messages = [
+        {"role": "user", "texte": "La vanne V-12 fuit", "date": now},
+        {"id": "m-2", "role": "assistant", "texte": "Vérifiez le joint.", "date": now, "is_favorite": True}
+    ]
+    return {"_id": ObjectId(), "titre": "Fuite", "is_pinned": False, "created_at": now, "last_updated": now}, messages
+
+
+def test_unmigrated_messages_are_read_without_an_id():
+    service = ConversationService()
+    conversation, messages = legacy_conversation()
+
+    first = service._format_conversation_response(conversation, messages)["messages"]
+    second = service._format_conversation_response(conversation, messages)["messages"]
+
+    assert [message["id"] for message in first] == [None, "m-2"]
+    assert first == second
+    assert first[0]["is_favorite"] is False
+    assert MessageResponse(**messages[0]).id is None
+
+
+@pytest.mark.anyio
+async def test_cursor_pages_through_pinned_and_unpinned_ties_exactly_once(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient().chatbot_db.conversations
+    monkeypatch.setattr(conversation_module, "conversation_collection", collection)
+    historique_id = ObjectId()
+    same_time = datetime(2026, 3, 2, 9, 30)
+    for index in range(7):
+        conversation = {
+            "historique_id": historique_id,
+            "titre": f"Panne {index}",
+            "last_updated": same_time,
+            "message_count": 2
+        }
+        # Pinned, unpinned, and unpinned from before the is_pinned field
+        if index % 3 != 2:
+            conversation["is_pinned"] = index % 3 == 0
+        await collection.insert_one(conversation)
+
+    service = ConversationService()
+    seen, after = [], None
+    while True:
+        page = await service.list_conversations(
+            str(historique_id), PaginationParams(skip=0, limit=2), total_mode="none", after=after
+        )
+        seen.extend(page.conversations)
+        after = page.next_cursor
+        if after is None:
+            break
+
+    ids = [conversation.id for conversation in seen]
+    assert len(ids) == len(set(ids)) == 7
+    assert [conversation.is_pinned for conversation in seen] == [True] * 3 + [False] * 4
+
+
+class ValidHistoryService:
+    async def get_or_create_history(self, user_id: str) -> str:
+        return str(ObjectId())
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "eyJwIjp0cnVlfQ"])
+async def test_malformed_cursor_is_a_bad_request(app, cursor):
+    app.dependency_overrides[get_conversation_service] = ConversationService
+    app.dependency_overrides[get_history_service] = ValidHistoryService
+    as_user(app, make_user())
+
+    async with client_for(app) as client:
+        response = await client.get("/conversations/list", params={"after": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
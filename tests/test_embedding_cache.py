@@ -0,0 +1,45 @@
+"""
+Persistent embedding cache on the async path
+"""
+import threading
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from ai.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+@pytest.mark.anyio
+async def test_persisted_vectors_are_read_and_written_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    loop_thread = threading.get_ident()
+    sqlite_threads = []
+
+    first = CachedEmbeddings(CountingEmbeddings(), "mistral-embed", persist_path=path)
+    persist = first._persist
+    first._persist = lambda *args: (sqlite_threads.append(threading.get_ident()), persist(*args))
+    assert await first.aembed_query("La vanne fuit") == [13.0, 1.0]
+
+    restarted = CachedEmbeddings(CountingEmbeddings(), "mistral-embed", persist_path=path)
+    load = restarted._load_persisted
+    restarted._load_persisted = lambda *args: (sqlite_threads.append(threading.get_ident()), load(*args))
+    assert await restarted.aembed_query(" La vanne  fuit ") == [13.0, 1.0]
+
+    assert restarted.underlying.calls == 0
+    assert restarted.stats()["hits"] == 1 and restarted.stats()["misses"] == 0
+    assert len(sqlite_threads) == 2 and loop_thread not in sqlite_threads
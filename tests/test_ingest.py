@@ -0,0 +1,79 @@
+"""
+End of an ingestion run: artifact/manifest ordering and when it can be skipped
+"""
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai"))
+
+import ingest_data  # noqa: E402
+import qdrantdb  # noqa: E402
+
+
+class FakeClient:
+    def __init__(self, exists: bool):
+        self.exists = exists
+
+    def collection_exists(self, collection):
+        return self.exists
+
+    def delete(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(qdrantdb, "INDEX_DIR", tmp_path)
+    monkeypatch.setattr(qdrantdb, "VERSION_FILE", tmp_path / "collection_version.json")
+    monkeypatch.setattr(qdrantdb, "SNAPSHOT_DIR", tmp_path / "snapshot")
+    monkeypatch.setattr(qdrantdb, "_version_cache", (None, "0"))
+    monkeypatch.setattr(ingest_data, "MANIFEST_FILE", tmp_path / "manifest.json")
+    monkeypatch.setattr(ingest_data, "save_lexical_index", qdrantdb.save_lexical_index)
+    monkeypatch.setattr(ingest_data, "bump_collection_version", qdrantdb.bump_collection_version)
+    return tmp_path
+
+
+def test_manifest_is_written_after_the_artifacts_and_the_version(index_dir, monkeypatch):
+    steps = []
+    monkeypatch.setattr(ingest_data, "export_snapshot", lambda version: steps.append("snapshot") or 0)
+    monkeypatch.setattr(ingest_data, "save_lexical_index", lambda *args: steps.append("bm25"))
+    monkeypatch.setattr(ingest_data, "bump_collection_version", lambda version: steps.append("version"))
+    monkeypatch.setattr(ingest_data, "save_manifest", lambda manifest: steps.append("manifest"))
+
+    ingest_data.finalize(FakeClient(exists=True), "manuels", {}, {}, [])
+
+    assert steps == ["snapshot", "bm25", "version", "manifest"]
+
+
+def test_up_to_date_collection_with_stale_artifacts_is_not_skipped(index_dir, monkeypatch):
+    chunks = {"p1": Document(page_content="Vérifier le joint de la vanne.", metadata={"source": "documents/V12.pdf"})}
+    exported = []
+
+    def export_snapshot(version):
+        exported.append(version)
+        qdrantdb.save_snapshot(qdrantdb.SNAPSHOT_DIR, ["p1"], [[1.0, 0.0]], [{"page_content": "Vérifier"}], version)
+        return 1
+
+    monkeypatch.setattr(ingest_data, "export_snapshot", export_snapshot)
+    client = FakeClient(exists=True)
+
+    # Aucun artefact local : régénérés sans rien ré-encoder
+    assert not ingest_data.nothing_to_do(client, "manuels", index_dir, chunks, 0, [])
+    ingest_data.finalize(client, "manuels", {}, chunks, [])
+    assert ingest_data.nothing_to_do(client, "manuels", index_dir, chunks, 0, [])
+
+    # Une nouvelle version sans snapshot correspondant rend les artefacts périmés
+    qdrantdb.bump_collection_version("v2")
+    assert not ingest_data.nothing_to_do(client, "manuels", index_dir, chunks, 0, [])
+    assert len(exported) == 1
+
+
+def test_empty_documents_folder_without_a_collection_writes_nothing(index_dir, monkeypatch, capsys):
+    monkeypatch.setattr(ingest_data, "export_snapshot", lambda version: pytest.fail("no collection to export"))
+
+    assert ingest_data.nothing_to_do(FakeClient(exists=False), "manuels", index_dir, {}, 0, [])
+    assert "Aucun extrait à indexer" in capsys.readouterr().out
+    assert not (index_dir / "manifest.json").exists()
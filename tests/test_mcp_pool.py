@@ -0,0 +1,83 @@
+"""
+MCP pool against the fake stdio server (ai/tools/fake_mcp_server.py)
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+from ai.tools import mcp_pool
+from ai.tools.mcp_pool import MCPPool, MCPRequestNotSent, MCPWorkerCrashed
+
+FAKE_SERVER = [sys.executable, os.path.join(os.path.dirname(mcp_pool.__file__), "fake_mcp_server.py")]
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    """Every MCPWorker created by the pool, to check that no process is left running"""
+    workers = []
+
+    class TrackedWorker(mcp_pool.MCPWorker):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            workers.append(self)
+
+    monkeypatch.setattr(mcp_pool, "MCPWorker", TrackedWorker)
+    return workers
+
+
+def make_pool(monkeypatch, size=1, **env) -> MCPPool:
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return MCPPool(command=FAKE_SERVER, cwd=None, size=size, call_timeout=5, health_interval=0)
+
+
+@pytest.mark.anyio
+async def test_concurrent_restarts_of_a_dead_worker_start_one_replacement(monkeypatch, spawned):
+    pool = make_pool(monkeypatch)
+    await pool.start()
+    dead = pool.workers[0]
+    dead.process.kill()
+    await dead.process.wait()
+    while dead.alive:
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setenv("FAKE_MCP_STARTUP_MS", "300")
+    picked = await asyncio.gather(pool._pick_worker(), pool._pick_worker(), pool._restart(dead))
+
+    assert pool.restarts == 1
+    assert picked[0] is picked[1] is pool.workers[0]
+    assert picked[0].alive and picked[0] is not dead
+    assert len(spawned) == 2
+
+    await pool.close()
+    assert all(worker.process.returncode is not None for worker in spawned)
+
+
+@pytest.mark.anyio
+async def test_call_is_not_replayed_when_the_worker_dies_after_receiving_it(monkeypatch, spawned):
+    pool = make_pool(monkeypatch, size=2, FAKE_MCP_CRASH_AFTER=1)
+    await pool.start()
+    first = await pool.call_tool("jira_create_issue", {"summary": "Fuite V-12"})
+    assert "KAN-1" in first["content"][0]["text"]
+
+    # The server gets the call, then dies: the issue may exist in Jira
+    with pytest.raises(MCPWorkerCrashed) as crashed:
+        await pool.call_tool("jira_create_issue", {"summary": "Fuite V-13"})
+
+    assert not isinstance(crashed.value, MCPRequestNotSent)
+    assert pool.restarts == 0
+    await pool.close()
+
+
+@pytest.mark.anyio
+async def test_health_checks_run_even_when_no_worker_starts(spawned):
+    pool = MCPPool(command=[sys.executable, "-c", "pass"], cwd=None, size=2, call_timeout=5, health_interval=60)
+
+    with pytest.raises(MCPWorkerCrashed):
+        await pool.start()
+
+    assert pool._health is not None and not pool._health.done()
+    assert all(worker.process.returncode is not None for worker in spawned)
+    await pool.close()
@@ -0,0 +1,31 @@
+"""
+Message id migration racing with the move to the collection layout
+"""
+from datetime import datetime
+
+import pytest
+
+from server.scripts.migrate_message_ids import guarded_update, missing_fields
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.mark.anyio
+async def test_conversation_moved_to_the_collection_layout_meanwhile_is_left_untouched():
+    conversations = mongomock_motor.AsyncMongoMockClient().chatbot_db.conversations
+    message = {"role": "user", "texte": "La vanne V-12 fuit", "date": datetime.utcnow()}
+    embedded_id = (await conversations.insert_one({"titre": "Fuite", "messages": [message]})).inserted_id
+    moved_id = (await conversations.insert_one({"titre": "Fuite", "messages": [message]})).inserted_id
+    fields = missing_fields(message, prefix="messages.0.")
+
+    # migrate_messages moves one conversation between the read and the write
+    await conversations.update_one({"_id": moved_id}, {"$unset": {"messages": ""}})
+
+    for conversation_id in (embedded_id, moved_id):
+        operation = guarded_update(conversation_id, fields, embedded=True)
+        await conversations.update_one(operation._filter, operation._doc)
+
+    migrated = await conversations.find_one({"_id": embedded_id})
+    assert migrated["messages"][0]["id"] == fields["messages.0.id"]
+    assert migrated["schema_version"] == 1
+    assert await conversations.find_one({"_id": moved_id}) == {"_id": moved_id, "titre": "Fuite"}
@@ -0,0 +1,51 @@
+"""
+Lexical fast path statistics of the hybrid retriever
+"""
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from ai.embedding_cache import CachedEmbeddings
+from ai.lexical_index import BM25Index
+from ai.retriever import HybridRetriever
+
+
+class StaticEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+class DenseRetriever(BaseRetriever):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return []
+
+
+@pytest.mark.anyio
+async def test_fast_path_avoids_the_embedding_only_when_it_was_not_computed_yet():
+    payloads = [{"page_content": f"Membrane de la vanne, joint torique {i}"} for i in range(3)]
+    embeddings = CachedEmbeddings(StaticEmbeddings(), "mistral-embed")
+    retriever = HybridRetriever(
+        dense=DenseRetriever(embeddings=embeddings),
+        loader=lambda: (BM25Index([1, 2, 3], payloads), "v1"),
+        version_fn=lambda: "v1",
+        collection_name="docs",
+        k=3
+    )
+
+    # First turn: the semantic answer cache embedded the question already
+    await embeddings.aembed_query("membrane vanne")
+    assert len(await retriever.ainvoke("membrane vanne")) == 3
+    assert len(await retriever.ainvoke("joint torique membrane")) == 3
+
+    stats = retriever.stats()
+    assert stats["dense_calls"] == 0
+    assert stats["dense_searches_avoided"] == 2
+    assert stats["embeddings_avoided"] == 1
@@ -0,0 +1,94 @@
+"""
+Identical first questions share one generation, never one user's ticket
+"""
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from conftest import SlowChain, SlowRetriever, as_user, client_for, make_ai_service, make_user, with_ai_service
+from server.services import get_ticket_outbox
+
+
+class RecordingOutbox:
+    """Ticket outbox that only records what is queued"""
+
+    def __init__(self):
+        self.queued = []
+
+    async def enqueue(self, conversation_id, owner_id, arguments):
+        self.queued.append({"conversation_id": conversation_id, "owner_id": owner_id, "arguments": arguments})
+        return {
+            "ticket_id": f"ticket-{len(self.queued)}",
+            "conversation_id": conversation_id,
+            "status": "pending",
+            "attempts": 0,
+            "ticket_key": None,
+            "result": None,
+            "error": None,
+            "created_at": "2026-01-01T00:00:00",
+            "updated_at": "2026-01-01T00:00:00"
+        }
+
+    async def watch(self, ticket_ids, owner_id, timeout=0):
+        return
+        yield
+
+
+def ticket_call_chunks():
+    args = {"category": "Vanne", "summary": "Fuite V-12", "description": "La vanne V-12 fuit", "priority": "High"}
+    return [
+        AIMessageChunk(content="Je crée un ticket pour la fuite."),
+        AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "create_atlassian_ticket", "args": json.dumps(args), "id": "call-1", "index": 0}
+        ])
+    ]
+
+
+def sse_events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+@pytest.mark.anyio
+async def test_ticket_of_a_shared_first_turn_is_queued_for_each_subscriber(app, conversations):
+    retriever = SlowRetriever()
+    chain = SlowChain(ticket_call_chunks())
+    service = make_ai_service(chain, retriever)
+    outbox = RecordingOutbox()
+    service._tickets = outbox
+    with_ai_service(app, service)
+    app.dependency_overrides[get_ticket_outbox] = lambda: outbox
+
+    alice, bob = make_user("alice@example.com"), make_user("bob@example.com")
+    async with client_for(app) as client:
+        as_user(app, alice)
+        first = asyncio.create_task(client.post("/chat/stream", json={"message": "Ma vanne V-12 fuit"}))
+        await asyncio.wait_for(retriever.started.wait(), 5)
+
+        as_user(app, bob)
+        second = asyncio.create_task(client.post("/chat/stream", json={"message": "ma vanne  V-12 fuit"}))
+        while service.single_flight_stats()["coalesced"] < 1:
+            await asyncio.sleep(0.01)
+
+        chain.release.set()
+        responses = await asyncio.wait_for(asyncio.gather(first, second), 5)
+
+    assert chain.calls == 1
+    assert sorted(ticket["arguments"]["user_email"] for ticket in outbox.queued) == ["alice@example.com", "bob@example.com"]
+
+    for user, response in zip((alice, bob), responses):
+        events = sse_events(response.text)
+        conversation_id = events[0]["conversation_id"]
+        queued = next(ticket for ticket in outbox.queued if ticket["owner_id"] == str(user["_id"]))
+        assert queued["conversation_id"] == conversation_id
+
+        pending = [event for event in events if event["type"] == "ticket_pending"]
+        assert len(pending) == 1
+        assert pending[0]["conversation_id"] == conversation_id
+
+        # Only this user's ticket id ends up in their saved answer
+        answer = conversations.saved[conversation_id][1].texte
+        assert pending[0]["ticket_id"] in answer
+        other_ticket_id = ({"ticket-1", "ticket-2"} - {pending[0]["ticket_id"]}).pop()
+        assert other_ticket_id not in answer
@@ -0,0 +1,88 @@
+"""
+Resumable chat streams: replay from the ring buffer, gaps, and resume ownership
+"""
+import asyncio
+import time
+
+import pytest
+
+from conftest import as_user, client_for, make_user
+from server.services import StreamGap, StreamRegistry, get_stream_registry
+from server.services.stream_registry import ChatStream
+
+
+async def published(*texts, max_frames: int = 2048) -> ChatStream:
+    stream = ChatStream(owner_id="owner", max_frames=max_frames)
+    for text in texts:
+        await stream.publish({"type": "chunk", "content": text})
+    return stream
+
+
+@pytest.mark.anyio
+async def test_frames_after_replays_the_buffer_then_follows_live_frames():
+    stream = await published("Vérifier ", "le joint")
+    received = []
+
+    async def read():
+        async for event_id, data in stream.frames_after(1):
+            received.append((event_id, data["content"]))
+
+    reader = asyncio.create_task(read())
+    await asyncio.sleep(0)
+    assert received == [(2, "le joint")]
+
+    await stream.publish({"type": "chunk", "content": " de la vanne."})
+    await stream.finish()
+    await asyncio.wait_for(reader, 1)
+
+    assert received == [(2, "le joint"), (3, " de la vanne.")]
+
+
+@pytest.mark.anyio
+async def test_reader_behind_the_ring_buffer_gets_a_gap():
+    stream = await published("a", "b", "c", "d", max_frames=2)
+    await stream.finish()
+
+    with pytest.raises(StreamGap):
+        async for _ in stream.frames_after(1):
+            pass
+    assert [event_id async for event_id, _ in stream.frames_after(2)] == [3, 4]
+
+
+@pytest.mark.anyio
+async def test_can_resume_from_the_oldest_buffered_frame_up_to_the_last_one():
+    empty = await published()
+    assert empty.can_resume_from(0)
+    assert not empty.can_resume_from(1)
+
+    stream = await published("a", "b", "c", "d", "e", max_frames=3)
+    assert [stream.can_resume_from(event_id) for event_id in range(7)] == [
+        False, False, True, True, True, True, False
+    ]
+
+
+@pytest.mark.anyio
+async def test_resume_is_not_found_for_another_user_or_an_expired_stream(app):
+    registry = StreamRegistry(retention_seconds=60)
+    app.dependency_overrides[get_stream_registry] = lambda: registry
+    user, other = make_user(), make_user("other@example.com")
+    as_user(app, user)
+
+    foreign = registry.create(owner_id=str(other["_id"]))
+    expired = registry.create(owner_id=str(user["_id"]))
+    await expired.finish()
+    expired.finished_at = time.monotonic() - 61
+    kept = registry.create(owner_id=str(user["_id"]))
+    await kept.publish({"type": "chunk", "content": "Vérifier le joint"})
+    await kept.finish()
+
+    async with client_for(app) as client:
+        responses = {
+            name: await client.get(f"/chat/stream/{stream.id}", headers={"Last-Event-ID": "0"})
+            for name, stream in (("foreign", foreign), ("expired", expired), ("kept", kept))
+        }
+
+    assert responses["foreign"].status_code == 404
+    assert responses["expired"].status_code == 404
+    assert responses["kept"].status_code == 200
+    assert responses["kept"].text.startswith("id: 1\n")
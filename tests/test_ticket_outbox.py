@@ -0,0 +1,25 @@
+"""
+Ticket outbox: a stream only reports the tickets of its own user
+"""
+import pytest
+
+from server.services.ticket_outbox import TicketOutbox
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+ARGUMENTS = {"category": "Vanne", "summary": "Fuite V-12", "description": "La vanne V-12 fuit", "priority": "High"}
+
+
+@pytest.mark.anyio
+async def test_watch_skips_tickets_of_other_users():
+    outbox = TicketOutbox(workers=1)
+    outbox.collection = mongomock_motor.AsyncMongoMockClient().chatbot_db.ticket_outbox
+
+    alice = await outbox.enqueue("conversation-a", "alice", {**ARGUMENTS, "user_email": "alice@example.com"})
+    bob = await outbox.enqueue("conversation-b", "bob", {**ARGUMENTS, "user_email": "bob@example.com"})
+    await outbox.collection.update_many({}, {"$set": {"status": "created", "result": "ID du ticket: KAN-1"}})
+
+    seen = [ticket async for ticket in outbox.watch([alice["ticket_id"], bob["ticket_id"]], owner_id="bob", timeout=0)]
+
+    assert [ticket["ticket_id"] for ticket in seen] == [bob["ticket_id"]]
+    assert await outbox.get(alice["ticket_id"], owner_id="bob") is None
@@ -0,0 +1,32 @@
+"""
+Startup preload of the in-process indexes through the default retriever chain
+"""
+import pytest
+
+from ai import chatbot
+from ai.lexical_index import BM25Index
+from conftest import FakeEmbeddings
+from server.services import AIService
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cache_size", ["1024", "0"])
+async def test_warm_up_loads_the_numpy_and_bm25_indexes(monkeypatch, cache_size):
+    loaded = []
+    monkeypatch.setenv("RETRIEVER_BACKEND", "numpy")
+    monkeypatch.setenv("LEXICAL_FAST_PATH", "true")
+    monkeypatch.setenv("RETRIEVAL_CACHE_SIZE", cache_size)
+    monkeypatch.setattr(chatbot, "get_embeddings", FakeEmbeddings)
+    monkeypatch.setattr(chatbot, "get_collection_version", lambda: "v1")
+    monkeypatch.setattr(chatbot, "load_vector_index", lambda quantize=False: loaded.append("numpy") or ("index", "v1"))
+    monkeypatch.setattr(
+        chatbot,
+        "load_lexical_index",
+        lambda: loaded.append("bm25") or (BM25Index([1], [{"page_content": "Joint de vanne"}]), "v1")
+    )
+
+    service = AIService()
+    service._retriever = chatbot.get_retriever()
+    await service.warm_up()
+
+    assert sorted(loaded) == ["bm25", "numpy"]